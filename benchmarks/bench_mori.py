@@ -0,0 +1,182 @@
+"""
+Mori Benchmarks
+How long the climb takes - latency and throughput of the hot path
+
+Run from the repository root:
+    python -m benchmarks.bench_mori --concurrency 8 --requests 200 --output bench.json
+"""
+
+import argparse
+import json
+import platform
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional
+
+from benchmarks.fake_ollama import FakeOllamaConfig, start_fake_ollama
+from mori_engine import MoriChatbot
+from ollama_scheduler import OllamaScheduler
+from response_cache import MemoryBackend, ResponseCache
+
+QUERIES = [
+    "What about Everest?",
+    "Tell me about K2",
+    "How do I stay warm?",
+    "What ropes should I use for alpine routes?",
+    "Is free solo worth it?",
+    "When is the season on Mount Fuji?",
+    "What are the hazards of the Matterhorn?",
+    "How does altitude affect temperature?",
+]
+
+RESPONSES = [
+    "That's amazing! The mountain is awesome today!!",
+    "Snow holds until it doesn't. Fantastic weather means nothing up there.",
+    "I climb alone. It's exciting, maybe. It's also honest.",
+]
+
+
+def percentiles(samples: List[float]) -> Dict[str, float]:
+    """Nearest-rank p50/p95/p99 in milliseconds"""
+    if not samples:
+        return {"p50": 0.0, "p95": 0.0, "p99": 0.0}
+    ordered = sorted(samples)
+
+    def rank(p: float) -> float:
+        return round(ordered[min(len(ordered) - 1, int(p / 100.0 * len(ordered)))] * 1000.0, 3)
+
+    return {"p50": rank(50), "p95": rank(95), "p99": rank(99)}
+
+
+def run_load(task: Callable[[int], Dict], requests: int, concurrency: int) -> Dict:
+    """Run task(i) for every request across a thread pool; aggregate its samples"""
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        samples = list(pool.map(task, range(requests)))
+    wall = time.perf_counter() - started
+
+    report = {
+        "requests": requests,
+        "concurrency": concurrency,
+        "wall_s": round(wall, 4),
+        "requests_per_sec": round(requests / wall, 2) if wall else 0.0,
+        "latency_ms": percentiles([s["latency"] for s in samples]),
+    }
+    if any("ttft" in s for s in samples):
+        report["ttft_ms"] = percentiles([s["ttft"] for s in samples if "ttft" in s])
+    if any("tokens" in s for s in samples):
+        tokens = sum(s.get("tokens", 0) for s in samples)
+        decode = sum(s["latency"] - s.get("ttft", 0.0) for s in samples)
+        report["tokens"] = tokens
+        report["tokens_per_sec"] = round(tokens / wall, 2) if wall else 0.0
+        report["decode_tokens_per_sec_per_request"] = round(tokens / decode, 2) if decode else 0.0
+    return report
+
+
+def bench_filter(chatbot: MoriChatbot, requests: int, concurrency: int) -> Dict:
+    def task(i: int) -> Dict:
+        start = time.perf_counter()
+        chatbot.apply_mori_filter(RESPONSES[i % len(RESPONSES)])
+        return {"latency": time.perf_counter() - start}
+    return run_load(task, requests, concurrency)
+
+
+def bench_search(chatbot: MoriChatbot, requests: int, concurrency: int) -> Dict:
+    def task(i: int) -> Dict:
+        start = time.perf_counter()
+        chatbot.search_mountain_knowledge(QUERIES[i % len(QUERIES)])
+        return {"latency": time.perf_counter() - start}
+    return run_load(task, requests, concurrency)
+
+
+def bench_generate(chatbot: MoriChatbot, requests: int, concurrency: int) -> Dict:
+    def task(i: int) -> Dict:
+        start = time.perf_counter()
+        chatbot.generate_mori_response(QUERIES[i % len(QUERIES)], session_id=str(i))
+        return {"latency": time.perf_counter() - start}
+    return run_load(task, requests, concurrency)
+
+
+def bench_stream(chatbot: MoriChatbot, requests: int, concurrency: int) -> Dict:
+    def task(i: int) -> Dict:
+        start = time.perf_counter()
+        sample = {"tokens": 0}
+        for token in chatbot.stream_mori_response(QUERIES[i % len(QUERIES)], session_id=str(i)):
+            if not sample["tokens"]:
+                sample["ttft"] = time.perf_counter() - start
+            sample["tokens"] += 1
+        sample["latency"] = time.perf_counter() - start
+        return sample
+    return run_load(task, requests, concurrency)
+
+
+SCENARIOS = {
+    "filter": bench_filter,
+    "search": bench_search,
+    "generate": bench_generate,
+    "stream": bench_stream,
+}
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Benchmark the Mori hot path")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS), help="Comma-separated: " + ", ".join(SCENARIOS))
+    parser.add_argument("--model", default="llama3.2:1b")
+    parser.add_argument("--requests", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--ollama-host", help="Benchmark a real Ollama instead of the built-in fake")
+    parser.add_argument("--ttft-ms", type=float, default=150.0, help="Fake server time to first token")
+    parser.add_argument("--tokens-per-sec", type=float, default=40.0, help="Fake server decode rate")
+    parser.add_argument("--max-tokens", type=int, default=40, help="Fake server reply length")
+    parser.add_argument("--parallel", type=int, default=0, help="Fake server concurrent generations, 0 = unlimited")
+    parser.add_argument("--cache", action="store_true", help="Leave the response cache on")
+    parser.add_argument("--output", help="Write the JSON report here as well as stdout")
+    args = parser.parse_args(argv)
+
+    server = None
+    host = args.ollama_host
+    if not host:
+        config = FakeOllamaConfig(args.ttft_ms, args.tokens_per_sec, args.max_tokens, args.parallel)
+        server, host = start_fake_ollama(config)
+
+    chatbot = MoriChatbot(
+        args.model,
+        semantic_search=False,
+        host=host,
+        # max_entries=0 evicts on insert - every request reaches the model
+        response_cache=ResponseCache(MemoryBackend(max_entries=1024 if args.cache else 0)),
+        scheduler=OllamaScheduler(max_parallel=args.concurrency, max_queue=args.requests),
+    )
+
+    results = {}
+    for name in [s.strip() for s in args.scenarios.split(",") if s.strip()]:
+        if name not in SCENARIOS:
+            parser.error(f"unknown scenario {name!r}")
+        results[name] = SCENARIOS[name](chatbot, args.requests, args.concurrency)
+
+    report = {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": platform.python_version(),
+        "model": args.model,
+        "ollama": args.ollama_host or "fake",
+        "fake": None if args.ollama_host else {
+            "ttft_ms": args.ttft_ms,
+            "tokens_per_sec": args.tokens_per_sec,
+            "max_tokens": args.max_tokens,
+            "parallel": args.parallel,
+        },
+        "results": results,
+    }
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    if server is not None:
+        server.shutdown()
+    return report
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
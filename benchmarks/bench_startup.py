@@ -0,0 +1,120 @@
+"""
+Mori Startup Benchmark
+How long before the first answer - cold imports, engine construction, first reply
+
+Run from the repository root:
+    python -m benchmarks.bench_startup --runs 5 --output startup.json
+
+Every run is a fresh interpreter, the way a new pod or worker starts.
+"""
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List, Optional
+
+from benchmarks.fake_ollama import FakeOllamaConfig, start_fake_ollama
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+ENTRY_POINTS = ["mori_engine", "mori_server", "mori_batch", "mori_chatbot"]
+
+# Runs in the child: each phase timed from interpreter start, printed as JSON
+FIRST_REPLY = """
+import json, sys, time
+started = time.perf_counter()
+from mori_engine import MoriChatbot
+imported = time.perf_counter()
+chatbot = MoriChatbot(sys.argv[1], semantic_search=False, host=sys.argv[2], speculate=False)
+constructed = time.perf_counter()
+chatbot.generate_mori_response("What are the hazards of the Matterhorn?")
+first = time.perf_counter()
+chatbot.generate_mori_response("How do I read the weather on Everest?")
+second = time.perf_counter()
+print(json.dumps({"import": imported - started, "construct": constructed - imported,
+                  "first_reply": first - constructed, "warm_reply": second - first, "total": first - started}))
+"""
+
+IMPORT_ONLY = """
+import importlib, json, sys, time
+started = time.perf_counter()
+importlib.import_module(sys.argv[1])
+print(json.dumps({"import": time.perf_counter() - started, "modules": len(sys.modules)}))
+"""
+
+
+def _child(code: str, args: List[str], env: Dict[str, str]) -> Dict:
+    result = subprocess.run([sys.executable, "-c", code, *args], cwd=ROOT, env=env,
+                            capture_output=True, text=True, check=True)
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def _median_ms(samples: List[Dict]) -> Dict[str, float]:
+    keys = [key for key in samples[0] if key != "modules"]
+    report = {f"{key}_ms": round(statistics.median(s[key] for s in samples) * 1000.0, 1) for key in keys}
+    if "modules" in samples[0]:
+        report["modules"] = samples[0]["modules"]
+    return report
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Measure Mori's cold start")
+    parser.add_argument("--runs", type=int, default=5, help="Fresh interpreters per measurement (median reported)")
+    parser.add_argument("--model", default="llama3.2:1b")
+    parser.add_argument("--ollama-host", help="Measure against a real Ollama instead of the built-in fake")
+    parser.add_argument("--output", help="Write the JSON report here as well as stdout")
+    args = parser.parse_args(argv)
+
+    server = None
+    host = args.ollama_host
+    if not host:
+        # Instant replies - what's left is Mori's own start-up
+        server, host = start_fake_ollama(FakeOllamaConfig(ttft_ms=0.0, tokens_per_sec=1e6, max_tokens=20))
+
+    with tempfile.TemporaryDirectory() as scratch:
+        env = dict(os.environ, MORI_KNOWLEDGE_SNAPSHOT=os.path.join(scratch, "knowledge.snap"),
+                   MORI_SESSION_DB=os.path.join(scratch, "sessions.db"))
+        env.pop("MORI_CACHE_PATH", None)
+
+        # The first process compiles the snapshot; a baked image skips this
+        started = time.perf_counter()
+        subprocess.run([sys.executable, "knowledge_snapshot.py", "--output", env["MORI_KNOWLEDGE_SNAPSHOT"]],
+                       cwd=ROOT, env=env, capture_output=True, check=True)
+        compile_ms = round((time.perf_counter() - started) * 1000.0, 1)
+
+        imports = {}
+        for module in ENTRY_POINTS:
+            try:
+                imports[module] = _median_ms([_child(IMPORT_ONLY, [module], env) for _ in range(args.runs)])
+            except subprocess.CalledProcessError as e:
+                imports[module] = {"error": e.stderr.strip().splitlines()[-1] if e.stderr.strip() else str(e)}
+        first_reply = _median_ms([_child(FIRST_REPLY, [args.model, host], env) for _ in range(args.runs)])
+
+    report = {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": platform.python_version(),
+        "model": args.model,
+        "ollama": args.ollama_host or "fake",
+        "runs": args.runs,
+        "compile_snapshot_ms": compile_ms,
+        "imports": imports,
+        "first_reply": first_reply,
+    }
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    if server is not None:
+        server.shutdown()
+    return report
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
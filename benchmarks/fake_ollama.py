@@ -0,0 +1,179 @@
+"""
+Fake Ollama Server
+A stand-in mountain - answers like Ollama, at whatever pace you set
+"""
+
+import argparse
+import json
+import threading
+import time
+import zlib
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+
+WORDS = ("The mountain does not care . Snow holds until it doesn't . "
+         "I climb alone because the silence is honest . Wait for the window .").split()
+
+
+class FakeOllamaConfig:
+    """Timing knobs shared by every request handler"""
+
+    def __init__(self, ttft_ms: float = 150.0, tokens_per_sec: float = 40.0,
+                 max_tokens: int = 40, parallel: int = 0, embed_dim: int = 64):
+        self.ttft_ms = ttft_ms
+        self.tokens_per_sec = tokens_per_sec
+        self.max_tokens = max_tokens
+        self.embed_dim = embed_dim
+        # Emulates OLLAMA_NUM_PARALLEL: requests beyond it wait their turn
+        self.slots = threading.Semaphore(parallel) if parallel else None
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+def _embedding(text: str, dim: int):
+    seed = zlib.crc32(text.encode("utf-8"))
+    return [((seed * (i + 1)) % 1000) / 1000.0 - 0.5 for i in range(dim)]
+
+
+class FakeOllamaHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Headers and body go out in separate writes; Nagle would add ~40ms
+    disable_nagle_algorithm = True
+    config = FakeOllamaConfig()
+
+    def log_message(self, format, *args):
+        pass  # Quiet - benchmarks print their own report
+
+    def _read_json(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        return json.loads(self.rfile.read(length) or b"{}")
+
+    def _send_json(self, payload, status: int = 200):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _write_chunk(self, payload):
+        line = json.dumps(payload).encode("utf-8") + b"\n"
+        self.wfile.write(f"{len(line):x}\r\n".encode("ascii") + line + b"\r\n")
+        self.wfile.flush()
+
+    def do_GET(self):
+        if self.path == "/api/tags":
+            self._send_json({"models": []})
+        else:
+            body = b"Ollama is running"
+            self.send_response(200)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    def do_HEAD(self):
+        self.send_response(200)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def do_POST(self):
+        body = self._read_json()
+        if self.path in ("/api/chat", "/api/generate"):
+            if self.config.slots:
+                with self.config.slots:
+                    self._generate(body)
+            else:
+                self._generate(body)
+        elif self.path == "/api/embed":
+            inputs = body.get("input") or []
+            inputs = [inputs] if isinstance(inputs, str) else inputs
+            self._send_json({"model": body.get("model"), "embeddings": [_embedding(t, self.config.embed_dim) for t in inputs]})
+        elif self.path == "/api/embeddings":
+            self._send_json({"embedding": _embedding(body.get("prompt", ""), self.config.embed_dim)})
+        else:
+            self._send_json({"error": f"unknown endpoint {self.path}"}, status=404)
+
+    def _generate(self, body):
+        config = self.config
+        chat = self.path == "/api/chat"
+        prompt = json.dumps(body.get("messages") if chat else body.get("prompt"))
+        prompt_tokens = max(1, len(prompt) // 4)
+        num_predict = int((body.get("options") or {}).get("num_predict") or config.max_tokens)
+        n_tokens = min(num_predict, config.max_tokens)
+        started = time.perf_counter()
+
+        def piece(i: int, text: str, done: bool = False):
+            payload = {"model": body.get("model"), "created_at": _now(), "done": done}
+            if chat:
+                payload["message"] = {"role": "assistant", "content": text}
+            else:
+                payload["response"] = text
+            if done:
+                elapsed = time.perf_counter() - started
+                prefill = config.ttft_ms / 1000.0
+                payload.update({
+                    "done_reason": "length" if n_tokens == num_predict else "stop",
+                    "total_duration": int(elapsed * 1e9),
+                    "load_duration": 0,
+                    "prompt_eval_count": prompt_tokens,
+                    "prompt_eval_duration": int(prefill * 1e9),
+                    "eval_count": i,
+                    "eval_duration": int(max(elapsed - prefill, 0) * 1e9),
+                })
+            return payload
+
+        tokens = [(WORDS[i % len(WORDS)] + " ") for i in range(n_tokens)]
+        time.sleep(config.ttft_ms / 1000.0)
+        if body.get("stream", True):
+            self.send_response(200)
+            self.send_header("Content-Type", "application/x-ndjson")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            try:
+                for i, token in enumerate(tokens):
+                    if i:
+                        time.sleep(1.0 / config.tokens_per_sec)
+                    self._write_chunk(piece(i + 1, token))
+                self._write_chunk(piece(len(tokens), "", done=True))
+                self.wfile.write(b"0\r\n\r\n")
+            except (BrokenPipeError, ConnectionResetError):
+                self.close_connection = True  # Client cancelled the stream
+        else:
+            time.sleep(max(len(tokens) - 1, 0) / config.tokens_per_sec)
+            final = piece(len(tokens), "".join(tokens), done=True)
+            self._send_json(final)
+
+
+def start_fake_ollama(config: Optional[FakeOllamaConfig] = None, host: str = "127.0.0.1", port: int = 0):
+    """Start the server on a background thread; returns (server, base_url)"""
+    handler = type("ConfiguredFakeOllamaHandler", (FakeOllamaHandler,), {"config": config or FakeOllamaConfig()})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline stand-in for the Ollama HTTP API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11435)
+    parser.add_argument("--ttft-ms", type=float, default=150.0)
+    parser.add_argument("--tokens-per-sec", type=float, default=40.0)
+    parser.add_argument("--max-tokens", type=int, default=40)
+    parser.add_argument("--parallel", type=int, default=0, help="Concurrent generations, 0 = unlimited")
+    args = parser.parse_args()
+
+    config = FakeOllamaConfig(args.ttft_ms, args.tokens_per_sec, args.max_tokens, args.parallel)
+    server, url = start_fake_ollama(config, args.host, args.port)
+    print(f"🏔️ Fake Ollama on {url} (OLLAMA_HOST={url})")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+"""
+Mori Circuit Breaker
+When the rope frays, stop pulling on it - deadlines and breakers around each model
+"""
+
+import os
+import threading
+import time
+from typing import Dict, Optional
+
+from mori_metrics import REGISTRY
+
+FALLBACKS = REGISTRY.counter("mori_fallback_total", "Replies served by a degradation level (model, cache, pattern, busy)")
+TRIPS = REGISTRY.counter("mori_breaker_trips_total", "Times a model's breaker opened")
+
+
+class DeadlineExceeded(Exception):
+    """The request ran out of time before the model answered"""
+
+
+class Unanswered(Exception):
+    """No model answered and the engine was told not to degrade"""
+
+
+class Deadline:
+    """A point in time a request must be answered by"""
+
+    __slots__ = ("expires",)
+
+    def __init__(self, seconds: float):
+        self.expires = time.monotonic() + seconds
+
+    def remaining(self) -> float:
+        return max(0.0, self.expires - time.monotonic())
+
+    def expired(self) -> bool:
+        return time.monotonic() >= self.expires
+
+
+class CircuitBreaker:
+    """Stops sending requests to a model that keeps failing or missing deadlines.
+
+    Closed: everything goes through. After failure_threshold failures in a
+    row it opens, and for reset_after seconds requests skip the model
+    without waiting. Then one trial request is let through (half-open):
+    success closes the breaker, failure opens it again.
+    """
+
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+    def __init__(self, model: str, failure_threshold: int = 5, reset_after: float = 30.0):
+        self.model = model
+        self.failure_threshold = failure_threshold
+        self.reset_after = reset_after
+        self.state = self.CLOSED
+        self._failures = 0
+        self._changed_at = 0.0
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        """Whether a request may try this model now"""
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            # Open long enough, or a trial that never reported back - let one through
+            if time.monotonic() - self._changed_at >= self.reset_after:
+                self.state, self._changed_at = self.HALF_OPEN, time.monotonic()
+                return True
+            return False
+
+    def success(self):
+        with self._lock:
+            self.state, self._failures = self.CLOSED, 0
+
+    def failure(self):
+        with self._lock:
+            self._failures += 1
+            if self.state == self.HALF_OPEN or (self.state == self.CLOSED and self._failures >= self.failure_threshold):
+                self.state, self._changed_at = self.OPEN, time.monotonic()
+                TRIPS.inc(model=self.model)
+
+
+_BREAKERS: Dict[str, CircuitBreaker] = {}
+_BREAKERS_LOCK = threading.Lock()
+
+
+def get_breaker(model: str) -> CircuitBreaker:
+    """Process-wide breaker per model.
+
+    MORI_BREAKER_FAILURES  failures in a row that open it (default 5)
+    MORI_BREAKER_RESET     seconds it stays open before a trial request (default 30)
+    """
+    with _BREAKERS_LOCK:
+        breaker = _BREAKERS.get(model)
+        if breaker is None:
+            breaker = _BREAKERS[model] = CircuitBreaker(
+                model,
+                failure_threshold=int(os.environ.get("MORI_BREAKER_FAILURES", "5")),
+                reset_after=float(os.environ.get("MORI_BREAKER_RESET", "30")),
+            )
+        return breaker
+
+
+def _open_breakers() -> Dict:
+    with _BREAKERS_LOCK:
+        return {(("model", model),): 0.0 if breaker.state == CircuitBreaker.CLOSED else 1.0
+                for model, breaker in _BREAKERS.items()}
+
+
+REGISTRY.gauge("mori_breaker_open", "1 while a model's breaker is open or half-open", _open_breakers)
+
+
+def default_deadline() -> Optional[float]:
+    """MORI_DEADLINE - seconds until a reply (or, streaming, its first token) before degrading; 0 disables"""
+    seconds = float(os.environ.get("MORI_DEADLINE", "20"))
+    return seconds or None
@@ -0,0 +1,142 @@
+"""
+Mori Context Builder
+Packing only what the climb needs - persona, knowledge, recent words
+"""
+
+import re
+from typing import Dict, List, Optional
+
+from mori_persona import MORI_SYSTEM_PROMPT
+
+_WORD_RE = re.compile(r"\w+|[^\w\s]")
+
+STYLE_INSTRUCTIONS = "Respond in 1-2 short sentences. Be direct, honest, sometimes distant. Don't be overly helpful."
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap token estimate - no tokenizer round trip.
+
+    Takes the larger of ~4 characters per token and ~0.75 words per token,
+    which tracks llama-style BPE closely enough for budgeting.
+    """
+    if not text:
+        return 0
+    return max(len(text) // 4, len(_WORD_RE.findall(text)) * 4 // 3, 1)
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """Cut text down to roughly max_tokens, keeping the start"""
+    if estimate_tokens(text) <= max_tokens:
+        return text
+    cut = max(max_tokens * 4, 0)
+    while cut > 0 and estimate_tokens(text[:cut]) > max_tokens:
+        cut = int(cut * 0.9)
+    return text[:cut].rsplit(" ", 1)[0] + "..."
+
+
+def _first_sentence(text: str) -> str:
+    match = re.search(r"[.?!](\s|$)", text)
+    return text[:match.end()].strip() if match else text.strip()
+
+
+def knowledge_preamble(data: Dict) -> str:
+    """Static outline of what the knowledge base covers - data maps categories to subcategory dicts or names"""
+    lines = []
+    for category, subcategories in data.items():
+        topics = ", ".join(key.replace("_", " ") for key in subcategories) if isinstance(subcategories, (dict, list)) else ""
+        lines.append(f"- {category.replace('_', ' ')}: {topics}" if topics else f"- {category.replace('_', ' ')}")
+    return "You know the mountains well, including:\n" + "\n".join(lines)
+
+
+class ContextBuilder:
+    """Assemble chat messages for Ollama under an explicit token budget.
+
+    Priority: persona and the user message always go in, then retrieved
+    knowledge up to its own cap, then the session summary (if one has been
+    built), then the most recent turns. Turns that no longer fit are
+    reduced to a one-line recap of what was asked.
+
+    Layout keeps the front of the prompt byte-identical across turns so
+    Ollama can reuse its KV cache: the system message never changes, past
+    turns are replayed verbatim, and everything per-turn (retrieved
+    knowledge, recap) goes in a note right before the new user message.
+    """
+
+    def __init__(
+        self,
+        system_prompt: str = MORI_SYSTEM_PROMPT,
+        budget_tokens: int = 1024,
+        knowledge_tokens: int = 200,
+        turn_tokens: int = 120,
+        recap_tokens: int = 80,
+        summary_tokens: int = 120,
+        preamble: str = "",
+    ):
+        self.system_prompt = f"{system_prompt}\n\n{STYLE_INSTRUCTIONS}"
+        if preamble:
+            self.system_prompt += f"\n\n{preamble}"
+        self.budget_tokens = budget_tokens
+        self.knowledge_tokens = knowledge_tokens
+        self.turn_tokens = turn_tokens
+        self.recap_tokens = recap_tokens
+        self.summary_tokens = summary_tokens
+
+    def _fit_knowledge(self, knowledge: str, budget: int) -> str:
+        kept, used = [], 0
+        for line in knowledge.splitlines():
+            cost = estimate_tokens(line)
+            if used + cost > budget:
+                break
+            kept.append(line)
+            used += cost
+        return "\n".join(kept)
+
+    def _recap(self, turns: List[Dict], budget: int) -> str:
+        """One-line extractive summary of the turns that fell out of the window"""
+        asked = [_first_sentence(turn["content"]) for turn in turns if turn["role"] == "user"]
+        if not asked or budget <= 0:
+            return ""
+        return truncate_to_tokens("Earlier they asked: " + " ".join(asked), budget)
+
+    def prefix_messages(self) -> List[Dict]:
+        """The stable head of every prompt - what warm-up should prefill"""
+        return [{"role": "system", "content": self.system_prompt}]
+
+    def build(self, user_message: str, history: Optional[List[Dict]] = None, knowledge: str = "",
+              summary: str = "") -> List[Dict]:
+        """Return the message list for ollama.chat; history is whatever summary doesn't cover"""
+        history = history or []
+        remaining = self.budget_tokens - estimate_tokens(self.system_prompt) - estimate_tokens(user_message)
+
+        notes = []
+        if knowledge and remaining > 0:
+            knowledge = self._fit_knowledge(knowledge, min(self.knowledge_tokens, remaining))
+            if knowledge:
+                notes.append(f"What you know that may be relevant:\n{knowledge}")
+                remaining -= estimate_tokens(knowledge)
+
+        if summary and remaining > 0:
+            summary = truncate_to_tokens(summary, min(self.summary_tokens, remaining))
+            notes.insert(0, f"Earlier in this conversation: {summary}")
+            remaining -= estimate_tokens(notes[0])
+
+        # Newest turns first until the budget runs out, leaving room for a recap
+        recent: List[Dict] = []
+        turn_budget = remaining - (self.recap_tokens if len(history) > 1 else 0)
+        for turn in reversed(history):
+            content = truncate_to_tokens(turn["content"], self.turn_tokens)
+            cost = estimate_tokens(content)
+            if cost > turn_budget:
+                break
+            recent.append({"role": turn["role"], "content": content})
+            turn_budget -= cost
+        recent.reverse()
+        remaining -= sum(estimate_tokens(turn["content"]) for turn in recent)
+
+        older = history[:len(history) - len(recent)]
+        recap = self._recap(older, min(self.recap_tokens, remaining))
+        if recap:
+            notes.insert(0, recap)
+
+        note = [{"role": "system", "content": "\n\n".join(notes)}] if notes else []
+        return self.prefix_messages() + recent + note + [{"role": "user", "content": user_message}]
@@ -0,0 +1,144 @@
+"""
+Mori Conversation Summary
+Remembering the route, not every step - rolling summaries built off the request path
+"""
+
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Tuple
+
+from context_builder import estimate_tokens
+from mori_metrics import count_error, span
+
+# summarize(previous summary, turns to fold in) -> new summary
+Summarize = Callable[[str, List[Dict]], str]
+
+
+class _Summary:
+    """A session's running summary, the position of the last turn it covers and that turn"""
+
+    __slots__ = ("text", "upto", "marker")
+
+    def __init__(self, text: str, upto: int, marker: Tuple[str, str]):
+        self.text = text
+        self.upto = upto
+        self.marker = marker
+
+
+def _position(history: List[Dict], index: int) -> int:
+    """A turn's place in its conversation - the store's seq, else its index in history"""
+    return history[index].get("seq", index)
+
+
+def _marker(turn: Dict) -> Tuple[str, str]:
+    return turn["role"], turn["content"]
+
+
+class ConversationSummarizer:
+    """Per-session rolling summaries, refreshed on a worker pool.
+
+    context() never waits on a model: it returns the cached summary and the
+    turns after it, and when those turns pass threshold_tokens it queues a
+    job that folds all but the last keep_turns into the summary for the
+    next request.
+    """
+
+    def __init__(self, threshold_tokens: int = 400, keep_turns: int = 4,
+                 max_workers: int = 2, max_sessions: int = 10000):
+        self.threshold_tokens = threshold_tokens
+        self.keep_turns = keep_turns
+        self.max_sessions = max_sessions
+        self._summaries: "OrderedDict[str, _Summary]" = OrderedDict()
+        self._pending = set()
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="mori-summary")
+
+    def context(self, session_id: str, history: Optional[List[Dict]],
+                summarize: Optional[Summarize] = None) -> Tuple[str, List[Dict]]:
+        """(summary, turns not yet in it) - schedules a refresh when they grow too long"""
+        history = history or []
+        if not session_id or not history:
+            return "", history
+
+        summary, rest = "", history
+        with self._lock:
+            entry = self._summaries.get(session_id)
+            if entry is not None:
+                start = self._after(history, entry)
+                if start is None:
+                    # The turns it covered are gone - a cleared or different conversation
+                    del self._summaries[session_id]
+                else:
+                    self._summaries.move_to_end(session_id)
+                    summary, rest = entry.text, history[start:]
+
+        if summarize is not None and len(rest) > self.keep_turns:
+            if sum(estimate_tokens(turn["content"]) for turn in rest) > self.threshold_tokens:
+                last = len(history) - self.keep_turns - 1
+                self._schedule(session_id, summary, rest[:-self.keep_turns],
+                               _position(history, last), summarize)
+        return summary, rest
+
+    @staticmethod
+    def _after(history: List[Dict], entry: _Summary) -> Optional[int]:
+        """Index just past the last turn entry covers, None if history isn't that conversation"""
+        for index in range(len(history)):
+            position = _position(history, index)
+            if position == entry.upto:
+                return index + 1 if _marker(history[index]) == entry.marker else None
+            if position > entry.upto:
+                # The covered turns have slid out of the window - everything here is newer
+                return index if index == 0 else None
+        return None
+
+    def _schedule(self, session_id: str, summary: str, turns: List[Dict], upto: int,
+                  summarize: Summarize):
+        with self._lock:
+            if session_id in self._pending:
+                return
+            self._pending.add(session_id)
+        self._pool.submit(self._refresh, session_id, summary, turns, upto, summarize)
+
+    def _refresh(self, session_id: str, summary: str, turns: List[Dict], upto: int,
+                 summarize: Summarize):
+        try:
+            with span("summarize", turns=len(turns)):
+                text = summarize(summary, turns)
+            if text:
+                with self._lock:
+                    self._summaries[session_id] = _Summary(text, upto, _marker(turns[-1]))
+                    self._summaries.move_to_end(session_id)
+                    while len(self._summaries) > self.max_sessions:
+                        self._summaries.popitem(last=False)
+        except Exception as e:
+            # The next turn falls back to the extractive recap
+            count_error("summarize", e)
+        finally:
+            with self._lock:
+                self._pending.discard(session_id)
+
+    def forget(self, session_id: str):
+        with self._lock:
+            self._summaries.pop(session_id, None)
+
+
+_SUMMARIZER: Optional[ConversationSummarizer] = None
+_SUMMARIZER_LOCK = threading.Lock()
+
+
+def get_summarizer() -> ConversationSummarizer:
+    """Process-wide summarizer - summaries are plain text, shared across models.
+
+    MORI_SUMMARY_THRESHOLD sets the unsummarised-history token threshold,
+    MORI_SUMMARY_KEEP_TURNS how many recent turns always stay verbatim.
+    """
+    global _SUMMARIZER
+    with _SUMMARIZER_LOCK:
+        if _SUMMARIZER is None:
+            _SUMMARIZER = ConversationSummarizer(
+                threshold_tokens=int(os.environ.get("MORI_SUMMARY_THRESHOLD", "400")),
+                keep_turns=int(os.environ.get("MORI_SUMMARY_KEEP_TURNS", "4")),
+            )
+        return _SUMMARIZER
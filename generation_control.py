@@ -0,0 +1,190 @@
+"""
+Mori Generation Control
+Say enough, then stop - token budgets by kind of question, streams cut at a sentence's end
+"""
+
+import os
+import re
+import time
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from mori_metrics import REGISTRY, record_ollama_stats
+
+GENERATION_ENDS = REGISTRY.counter(
+    "mori_generation_end_total", "How generations ended: sentences (cut by Mori), stop (the model's own end), length"
+)
+
+# (num_predict, sentences) per kind of message. The budgets leave room to
+# finish the last sentence - the sentence count, not num_predict, should end a reply.
+DEFAULT_BUDGETS: Dict[str, Tuple[int, int]] = {
+    "remark": (32, 1),
+    "question": (64, 2),
+    "explain": (96, 2),
+}
+
+EXPLAIN_WORDS = {"how", "why", "explain", "describe", "compare", "difference", "prepare", "plan", "tell"}
+# "how high is K2?" asks for a figure, not an explanation
+MEASURE_WORDS = {"high", "tall", "long", "far", "much", "many", "big", "deep", "steep", "cold", "hot", "warm",
+                 "old", "often", "fast", "heavy", "wide", "low", "soon", "late", "early"}
+QUESTION_WORDS = {"what", "where", "when", "which", "who", "whose", "is", "are", "was", "were", "can", "could",
+                  "should", "would", "do", "does", "did", "will", "have", "has"}
+
+SENTENCE_ENDS = ".!?"
+CLOSERS = "\"')]”’"
+# Words a full stop follows without ending the sentence
+ABBREVIATIONS = {"mt", "mts", "st", "dr", "mr", "mrs", "ms", "vs", "approx", "e.g", "i.e"}
+
+_WORD_RE = re.compile(r"[a-z']+")
+
+
+def _asks_to_explain(words: List[str]) -> bool:
+    """An explain word - but not "how" asking for a measure"""
+    for i, word in enumerate(words):
+        if word in EXPLAIN_WORDS:
+            if word == "how" and i + 1 < len(words) and words[i + 1] in MEASURE_WORDS:
+                continue
+            return True
+    return False
+
+
+class SentenceStop:
+    """Watches a reply as it streams and says when it has its sentences.
+
+    A '.', '!' or '?' ends a sentence only once whitespace follows it, so
+    "8,848.86m" doesn't, and neither does an ellipsis or "Mt.". The
+    punctuation is held back until that is known; whatever the model
+    says after the last sentence never reaches the visitor.
+    """
+
+    def __init__(self, sentences: Optional[int] = None):
+        self.sentences = sentences
+        self.count = 0
+        self.done = False
+        self.reason: Optional[str] = None
+        self.tokens = 0
+        # Length of the reply up to the end of its last full sentence
+        self.sentence_end = 0
+        self._text = ""
+        self._held = ""
+        self._first_at: Optional[float] = None
+
+    def _ends_sentence(self) -> bool:
+        punctuation = self._held.rstrip(CLOSERS)
+        if len(punctuation) > 1 and set(punctuation) == {"."}:
+            return False
+        if punctuation == ".":
+            words = self._text.split()
+            if words and words[-1].lower().lstrip("(\"'") in ABBREVIATIONS:
+                return False
+        return True
+
+    def feed(self, token: str) -> str:
+        """The part of token that belongs in the reply; sets done once the last sentence has ended"""
+        if self.done:
+            return ""
+        self.tokens += 1
+        if self._first_at is None:
+            self._first_at = time.perf_counter()
+        start = len(self._text)
+        for ch in token:
+            if self._held:
+                if ch in SENTENCE_ENDS or ch in CLOSERS:
+                    self._held += ch
+                    continue
+                ended = ch.isspace() and self._ends_sentence()
+                self._text += self._held
+                self._held = ""
+                if ended:
+                    self.count += 1
+                    self.sentence_end = len(self._text)
+                    if self.sentences and self.count >= self.sentences:
+                        self.done = True
+                        break
+            if ch in SENTENCE_ENDS:
+                self._held = ch
+            else:
+                self._text += ch
+        return self._text[start:]
+
+    def flush(self) -> str:
+        """Punctuation still held back when the stream ended - it ends the last sentence"""
+        held, self._held = self._held, ""
+        if held:
+            self._text += held
+            if self._ends_sentence():
+                self.sentence_end = len(self._text)
+        return held
+
+    def ended(self, chunk, model: str) -> bool:
+        """Whether the reply is complete after chunk: Ollama's final chunk, or the last sentence ended"""
+        if chunk.get("done"):
+            record_ollama_stats(chunk, model)
+            self.reason = chunk.get("done_reason") or "stop"
+        elif self.done:
+            # A cancelled stream never gets Ollama's stats - count the decoding that did happen
+            elapsed = time.perf_counter() - self._first_at if self._first_at else 0.0
+            record_ollama_stats({"eval_count": self.tokens, "eval_duration": int(elapsed * 1e9)}, model)
+            self.reason = "sentences"
+        else:
+            return False
+        GENERATION_ENDS.inc(model=model, reason=self.reason)
+        return True
+
+    def reply(self) -> str:
+        """The whole reply - cut back to its last full sentence if num_predict ran out mid-way"""
+        self.flush()
+        if self.reason == "length" and self.sentence_end:
+            return self._text[:self.sentence_end].rstrip()
+        return self._text.rstrip()
+
+
+class GenerationPlan:
+    """Token budget and sentence count for one reply"""
+
+    __slots__ = ("kind", "num_predict", "sentences")
+
+    def __init__(self, kind: str, num_predict: int, sentences: Optional[int]):
+        self.kind = kind
+        self.num_predict = num_predict
+        self.sentences = sentences
+
+    def stopper(self) -> SentenceStop:
+        return SentenceStop(self.sentences)
+
+
+class GenerationController:
+    """Picks each reply's token budget and sentence count from the message.
+
+    Budgets are ceilings - a reply is cut at its last sentence's end,
+    usually well before num_predict. With early_stop off the budgets
+    still apply but the model runs to its own end. Stop sequences go to
+    Ollama as they are.
+    """
+
+    def __init__(self, budgets: Optional[Dict[str, Sequence[int]]] = None,
+                 stop_sequences: Optional[List[str]] = None, early_stop: bool = True):
+        self.budgets = dict(DEFAULT_BUDGETS)
+        for kind, (num_predict, sentences) in (budgets or {}).items():
+            self.budgets[kind] = (int(num_predict), int(sentences))
+        self.stop_sequences = list(stop_sequences or [])
+        self.early_stop = early_stop
+
+    @staticmethod
+    def kind(message: str) -> str:
+        """remark, question or explain"""
+        words = _WORD_RE.findall(message.lower())
+        if _asks_to_explain(words):
+            return "explain"
+        if "?" in message or (words and words[0] in QUESTION_WORDS):
+            return "question"
+        return "remark"
+
+    def plan(self, message: str) -> GenerationPlan:
+        kind = self.kind(message)
+        num_predict, sentences = self.budgets[kind]
+        return GenerationPlan(kind, num_predict, sentences if self.early_stop else None)
+
+
+def early_stop_enabled() -> bool:
+    """MORI_EARLY_STOP=0 lets every reply run to the model's own end (or its budget)"""
+    return os.environ.get("MORI_EARLY_STOP", "1").lower() not in ("0", "false", "no", "off")
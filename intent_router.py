@@ -0,0 +1,131 @@
+"""
+Mori Intent Router
+Some questions don't need the climb - canned answers without a model call
+"""
+
+import random
+from collections import Counter
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from knowledge_index import KnowledgeEntry, tokenize
+from mori_metrics import REGISTRY
+
+FAST_PATH = REGISTRY.counter("mori_fast_path_total", "Messages seen by the intent router, by intent and result (hit/miss)")
+
+# Words that carry no intent of their own - they don't lower confidence
+FILLER = {"can", "could", "please", "just", "so", "ok", "okay", "really", "know", "like", "think",
+          "there", "this", "mori", "mountain", "mount", "climb", "climbing", "get", "need", "any", "some"}
+
+# An optional classifier: message -> (intent, confidence), consulted when keywords are unsure
+Classifier = Callable[[str], Tuple[Optional[str], float]]
+
+
+class Route:
+    """The router's decision for one message"""
+
+    __slots__ = ("intent", "confidence", "response")
+
+    def __init__(self, intent: Optional[str], confidence: float, response: Optional[str] = None):
+        self.intent = intent
+        self.confidence = confidence
+        self.response = response
+
+
+class IntentRouter:
+    """Keyword intent matcher in front of the model.
+
+    Confidence is the share of a message's words the matched intent
+    explains, so "hey", "what about the weather?" or "how tall is K2?" go
+    through, while anything longer or more specific falls to the model.
+    """
+
+    def __init__(self, keywords: Dict[str, List[str]], patterns: Dict[str, str], starters: List[str],
+                 entries: Iterable[KnowledgeEntry], fact_templates: Dict[str, Dict], threshold: float = 0.8,
+                 max_words: int = 6, classifier: Optional[Classifier] = None):
+        self.patterns = patterns
+        self.starters = [starter for starter in starters if starter.strip(".")] or starters
+        self.fact_templates = fact_templates
+        self.threshold = threshold
+        self.max_words = max_words
+        self.classifier = classifier
+
+        self.intent_words: Dict[str, str] = {}
+        for intent, words in keywords.items():
+            for term in tokenize(" ".join(words)):
+                self.intent_words.setdefault(term, intent)
+
+        self.field_words: Dict[str, str] = {}
+        for field, spec in fact_templates.items():
+            for term in tokenize(" ".join(spec["aliases"])):
+                self.field_words.setdefault(term, field)
+
+        # Name words unique to one entry ("k2", "capitan", "fuji") identify it
+        entries = [entry for entry in entries if isinstance(entry.info, dict)]
+        owners = Counter(term for entry in entries for term in set(tokenize(entry.subcategory)))
+        self.entity_words = {}
+        for entry in entries:
+            for term in tokenize(entry.subcategory):
+                if owners[term] == 1:
+                    self.entity_words[term] = entry
+
+    def _respond(self, intent: str) -> Optional[str]:
+        """The canned reply for intent - None when the persona has none, so the model answers"""
+        if intent == "greeting":
+            return random.choice(self.starters) if self.starters else None
+        return self.patterns.get(intent)
+
+    def _fact(self, terms: List[str]) -> Route:
+        entities = {self.entity_words[t].key: self.entity_words[t] for t in terms if t in self.entity_words}
+        fields = {self.field_words[t] for t in terms if t in self.field_words}
+        if len(entities) != 1 or len(fields) != 1:
+            return Route(None, 0.0)
+        entry, field = next(iter(entities.values())), next(iter(fields))
+        if field not in entry.info:
+            return Route(None, 0.0)
+        explained = sum(1 for t in terms if t in self.entity_words or t in self.field_words or t in FILLER)
+        name = entry.subcategory.replace("_", " ").title()
+        response = self.fact_templates[field]["template"].format(
+            name=name, field=field, value=str(entry.info[field]).strip())
+        return Route(f"fact:{field}", explained / len(terms), response)
+
+    def _pattern(self, terms: List[str]) -> Route:
+        intents = {self.intent_words[t] for t in terms if t in self.intent_words}
+        if len(intents) != 1:
+            return Route(None, 0.0)
+        intent = intents.pop()
+        explained = sum(1 for t in terms if t in self.intent_words or t in FILLER)
+        return Route(intent, explained / len(terms), self._respond(intent))
+
+    def classify(self, message: str) -> Route:
+        """Best intent for message, with its confidence - never calls a model"""
+        terms = [term for term in tokenize(message) if len(term) > 1 or term.isdigit()]
+        if not terms:
+            # "..." or "?" - silence gets a conversation starter; bare stopwords go to the model
+            if message.strip() and not any(char.isalnum() for char in message):
+                return Route("greeting", 1.0, self._respond("greeting"))
+            return Route(None, 0.0)
+        if len(terms) > self.max_words:
+            return Route(None, 0.0)
+        fact = self._fact(terms)
+        pattern = self._pattern(terms)
+        # A fact names something specific, so it wins ties
+        return fact if fact.confidence >= pattern.confidence and fact.intent else pattern
+
+    def route(self, message: str) -> Optional[str]:
+        """A canned reply when confidence clears the threshold, else None"""
+        decision = self.classify(message)
+        if decision.confidence < self.threshold and self.classifier is not None:
+            intent, confidence = self.classifier(message)
+            if intent in self.patterns or intent == "greeting":
+                decision = Route(intent, confidence, self._respond(intent))
+        if decision.response is not None and decision.confidence >= self.threshold:
+            FAST_PATH.inc(intent=decision.intent.split(":")[0], result="hit")
+            return decision.response
+        FAST_PATH.inc(intent="none", result="miss")
+        return None
+
+
+def get_intent_router() -> IntentRouter:
+    """Mori's router, rebuilt when the knowledge snapshot changes; MORI_FAST_PATH_THRESHOLD sets the confidence bar (0-1)"""
+    from persona_registry import DEFAULT_PERSONA, get_persona_registry
+    return get_persona_registry().get(DEFAULT_PERSONA).intent_router
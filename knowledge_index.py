@@ -0,0 +1,156 @@
+"""
+Mountain Knowledge Index
+Finding the right ledge without climbing the whole face
+"""
+
+import heapq
+import math
+import re
+from collections import Counter, defaultdict
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# Letters and digits only - underscores split words, so free_solo == "free solo"
+_TOKEN_RE = re.compile(r"[^\W_]+")
+
+STOPWORDS = {
+    "a", "an", "and", "are", "about", "at", "be", "do", "does", "for", "from",
+    "how", "i", "in", "is", "it", "me", "my", "of", "on", "or", "should",
+    "tell", "that", "the", "to", "what", "when", "where", "which", "who",
+    "why", "with", "you", "your"
+}
+
+
+def _normalize(token: str) -> str:
+    """Fold simple plurals so 'ropes' finds 'rope'"""
+    if len(token) > 3 and token.endswith("s") and not token.endswith("ss"):
+        return token[:-1]
+    return token
+
+
+def tokenize(text: str) -> List[str]:
+    """Split text into normalized search terms"""
+    return [
+        _normalize(token)
+        for token in _TOKEN_RE.findall(text.lower())
+        if token not in STOPWORDS
+    ]
+
+
+class KnowledgeEntry:
+    """One subcategory of the knowledge base, e.g. techniques.free_solo"""
+
+    __slots__ = ("category", "subcategory", "info")
+
+    def __init__(self, category: str, subcategory: str, info):
+        self.category = category
+        self.subcategory = subcategory
+        self.info = info
+
+    @property
+    def key(self) -> str:
+        return f"{self.category}.{self.subcategory}"
+
+    def text(self) -> str:
+        """Field text, without the key names"""
+        if isinstance(self.info, dict):
+            return "; ".join(f"{field.replace('_', ' ')}: {value}" for field, value in self.info.items())
+        return str(self.info)
+
+    def __str__(self) -> str:
+        return f"{self.subcategory}: {self.text()}"
+
+
+def flatten_knowledge(data: Dict) -> List[KnowledgeEntry]:
+    """Flatten category -> subcategory -> info into entries"""
+    entries = []
+    for category, subcategories in data.items():
+        if isinstance(subcategories, dict):
+            for subcategory, info in subcategories.items():
+                entries.append(KnowledgeEntry(category, subcategory, info))
+        else:
+            entries.append(KnowledgeEntry(category, category, subcategories))
+    return entries
+
+
+def entry_chunks(entries: Iterable[KnowledgeEntry]) -> List[Tuple[str, str]]:
+    """Knowledge entries as (chunk_id, text) pairs, one per field"""
+    chunks = []
+    for entry in entries:
+        if entry.category == entry.subcategory and not isinstance(entry.info, dict):
+            chunks.append((entry.category, f"{entry.category.replace('_', ' ')}: {entry.info}"))
+            continue
+        topic = entry.subcategory.replace("_", " ")
+        if isinstance(entry.info, dict):
+            for field, value in entry.info.items():
+                chunks.append((
+                    f"{entry.key}.{field}",
+                    f"{topic} {field.replace('_', ' ')}: {value}"
+                ))
+        else:
+            chunks.append((entry.key, f"{topic}: {entry.info}"))
+    return chunks
+
+
+class KnowledgeIndex:
+    """BM25 inverted index over knowledge entries, keys and values alike"""
+
+    # Key names say what an entry is about, so they count more than field text
+    KEY_WEIGHT = 3
+
+    def __init__(self, entries: List[KnowledgeEntry], k1: float = 1.2, b: float = 0.75):
+        self.entries = entries
+        self.k1 = k1
+        self.b = b
+        self.postings: Dict[str, List[Tuple[int, float]]] = {}
+        self._build()
+
+    @classmethod
+    def from_data(cls, data: Dict) -> "KnowledgeIndex":
+        return cls(flatten_knowledge(data))
+
+    def _entry_terms(self, entry: KnowledgeEntry) -> Counter:
+        terms = Counter(tokenize(entry.text()))
+        if isinstance(entry.info, dict):
+            terms.update(tokenize(" ".join(entry.info)))
+        for term in tokenize(f"{entry.category} {entry.subcategory}"):
+            terms[term] += self.KEY_WEIGHT
+        return terms
+
+    def _build(self):
+        """Precompute the full BM25 weight of every term/entry pair"""
+        doc_terms = [self._entry_terms(entry) for entry in self.entries]
+        doc_lengths = [sum(terms.values()) for terms in doc_terms]
+        n_docs = len(self.entries)
+        avg_length = (sum(doc_lengths) / n_docs) if n_docs else 0.0
+
+        raw = defaultdict(list)
+        for doc_id, terms in enumerate(doc_terms):
+            for term, tf in terms.items():
+                raw[term].append((doc_id, tf))
+
+        for term, docs in raw.items():
+            idf = math.log(1 + (n_docs - len(docs) + 0.5) / (len(docs) + 0.5))
+            weighted = []
+            for doc_id, tf in docs:
+                norm = self.k1 * (1 - self.b + self.b * doc_lengths[doc_id] / avg_length)
+                weighted.append((doc_id, idf * tf * (self.k1 + 1) / (tf + norm)))
+            self.postings[term] = weighted
+
+    def category_entries(self, category: str, limit: Optional[int] = None) -> List[KnowledgeEntry]:
+        found = [entry for entry in self.entries if entry.category == category]
+        return found if limit is None else found[:limit]
+
+    def search(self, query: str, top_k: int = 3) -> List[Tuple[KnowledgeEntry, float]]:
+        """Return the top_k entries for a query, best first"""
+        scores: Dict[int, float] = defaultdict(float)
+        for term in set(tokenize(query)):
+            for doc_id, weight in self.postings.get(term, ()):
+                scores[doc_id] += weight
+        best = heapq.nlargest(top_k, scores.items(), key=lambda item: item[1])
+        return [(self.entries[doc_id], score) for doc_id, score in best]
+
+
+def get_knowledge_index():
+    """The live index - the compiled knowledge snapshot, which searches like KnowledgeIndex"""
+    from knowledge_snapshot import get_snapshot
+    return get_snapshot()
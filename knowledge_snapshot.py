@@ -0,0 +1,410 @@
+"""
+Mountain Knowledge Snapshot
+The whole range in one file - data files compiled once, mapped by every process
+
+Build by hand (it also rebuilds itself when the sources change):
+    python knowledge_snapshot.py --source knowledge --output .mori_index/knowledge.snap
+"""
+
+import argparse
+import bisect
+import hashlib
+import json
+import mmap
+import os
+import re
+import threading
+import time
+from typing import TYPE_CHECKING, Dict, Iterator, List, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows - single writer assumed
+    fcntl = None
+
+from knowledge_index import KnowledgeEntry, KnowledgeIndex, entry_chunks, flatten_knowledge, tokenize
+
+if TYPE_CHECKING:
+    import numpy as np
+
+MAGIC = b"MORIKB\n\x00"
+FORMAT_VERSION = 2
+SOURCE_SUFFIXES = (".json", ".yaml", ".yml", ".md")
+DEFAULT_SOURCE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "knowledge")
+DEFAULT_SNAPSHOT_PATH = os.path.join(".mori_index", "knowledge.snap")
+
+_FIELD_RE = re.compile(r"^[-*]\s*([^:]+):\s*(.*)$")
+
+
+def _read_markdown(text: str, default_category: str) -> Dict:
+    """# category (optional), ## subcategory, then "- field: value" bullets"""
+    data: Dict = {}
+    category, subcategory = default_category, None
+    for line in text.splitlines():
+        stripped = line.strip()
+        if stripped.startswith("## "):
+            subcategory = stripped[3:].strip().lower().replace(" ", "_")
+            data.setdefault(category, {})[subcategory] = {}
+        elif stripped.startswith("# "):
+            category, subcategory = stripped[2:].strip().lower().replace(" ", "_"), None
+        elif subcategory and (match := _FIELD_RE.match(stripped)):
+            field = match.group(1).strip().lower().replace(" ", "_")
+            data[category][subcategory][field] = match.group(2).strip()
+    return data
+
+
+def _read_source(path: str, category: str) -> Dict:
+    """One data file as {category: {subcategory: info}}"""
+    with open(path, encoding="utf-8") as f:
+        text = f.read()
+    if path.endswith(".md"):
+        return _read_markdown(text, category)
+    if path.endswith((".yaml", ".yml")):
+        try:
+            import yaml  # Only needed for .yaml/.yml sources
+        except ImportError:
+            raise RuntimeError(f"{path}: YAML knowledge files need PyYAML (pip install pyyaml)")
+        return {category: yaml.safe_load(text) or {}}
+    return {category: json.loads(text)}
+
+
+def source_files(source_dir: str) -> List[Tuple[str, str]]:
+    """(path, category) for every data file: top-level files are a category each,
+    files inside a subdirectory all belong to the subdirectory's category"""
+    found = []
+    for name in sorted(os.listdir(source_dir)):
+        path = os.path.join(source_dir, name)
+        if os.path.isdir(path):
+            for inner in sorted(os.listdir(path)):
+                if inner.endswith(SOURCE_SUFFIXES):
+                    found.append((os.path.join(path, inner), name))
+        elif name.endswith(SOURCE_SUFFIXES):
+            found.append((path, os.path.splitext(name)[0]))
+    return found
+
+
+def load_knowledge_dir(source_dir: str) -> Dict:
+    """Merge every data file under source_dir into one category -> subcategory -> info dict"""
+    data: Dict = {}
+    for path, category in source_files(source_dir):
+        for name, subcategories in _read_source(path, category).items():
+            data.setdefault(name, {}).update(subcategories)
+    return data
+
+
+def sources_signature(source_dir: str) -> str:
+    """Hash of every data file's path, size and mtime - changes when one is edited, added, removed or renamed"""
+    digest = hashlib.sha1()
+    for path, category in source_files(source_dir):
+        stat = os.stat(path)
+        digest.update(f"{path}\0{category}\0{stat.st_size}\0{stat.st_mtime_ns}\n".encode("utf-8"))
+    return digest.hexdigest()[:16]
+
+
+def _strings(values: List[bytes]) -> Tuple["np.ndarray", bytes]:
+    import numpy as np
+    offsets = np.zeros(len(values) + 1, dtype=np.uint64)
+    np.cumsum([len(v) for v in values], out=offsets[1:])
+    return offsets, b"".join(values)
+
+
+def compile_snapshot(data: Dict, path: str, sources: Optional[str] = None) -> str:
+    """Write data and its BM25 index to path atomically; returns the content version.
+    sources is the sources_signature() the data was read under."""
+    import numpy as np
+    entries = flatten_knowledge(data)
+    index = KnowledgeIndex(entries)
+    terms = sorted(index.postings)
+
+    encoded = [json.dumps([e.category, e.subcategory, e.info], ensure_ascii=False).encode("utf-8") for e in entries]
+    entry_offsets, entry_blob = _strings(encoded)
+    # Field by field, in the row order of the knowledge vectors
+    chunks = entry_chunks(entries)
+    chunk_offsets, chunk_blob = _strings([json.dumps(chunk, ensure_ascii=False).encode("utf-8") for chunk in chunks])
+    term_offsets, term_blob = _strings([term.encode("utf-8") for term in terms])
+    posting_offsets = np.zeros(len(terms) + 1, dtype=np.uint64)
+    np.cumsum([len(index.postings[term]) for term in terms], out=posting_offsets[1:])
+    posting_docs = np.array([doc for term in terms for doc, _ in index.postings[term]], dtype=np.uint32)
+    posting_weights = np.array([w for term in terms for _, w in index.postings[term]], dtype=np.float32)
+
+    categories, start = [], 0
+    for i, entry in enumerate(entries + [None]):
+        if i and (entry is None or entry.category != entries[start].category):
+            categories.append([entries[start].category, start, i])
+            start = i
+
+    digest = hashlib.sha256(b"".join(encoded)).hexdigest()
+    sections = [
+        ("entry_offsets", entry_offsets.tobytes()), ("entry_blob", entry_blob),
+        ("chunk_offsets", chunk_offsets.tobytes()), ("chunk_blob", chunk_blob),
+        ("term_offsets", term_offsets.tobytes()), ("term_blob", term_blob),
+        ("posting_offsets", posting_offsets.tobytes()),
+        ("posting_docs", posting_docs.tobytes()), ("posting_weights", posting_weights.tobytes()),
+    ]
+    header = {
+        "format": FORMAT_VERSION, "version": digest[:12], "digest": digest, "built_at": time.time(),
+        "sources": sources, "entries": len(entries), "chunks": len(chunks), "terms": len(terms), "categories": categories, "sections": {},
+    }
+    # Section offsets count from the first 8-byte boundary after the header
+    offset = 0
+    for name, blob in sections:
+        header["sections"][name] = [offset, len(blob)]
+        offset += (len(blob) + 7) // 8 * 8
+    header_bytes = json.dumps(header, ensure_ascii=False).encode("utf-8")
+    base = (len(MAGIC) + 4 + len(header_bytes) + 7) // 8 * 8
+
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(MAGIC + len(header_bytes).to_bytes(4, "little") + header_bytes)
+        f.write(b"\x00" * (base - f.tell()))
+        for name, blob in sections:
+            f.write(blob)
+            f.write(b"\x00" * ((8 - len(blob) % 8) % 8))
+        f.flush()
+        os.fsync(f.fileno())
+    # Readers that already mapped the old file keep it until they let go
+    os.replace(tmp_path, path)
+    return header["version"]
+
+
+class _Terms:
+    """Sorted term table read straight from the map - bisect-able"""
+
+    def __init__(self, offsets: "np.ndarray", blob: memoryview):
+        self.offsets = offsets
+        self.blob = blob
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i: int) -> str:
+        return bytes(self.blob[int(self.offsets[i]):int(self.offsets[i + 1])]).decode("utf-8")
+
+
+class KnowledgeSnapshot:
+    """Read-only, memory-mapped knowledge base plus its BM25 index.
+
+    Nothing is decoded up front: entries and postings are read from the
+    map on demand, so startup cost and private memory don't grow with the
+    knowledge base, and processes mapping the same file share its pages.
+    search() matches KnowledgeIndex.search().
+    """
+
+    def __init__(self, path: str):
+        import numpy as np
+        self.path = path
+        with open(path, "rb") as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            self.stat = os.fstat(f.fileno())
+        if self._map[:len(MAGIC)] != MAGIC:
+            raise ValueError(f"{path} is not a knowledge snapshot")
+        size = int.from_bytes(self._map[len(MAGIC):len(MAGIC) + 4], "little")
+        start = len(MAGIC) + 4
+        self.header = json.loads(self._map[start:start + size].decode("utf-8"))
+        if self.header["format"] != FORMAT_VERSION:
+            raise ValueError(f"{path} has snapshot format {self.header['format']}, expected {FORMAT_VERSION}")
+        base = (start + size + 7) // 8 * 8
+        view = memoryview(self._map)
+
+        def section(name: str, dtype=None):
+            offset, length = self.header["sections"][name]
+            if dtype is None:
+                return view[base + offset:base + offset + length]
+            return np.frombuffer(self._map, dtype=dtype, count=length // np.dtype(dtype).itemsize, offset=base + offset)
+
+        self._entry_offsets = section("entry_offsets", np.uint64)
+        self._entry_blob = section("entry_blob")
+        self._chunk_offsets = section("chunk_offsets", np.uint64)
+        self._chunk_blob = section("chunk_blob")
+        self._terms = _Terms(section("term_offsets", np.uint64), section("term_blob"))
+        self._posting_offsets = section("posting_offsets", np.uint64)
+        self._posting_docs = section("posting_docs", np.uint32)
+        self._posting_weights = section("posting_weights", np.float32)
+        self._categories = {name: (lo, hi) for name, lo, hi in self.header["categories"]}
+        self._data: Optional[Dict] = None
+
+    @property
+    def version(self) -> str:
+        return self.header["version"]
+
+    def __len__(self) -> int:
+        return self.header["entries"]
+
+    def entry(self, i: int) -> KnowledgeEntry:
+        raw = self._entry_blob[int(self._entry_offsets[i]):int(self._entry_offsets[i + 1])]
+        return KnowledgeEntry(*json.loads(bytes(raw).decode("utf-8")))
+
+    def iter_entries(self) -> Iterator[KnowledgeEntry]:
+        for i in range(len(self)):
+            yield self.entry(i)
+
+    def chunk(self, i: int) -> Tuple[str, str]:
+        """Field i as (chunk_id, text) - row i of the knowledge vectors"""
+        raw = self._chunk_blob[int(self._chunk_offsets[i]):int(self._chunk_offsets[i + 1])]
+        chunk_id, text = json.loads(bytes(raw).decode("utf-8"))
+        return chunk_id, text
+
+    def iter_chunks(self) -> Iterator[Tuple[str, str]]:
+        for i in range(self.header["chunks"]):
+            yield self.chunk(i)
+
+    def categories(self) -> List[str]:
+        return list(self._categories)
+
+    def category_entries(self, category: str, limit: Optional[int] = None) -> List[KnowledgeEntry]:
+        lo, hi = self._categories.get(category, (0, 0))
+        if limit is not None:
+            hi = min(hi, lo + limit)
+        return [self.entry(i) for i in range(lo, hi)]
+
+    def category(self, category: str) -> Optional[Dict]:
+        """One category as a subcategory -> info dict, or None"""
+        if category not in self._categories:
+            return None
+        return {entry.subcategory: entry.info for entry in self.category_entries(category)}
+
+    def data(self) -> Dict:
+        """The whole knowledge base as a dict - decoded once, on first call"""
+        if self._data is None:
+            self._data = {name: self.category(name) for name in self._categories}
+        return self._data
+
+    def outline(self, per_category: int = 8) -> Dict[str, List[str]]:
+        """A few subcategory names per category - enough for a prompt preamble"""
+        return {name: [e.subcategory for e in self.category_entries(name, per_category)] for name in self._categories}
+
+    def _postings(self, term: str) -> Tuple["np.ndarray", "np.ndarray"]:
+        i = bisect.bisect_left(self._terms, term)
+        if i == len(self._terms) or self._terms[i] != term:
+            return self._posting_docs[:0], self._posting_weights[:0]
+        lo, hi = int(self._posting_offsets[i]), int(self._posting_offsets[i + 1])
+        return self._posting_docs[lo:hi], self._posting_weights[lo:hi]
+
+    def search(self, query: str, top_k: int = 3) -> List[Tuple[KnowledgeEntry, float]]:
+        """Return the top_k entries for a query, best first"""
+        import numpy as np
+        found = [self._postings(term) for term in set(tokenize(query))]
+        found = [(docs, weights) for docs, weights in found if len(docs)]
+        if not found or top_k <= 0:
+            return []
+        docs = np.concatenate([docs for docs, _ in found])
+        weights = np.concatenate([weights for _, weights in found]).astype(np.float64)
+        if len(docs) * 8 > len(self):
+            # Common terms: one dense pass beats sorting the postings
+            scores = np.bincount(docs, weights=weights, minlength=len(self))
+            unique = np.flatnonzero(scores)
+            scores = scores[unique]
+        else:
+            unique, inverse = np.unique(docs, return_inverse=True)
+            scores = np.bincount(inverse, weights=weights)
+        k = min(top_k, len(unique))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.lexsort((unique[top], -scores[top]))]
+        return [(self.entry(int(unique[i])), float(scores[i])) for i in top]
+
+
+def _stale(path: str, source_dir: str) -> bool:
+    """Missing, unreadable, from an older format, or compiled from other source files"""
+    try:
+        snapshot = KnowledgeSnapshot(path)
+    except (OSError, ValueError):
+        return True
+    return snapshot.header.get("sources") != sources_signature(source_dir)
+
+
+def _build_locked(source_dir: str, path: str):
+    """Rebuild unless another process already did"""
+    lock_path = path + ".lock"
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(lock_path, "a") as lock_file:
+        if fcntl is not None:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+        if _stale(path, source_dir):
+            # Signed before reading, so an edit made meanwhile still looks stale next time
+            sources = sources_signature(source_dir)
+            compile_snapshot(load_knowledge_dir(source_dir), path, sources)
+
+
+def open_snapshot(path: str, source_dir: Optional[str] = None) -> KnowledgeSnapshot:
+    """Open path, compiling it first when missing, stale or from an older format"""
+    if source_dir and os.path.isdir(source_dir) and _stale(path, source_dir):
+        _build_locked(source_dir, path)
+    return KnowledgeSnapshot(path)
+
+
+def _changed(snapshot: KnowledgeSnapshot, path: str, source_dir: str) -> bool:
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return True
+    if (stat.st_ino, stat.st_mtime_ns, stat.st_size) != (snapshot.stat.st_ino, snapshot.stat.st_mtime_ns, snapshot.stat.st_size):
+        return True
+    return os.path.isdir(source_dir) and snapshot.header.get("sources") != sources_signature(source_dir)
+
+
+class SnapshotWatcher:
+    """A live snapshot of one knowledge directory, re-checked at most every `interval` seconds"""
+
+    def __init__(self, path: str, source_dir: str, interval: float = 2.0):
+        self.path = path
+        self.source_dir = source_dir
+        self.interval = interval
+        self.snapshot: Optional[KnowledgeSnapshot] = None
+        self.checked_at = 0.0
+        self.lock = threading.Lock()
+
+    def get(self) -> KnowledgeSnapshot:
+        now = time.monotonic()
+        if self.snapshot is not None and (not self.interval or now - self.checked_at < self.interval):
+            return self.snapshot
+        with self.lock:
+            if self.snapshot is None or (self.interval and now - self.checked_at >= self.interval
+                                         and _changed(self.snapshot, self.path, self.source_dir)):
+                # The old map is closed when the last reader drops it
+                self.snapshot = open_snapshot(self.path, self.source_dir)
+            self.checked_at = now
+            return self.snapshot
+
+
+def reload_interval() -> float:
+    """MORI_KNOWLEDGE_RELOAD - seconds between change checks (default 2, 0 = never)"""
+    return float(os.environ.get("MORI_KNOWLEDGE_RELOAD", "2"))
+
+
+_WATCHER: Optional[SnapshotWatcher] = None
+
+
+def get_snapshot() -> KnowledgeSnapshot:
+    """The process-wide (Mori's) snapshot, hot-reloaded when the file or its sources change.
+
+    MORI_KNOWLEDGE_DIR       data files (default: knowledge/ next to this module)
+    MORI_KNOWLEDGE_SNAPSHOT  compiled file (default .mori_index/knowledge.snap)
+    MORI_KNOWLEDGE_RELOAD    seconds between change checks (default 2, 0 = never)
+    """
+    global _WATCHER
+    if _WATCHER is None:
+        _WATCHER = SnapshotWatcher(os.environ.get("MORI_KNOWLEDGE_SNAPSHOT", DEFAULT_SNAPSHOT_PATH),
+                                   os.environ.get("MORI_KNOWLEDGE_DIR", DEFAULT_SOURCE_DIR), reload_interval())
+    return _WATCHER.get()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compile the knowledge base into a snapshot")
+    parser.add_argument("--source", default=os.environ.get("MORI_KNOWLEDGE_DIR", DEFAULT_SOURCE_DIR))
+    parser.add_argument("--output", default=os.environ.get("MORI_KNOWLEDGE_SNAPSHOT", DEFAULT_SNAPSHOT_PATH))
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    version = compile_snapshot(load_knowledge_dir(args.source), args.output, sources_signature(args.source))
+    snapshot = KnowledgeSnapshot(args.output)
+    print(f"🏔️ {len(snapshot)} entries, {snapshot.header['terms']} terms -> {args.output} "
+          f"(version {version}, {os.path.getsize(args.output)} bytes, {time.perf_counter() - started:.2f}s)")
+
+
+if __name__ == "__main__":
+    main()
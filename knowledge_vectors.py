@@ -0,0 +1,337 @@
+"""
+Mountain Knowledge Vectors
+Semantic retrieval - finding the route by its shape, not its name
+
+Embed by hand (setup.py does it after compiling the snapshot):
+    python knowledge_vectors.py
+"""
+
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+import zlib
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows - single writer assumed
+    fcntl = None
+
+from knowledge_index import entry_chunks, flatten_knowledge, tokenize
+from ollama_pool import get_backend_pool
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_VECTOR_DIR = os.path.join(".mori_index", "vectors")
+DEFAULT_EMBED_MODEL = "nomic-embed-text"
+
+
+def knowledge_chunks(data: Dict) -> List[Tuple[str, str]]:
+    """Flatten MOUNTAIN_DATA into (chunk_id, text) pairs, one per field"""
+    return entry_chunks(flatten_knowledge(data))
+
+
+class OllamaEmbedder:
+    """Embeddings from the local Ollama server"""
+
+    def __init__(self, model: str = DEFAULT_EMBED_MODEL, host: Optional[str] = None):
+        self.model = model
+        self.name = f"ollama:{model}"
+        self.host = host
+
+    def embed(self, texts: Sequence[str]) -> List[List[float]]:
+        # With several Ollama servers (OLLAMA_HOSTS), the least busy one embeds
+        pool = None if self.host else get_backend_pool()
+        if pool is not None:
+            with pool.lease() as backend:
+                return self._embed(backend.client(), texts)
+        import ollama
+        return self._embed(ollama.Client(host=self.host) if self.host else ollama, texts)
+
+    def _embed(self, client, texts: Sequence[str]) -> List[List[float]]:
+        if hasattr(client, "embed"):
+            return list(client.embed(model=self.model, input=list(texts))["embeddings"])
+        # Older clients only expose the single-prompt endpoint
+        return [client.embeddings(model=self.model, prompt=text)["embedding"] for text in texts]
+
+
+class HashingEmbedder:
+    """Deterministic bag-of-words hashing embedder - offline and for tests"""
+
+    def __init__(self, dim: int = 256):
+        self.dim = dim
+        self.name = f"hashing:{dim}"
+
+    def embed(self, texts: Sequence[str]) -> List[List[float]]:
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for token in tokenize(text):
+                bucket = zlib.crc32(token.encode("utf-8"))
+                vectors[row, bucket % self.dim] += 1.0 if bucket & 1 << 31 else -1.0
+        return vectors.tolist()
+
+
+def _content_hash(text: str) -> str:
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+def _normalize_rows(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return (vectors / norms).astype(np.float32)
+
+
+class VectorStore:
+    """Unit vectors in a memory-mapped .npy file plus a JSON manifest.
+
+    Readers map the file read-only, so every process on the host shares the
+    same pages. Writers produce a new vectors file and swap the manifest
+    atomically; only chunks whose text changed are re-embedded. The
+    manifest keeps chunk ids and content hashes, not the text: row i is
+    chunk i of whatever was synced (source names it), and the caller
+    holds the text - the knowledge snapshot, mapped like the vectors.
+    """
+
+    MANIFEST = "manifest.json"
+
+    def __init__(self, directory: str = DEFAULT_VECTOR_DIR, embedder=None):
+        self.directory = directory
+        self.embedder = embedder or OllamaEmbedder()
+        self._lock = threading.Lock()
+        self._manifest: Optional[Dict] = None
+        self._manifest_mtime: Optional[float] = None
+        self._vectors: Optional[np.ndarray] = None
+
+    @property
+    def _manifest_path(self) -> str:
+        return os.path.join(self.directory, self.MANIFEST)
+
+    def _read_manifest(self) -> Optional[Dict]:
+        try:
+            with open(self._manifest_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def _load(self):
+        """Map the current vectors file; cheap, pages are read on demand"""
+        try:
+            mtime = os.stat(self._manifest_path).st_mtime
+        except FileNotFoundError:
+            self._manifest, self._vectors, self._manifest_mtime = None, None, None
+            return
+        if mtime == self._manifest_mtime:
+            return
+        manifest = self._read_manifest()
+        if manifest is None:
+            return
+        path = os.path.join(self.directory, manifest["vectors"])
+        self._vectors = np.load(path, mmap_mode="r")
+        self._manifest = manifest
+        self._manifest_mtime = mtime
+
+    def __len__(self) -> int:
+        with self._lock:
+            self._load()
+            return 0 if self._manifest is None else len(self._manifest["chunks"])
+
+    @property
+    def source(self) -> Optional[str]:
+        """What the vectors were last synced from (e.g. a snapshot version)"""
+        with self._lock:
+            self._load()
+            return None if self._manifest is None else self._manifest.get("source")
+
+    def _current(self, manifest: Optional[Dict], source: Optional[str]) -> bool:
+        return (manifest is not None and manifest["embedder"] == self.embedder.name
+                and (source is None or manifest.get("source") == source))
+
+    def synced(self, source: Optional[str] = None) -> bool:
+        """Whether the vectors are this embedder's (and from source, when given) - queries can use them"""
+        with self._lock:
+            self._load()
+            return self._current(self._manifest, source)
+
+    def sync(self, chunks: List[Tuple[str, str]], source: Optional[str] = None) -> int:
+        """Bring the store in line with chunks; returns how many were embedded"""
+        os.makedirs(self.directory, exist_ok=True)
+        with self._lock, open(os.path.join(self.directory, ".lock"), "a") as lock_file:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            self._load()
+            return self._sync_locked(chunks, source)
+
+    def _sync_locked(self, chunks: List[Tuple[str, str]], source: Optional[str]) -> int:
+        hashes = [_content_hash(text) for _, text in chunks]
+        manifest = self._manifest
+        if manifest and manifest["embedder"] == self.embedder.name:
+            if [c["hash"] for c in manifest["chunks"]] == hashes and manifest.get("source") == source:
+                return 0
+            known = {c["hash"]: row for row, c in enumerate(manifest["chunks"])}
+        else:
+            known = {}
+
+        missing = [i for i, h in enumerate(hashes) if h not in known]
+        fresh = {}
+        if missing:
+            embedded = _normalize_rows(np.asarray(
+                self.embedder.embed([chunks[i][1] for i in missing]), dtype=np.float32
+            ))
+            fresh = dict(zip(missing, embedded))
+
+        if fresh:
+            dim = next(iter(fresh.values())).shape[0]
+        else:
+            # Nothing new to embed: the rows we have, or no chunks at all
+            dim = self._vectors.shape[1] if self._vectors is not None and known else 0
+        vectors = np.empty((len(chunks), dim), dtype=np.float32)
+        for i, h in enumerate(hashes):
+            vectors[i] = fresh[i] if i in fresh else self._vectors[known[h]]
+
+        digest = hashlib.sha1("".join(hashes).encode("ascii") + self.embedder.name.encode("utf-8")).hexdigest()[:16]
+        vectors_name = f"vectors-{digest}.npy"
+        vectors_path = os.path.join(self.directory, vectors_name)
+        if not (manifest and manifest["vectors"] == vectors_name and os.path.exists(vectors_path)):
+            # Never rewrite a file in place - readers have it mapped
+            tmp_path = f"{vectors_path}.{os.getpid()}.tmp"
+            with open(tmp_path, "wb") as f:
+                np.save(f, vectors)
+            os.replace(tmp_path, vectors_path)
+
+        new_manifest = {
+            "embedder": self.embedder.name,
+            "dim": dim,
+            "vectors": vectors_name,
+            "source": source,
+            "chunks": [{"id": cid, "hash": h} for (cid, _), h in zip(chunks, hashes)],
+        }
+        tmp_path = self._manifest_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(new_manifest, f)
+        os.replace(tmp_path, self._manifest_path)
+
+        old_name = manifest["vectors"] if manifest else None
+        if old_name and old_name != vectors_name:
+            # Mapped readers keep their pages after unlink on POSIX
+            try:
+                os.remove(os.path.join(self.directory, old_name))
+            except OSError:
+                pass
+        self._manifest_mtime = None
+        self._load()
+        return len(missing)
+
+    def search_batch(self, queries: Sequence[str], top_k: int = 3,
+                     source: Optional[str] = None) -> List[List[Tuple[str, int, float]]]:
+        """Cosine top-k (chunk_id, row, score) for several queries in one matrix product.
+        Vectors from another embedder - or, with source, synced from anything else - find nothing."""
+        with self._lock:
+            self._load()
+            manifest, vectors = self._manifest, self._vectors
+        # Another embedder's vectors (MORI_EMBED_MODEL changed) don't even share a dimension
+        if not queries or not self._current(manifest, source) or not len(manifest["chunks"]):
+            return [[] for _ in queries]
+
+        query_vectors = _normalize_rows(np.asarray(self.embedder.embed(list(queries)), dtype=np.float32))
+        scores = query_vectors @ vectors.T
+        k = min(top_k, scores.shape[1])
+        top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+
+        results = []
+        for row, candidates in enumerate(top):
+            ranked = candidates[np.argsort(-scores[row, candidates])]
+            results.append([
+                (manifest["chunks"][i]["id"], int(i), float(scores[row, i]))
+                for i in ranked
+            ])
+        return results
+
+    def search(self, query: str, top_k: int = 3, source: Optional[str] = None) -> List[Tuple[str, int, float]]:
+        return self.search_batch([query], top_k, source)[0]
+
+
+_STORE: Optional[VectorStore] = None
+_STORE_LOCK = threading.Lock()
+_SYNCING = False
+_SYNC_ERROR: Optional[Exception] = None
+
+
+def get_vector_store() -> VectorStore:
+    """Process-wide store - synced by sync_vectors() at setup, never while a request waits.
+
+    MORI_VECTOR_DIR   where the vectors live (default .mori_index/vectors)
+    MORI_EMBED_MODEL  Ollama embedding model (default nomic-embed-text)
+    """
+    global _STORE
+    with _STORE_LOCK:
+        if _STORE is None:
+            _STORE = VectorStore(
+                os.environ.get("MORI_VECTOR_DIR", DEFAULT_VECTOR_DIR),
+                OllamaEmbedder(os.environ.get("MORI_EMBED_MODEL", DEFAULT_EMBED_MODEL)),
+            )
+        return _STORE
+
+
+def sync_vectors(snapshot=None) -> int:
+    """Embed the snapshot's chunks the store doesn't have yet; returns how many"""
+    from knowledge_snapshot import get_snapshot
+    snapshot = snapshot or get_snapshot()
+    return get_vector_store().sync(list(snapshot.iter_chunks()), snapshot.version)
+
+
+def _sync_in_background(snapshot):
+    """Catch the vectors up with a reloaded snapshot - one sync at a time, off the request path"""
+    global _SYNCING
+    with _STORE_LOCK:
+        if _SYNCING:
+            return
+        _SYNCING = True
+
+    def run():
+        global _SYNCING, _SYNC_ERROR
+        try:
+            embedded = sync_vectors(snapshot)
+            logger.info("Knowledge vectors synced to snapshot %s (%d embedded)", snapshot.version, embedded)
+        except Exception as e:
+            _SYNC_ERROR = e
+        finally:
+            with _STORE_LOCK:
+                _SYNCING = False
+
+    threading.Thread(target=run, daemon=True, name="mori-vector-sync").start()
+
+
+def search_knowledge(query: str, top_k: int = 3) -> List[Tuple[str, str, float]]:
+    """Semantic top_k over the current knowledge snapshot as (chunk_id, text, score).
+
+    Vectors from an older snapshot or another embedder find nothing while
+    a background sync catches up; a failed sync is raised here, once, so callers can back off.
+    """
+    global _SYNC_ERROR
+    from knowledge_snapshot import get_snapshot
+    snapshot = get_snapshot()
+    store = get_vector_store()
+    hits = store.search(query, top_k, snapshot.version)
+    if not hits and not store.synced(snapshot.version):
+        if _SYNC_ERROR is not None:
+            error, _SYNC_ERROR = _SYNC_ERROR, None
+            raise error
+        _sync_in_background(snapshot)
+    return [(chunk_id, snapshot.chunk(row)[1], score) for chunk_id, row, score in hits]
+
+
+def main():
+    started = time.perf_counter()
+    store = get_vector_store()
+    embedded = sync_vectors()
+    print(f"🏔️ {len(store)} knowledge chunks in {store.directory} ({embedded} embedded with "
+          f"{store.embedder.name}, {time.perf_counter() - started:.2f}s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,285 @@
+"""
+Mori Model Router
+The right rope for the route - small model first, bigger ones when it matters
+"""
+
+import os
+import re
+import threading
+import time
+from collections import deque
+from typing import AsyncIterator, Callable, Dict, Iterable, Iterator, List, Optional
+
+from circuit_breaker import Unanswered
+from mori_metrics import REGISTRY, span
+
+TIER_SECONDS = REGISTRY.histogram("mori_tier_seconds", "Reply time per model tier")
+TIER_REQUESTS = REGISTRY.counter("mori_tier_requests_total", "Replies per model tier, by how the tier was reached")
+
+DEFAULT_TIERS = "llama3.2:1b=0.5,llama3=1.0"
+
+_WORD_RE = re.compile(r"\w+")
+_SENTENCE_END = re.compile(r"[.?!…](\s|$)")
+
+# Words that ask for reasoning rather than recall
+REASONING_WORDS = {
+    "why", "explain", "compare", "comparison", "difference", "versus", "vs", "plan", "planning",
+    "strategy", "should", "recommend", "pros", "cons", "tradeoff", "prepare", "acclimatize",
+    "acclimatise", "decide", "choose", "better", "worse", "safest"
+}
+
+# Signs a reply broke character or gave up
+REFUSALS = ("as an ai", "language model", "i cannot assist", "i can't assist", "i'm not able to", "i am not able to")
+
+
+def complexity(message: str, history: Optional[List[Dict]] = None) -> float:
+    """0-1 estimate of how much model a message needs - length, reasoning words, follow-ups"""
+    words = _WORD_RE.findall(message.lower())
+    score = min(len(words) / 30.0, 0.5)
+    if REASONING_WORDS.intersection(words):
+        score += 0.35
+    if message.count("?") > 1:
+        score += 0.2
+    if history and len(history) > 6:
+        score += 0.1
+    return min(score, 1.0)
+
+
+def passes_quality(reply: str, user_message: str = "") -> bool:
+    """Cheap check that a reply is worth showing - not empty, not an echo, not a refusal or a loop"""
+    text = reply.strip()
+    words = _WORD_RE.findall(text.lower())
+    if len(words) < 2:
+        return False
+    lower = text.lower()
+    if any(phrase in lower for phrase in REFUSALS):
+        return False
+    if words == _WORD_RE.findall(user_message.lower()):
+        return False
+    if len(words) >= 8 and len(set(words)) / len(words) < 0.4:
+        return False
+    return True
+
+
+class ModelTier:
+    """A model and the most complex message it should take"""
+
+    __slots__ = ("model", "max_complexity")
+
+    def __init__(self, model: str, max_complexity: float):
+        self.model = model
+        self.max_complexity = max_complexity
+
+
+def parse_tiers(spec: str) -> List[ModelTier]:
+    """"llama3.2:1b=0.5,llama3=1.0" -> tiers, smallest first"""
+    tiers = []
+    for part in spec.split(","):
+        if part.strip():
+            model, _, limit = part.strip().rpartition("=")
+            tiers.append(ModelTier(model, float(limit)) if model else ModelTier(limit, 1.0))
+    tiers.sort(key=lambda tier: tier.max_complexity)
+    if tiers:
+        tiers[-1].max_complexity = 1.0
+    return tiers
+
+
+class ModelRouter:
+    """Sends each message to the cheapest tier that should handle it.
+
+    Replies from any tier but the last are checked with passes_quality();
+    a failing reply is dropped and the next tier answers instead, as is a
+    tier whose model didn't answer at all - lower tiers never serve a
+    fallback model, cache or busy line. Streams hold back only the first
+    sentence for that check. A tier caches only replies that pass. Quacks like
+    MoriChatbot, so the UI and server can use it in place of one engine.
+    """
+
+    model_name = "auto"
+
+    def __init__(self, tiers: List[ModelTier], engine_for: Callable, window: int = 500):
+        self.tiers = tiers
+        self.engine_for = engine_for
+        self._latencies: Dict[str, deque] = {tier.model: deque(maxlen=window) for tier in tiers}
+        self._escalations: Dict[str, int] = {tier.model: 0 for tier in tiers}
+        self._lock = threading.Lock()
+
+    @property
+    def primary(self):
+        return self.engine_for(self.tiers[0].model)
+
+    @property
+    def summarizer(self):
+        return self.primary.summarizer
+
+    def accepting(self) -> bool:
+        return self.primary.accepting()
+
+    def warm_up(self) -> bool:
+        return self.primary.warm_up()
+
+    def speculate(self, user_message: str) -> List[str]:
+        # Follow-ups are simple by construction - the smallest tier answers them
+        return self.primary.speculate(user_message)
+
+    def apply_mori_filter(self, response: str) -> str:
+        return self.primary.apply_mori_filter(response)
+
+    def stream_mori_filter(self, tokens: Iterable[str]) -> Iterator[str]:
+        return self.primary.stream_mori_filter(tokens)
+
+    def astream_mori_filter(self, tokens: AsyncIterator[str]) -> AsyncIterator[str]:
+        return self.primary.astream_mori_filter(tokens)
+
+    def choose(self, user_message: str, history: Optional[List[Dict]] = None) -> int:
+        """Index of the first tier rated for this message"""
+        score = complexity(user_message, history)
+        for i, tier in enumerate(self.tiers):
+            if score <= tier.max_complexity:
+                return i
+        return len(self.tiers) - 1
+
+    def _record(self, index: int, seconds: float, reached: str):
+        model = self.tiers[index].model
+        TIER_SECONDS.observe(seconds, tier=model)
+        TIER_REQUESTS.inc(tier=model, reached=reached)
+        with self._lock:
+            self._latencies[model].append(seconds)
+            if reached == "escalated":
+                self._escalations[model] += 1
+
+    def stats(self) -> Dict[str, Dict]:
+        """Recent reply count, p50/p95 latency and escalations per tier"""
+        report = {}
+        with self._lock:
+            for model, samples in self._latencies.items():
+                ordered = sorted(samples)
+
+                def rank(p: float) -> float:
+                    return round(ordered[min(len(ordered) - 1, int(p * len(ordered)))] * 1000.0, 1) if ordered else 0.0
+
+                report[model] = {"replies": len(ordered), "p50_ms": rank(0.5), "p95_ms": rank(0.95),
+                                 "escalated_to": self._escalations[model]}
+        return report
+
+    def _final(self, index: int) -> bool:
+        return index == len(self.tiers) - 1
+
+    def _judge(self, index: int, user_message: str) -> Optional[Callable[[str], bool]]:
+        """The quality check tier index's reply must pass - none for the last tier"""
+        if self._final(index):
+            return None
+        return lambda reply: passes_quality(reply, user_message)
+
+    def generate_mori_response(self, user_message: str, history: Optional[List[Dict]] = None,
+                               session_id: str = "") -> str:
+        index, reached = self.choose(user_message, history), "routed"
+        while True:
+            started = time.perf_counter()
+            engine = self.engine_for(self.tiers[index].model)
+            try:
+                with span("tier", model=self.tiers[index].model, reached=reached):
+                    return engine.generate_mori_response(user_message, history, session_id,
+                                                         self._judge(index, user_message))
+            except Unanswered:
+                if self._final(index):
+                    raise
+            finally:
+                self._record(index, time.perf_counter() - started, reached)
+            index, reached = index + 1, "escalated"
+
+    async def agenerate_mori_response(self, user_message: str, history: Optional[List[Dict]] = None,
+                                      session_id: str = "") -> str:
+        index, reached = self.choose(user_message, history), "routed"
+        while True:
+            started = time.perf_counter()
+            engine = self.engine_for(self.tiers[index].model)
+            try:
+                with span("tier", model=self.tiers[index].model, reached=reached):
+                    return await engine.agenerate_mori_response(user_message, history, session_id,
+                                                                self._judge(index, user_message))
+            except Unanswered:
+                if self._final(index):
+                    raise
+            finally:
+                self._record(index, time.perf_counter() - started, reached)
+            index, reached = index + 1, "escalated"
+
+    @staticmethod
+    def _settled(head: str) -> bool:
+        """Enough of the reply to judge it: a full sentence"""
+        return bool(_SENTENCE_END.search(head))
+
+    def stream_mori_response(self, user_message: str, history: Optional[List[Dict]] = None,
+                             session_id: str = "") -> Iterator[str]:
+        index, reached = self.choose(user_message, history), "routed"
+        while True:
+            started = time.perf_counter()
+            tokens = self.engine_for(self.tiers[index].model).stream_mori_response(
+                user_message, history, session_id, self._judge(index, user_message))
+            head: List[str] = []
+            checked = self._final(index)
+            try:
+                for token in tokens:
+                    if checked:
+                        yield token
+                        continue
+                    head.append(token)
+                    if self._settled("".join(head)):
+                        if not passes_quality("".join(head), user_message):
+                            break
+                        checked = True
+                        yield "".join(head)
+                else:
+                    if not checked and passes_quality("".join(head), user_message):
+                        checked = True
+                        yield "".join(head)
+            except Unanswered:
+                if self._final(index):
+                    raise
+            finally:
+                # Closing the generator cancels the Ollama stream
+                tokens.close()
+                self._record(index, time.perf_counter() - started, reached)
+            if checked:
+                return
+            index, reached = index + 1, "escalated"
+
+    async def astream_mori_response(self, user_message: str, history: Optional[List[Dict]] = None,
+                                    session_id: str = "") -> AsyncIterator[str]:
+        index, reached = self.choose(user_message, history), "routed"
+        while True:
+            started = time.perf_counter()
+            engine = self.engine_for(self.tiers[index].model)
+            tokens = engine.astream_mori_response(user_message, history, session_id, self._judge(index, user_message))
+            head: List[str] = []
+            checked = self._final(index)
+            try:
+                async for token in tokens:
+                    if checked:
+                        yield token
+                        continue
+                    head.append(token)
+                    if self._settled("".join(head)):
+                        if not passes_quality("".join(head), user_message):
+                            break
+                        checked = True
+                        yield "".join(head)
+                else:
+                    if not checked and passes_quality("".join(head), user_message):
+                        checked = True
+                        yield "".join(head)
+            except Unanswered:
+                if self._final(index):
+                    raise
+            finally:
+                await tokens.aclose()
+                self._record(index, time.perf_counter() - started, reached)
+            if checked:
+                return
+            index, reached = index + 1, "escalated"
+
+
+def tiers_from_env() -> List[ModelTier]:
+    """MORI_MODEL_TIERS, e.g. "llama3.2:1b=0.5,mistral=1.0" - model=highest complexity it takes"""
+    return parse_tiers(os.environ.get("MORI_MODEL_TIERS", DEFAULT_TIERS))
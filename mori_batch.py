@@ -0,0 +1,227 @@
+"""
+Mori Batch
+A season of questions overnight - prompt suites through the full pipeline, results as JSON lines
+
+    python mori_batch.py prompts.jsonl --models llama3.2:1b,mistral --workers 4 --output results.jsonl
+
+Each input line is {"id": ..., "prompt": "...", "history": [...]} (or a bare
+JSON string); any other fields are copied to the result. Interrupt it at
+will - a rerun with the same output file picks up where it stopped.
+"""
+
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Dict, Iterator, List, Optional, Set, Tuple
+
+from circuit_breaker import CircuitBreaker
+from mori_engine import MoriChatbot
+from model_router import ModelRouter, tiers_from_env
+from mori_metrics import count_error, set_trace_log, trace, usage
+from ollama_scheduler import OllamaScheduler
+from persona_registry import DEFAULT_PERSONA
+from response_cache import MemoryBackend, ResponseCache
+
+
+def read_prompts(path: str) -> Iterator[Dict]:
+    """Items of a prompt file; an item's id defaults to its line number"""
+    with open(path, encoding="utf-8") as f:
+        for number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            item = json.loads(line)
+            if isinstance(item, str):
+                item = {"prompt": item}
+            prompt = item.pop("prompt", None) or item.pop("message", None)
+            if not isinstance(prompt, str) or not prompt.strip():
+                raise ValueError(f"{path}:{number}: no 'prompt'")
+            yield {"id": str(item.pop("id", number)), "prompt": prompt,
+                   "history": item.pop("history", None) or [], "extra": item}
+
+
+def completed(path: str) -> Set[Tuple[str, str]]:
+    """(id, model) pairs already answered in an output file - a resumed run skips them; errors are retried"""
+    done = set()
+    if not os.path.exists(path):
+        return done
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue  # the line being written when the run was cut off
+            if "error" not in record:
+                done.add((record["id"], record["model"]))
+    return done
+
+
+def _rank(ordered: List[float], p: float) -> float:
+    return round(ordered[min(len(ordered) - 1, int(p * len(ordered)))], 1) if ordered else 0.0
+
+
+class BatchRunner:
+    """Runs prompt items through MoriChatbot on a bounded worker pool.
+
+    Same path as the UI: generate_mori_response, then apply_mori_filter.
+    Batch runs don't speculate, and when the model under test doesn't
+    answer the item records an error (retried on resume) rather than a
+    cached, canned or busy reply. Breakers are the runner's own, so a
+    batch neither trips nor is tripped by the server's. The response
+    cache is off unless use_cache is set, so latencies are real generations.
+    """
+
+    def __init__(self, models: List[str], workers: int = 4, ollama_host: Optional[str] = None,
+                 use_cache: bool = False, persona: str = DEFAULT_PERSONA):
+        self.models = models
+        self.persona = persona
+        self.workers = workers
+        self.ollama_host = ollama_host
+        # max_entries=0 evicts on insert - every item reaches the model
+        self.response_cache = ResponseCache(MemoryBackend(max_entries=4096 if use_cache else 0))
+        # Concurrency against Ollama is the worker count; nothing waiting is ever shed
+        self.scheduler = OllamaScheduler(max_parallel=workers, max_queue=workers + 1, timeout=3600.0)
+        self._engines: Dict[str, MoriChatbot] = {}
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        self._router: Optional[ModelRouter] = None
+        # Reentrant: engine() holds it while _engine builds, and a new engine may ask for its breaker
+        self._lock = threading.RLock()
+
+    def engine(self, model: str):
+        with self._lock:
+            if model == "auto":
+                if self._router is None:
+                    self._router = ModelRouter(tiers_from_env(), self._engine)
+                return self._router
+            return self._engine(model)
+
+    def _engine(self, model: str) -> MoriChatbot:
+        # Also ModelRouter's engine_for, called from the worker threads
+        with self._lock:
+            if model not in self._engines:
+                self._engines[model] = MoriChatbot(
+                    model, host=self.ollama_host, response_cache=self.response_cache, scheduler=self.scheduler,
+                    speculate=False, fallback_model=model, deadline=0, persona=self.persona,
+                    degrade=False, breakers=self.breaker,
+                )
+            return self._engines[model]
+
+    def breaker(self, model: str) -> CircuitBreaker:
+        with self._lock:
+            if model not in self._breakers:
+                self._breakers[model] = CircuitBreaker(model)
+            return self._breakers[model]
+
+    def run_one(self, item: Dict, model: str) -> Dict:
+        """One result line: the filtered reply, latency, token counts and where the reply came from"""
+        chatbot = self.engine(model)
+        record = {**item["extra"], "id": item["id"], "model": model, "persona": self.persona, "prompt": item["prompt"]}
+        started = time.perf_counter()
+        try:
+            with trace(endpoint="batch", model=model), usage() as totals:
+                response = chatbot.generate_mori_response(item["prompt"], item["history"])
+                response = chatbot.apply_mori_filter(response)
+        except Exception as e:
+            count_error("batch", e)
+            record["error"] = f"{type(e).__name__}: {e}"
+            return record
+        source = totals.get("source", "model")
+        if source.startswith("fallback:"):
+            # Not the model under test - leave it for the next run
+            record["error"] = f"answered by {source}"
+            return record
+        eval_ms = totals["eval_ms"]
+        record.update({
+            "response": response,
+            "source": source,
+            "latency_ms": round((time.perf_counter() - started) * 1000.0, 1),
+            "prompt_tokens": totals["prompt_tokens"],
+            "generated_tokens": totals["generated_tokens"],
+            "tokens_per_sec": round(totals["generated_tokens"] / (eval_ms / 1000.0), 1) if eval_ms else 0.0,
+            "ollama_calls": totals["calls"],
+        })
+        return record
+
+    def run(self, items: List[Dict], output: str, resume: bool = True, progress=sys.stderr) -> Dict:
+        """Answer every (item, model) not yet in output, appending results as they finish"""
+        done = completed(output) if resume else set()
+        # Model by model, so Ollama isn't swapping models in and out of memory
+        todo = [(item, model) for model in self.models for item in items if (item["id"], model) not in done]
+        latencies: Dict[str, List[float]] = {model: [] for model in self.models}
+        errors: Dict[str, int] = {model: 0 for model in self.models}
+        if resume and done:
+            print(f"resuming: {len(done)} already answered, {len(todo)} to go", file=progress)
+
+        started = time.perf_counter()
+        last_report = started
+        mode = "a" if resume else "w"
+        with open(output, mode, encoding="utf-8") as out:
+            if mode == "a" and out.tell() and not self._ends_with_newline(output):
+                out.write("\n")  # finish a line cut off mid-write
+            pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="mori-batch")
+            try:
+                futures = [pool.submit(self.run_one, item, model) for item, model in todo]
+                for finished, future in enumerate(as_completed(futures), 1):
+                    record = future.result()
+                    out.write(json.dumps(record, ensure_ascii=False) + "\n")
+                    out.flush()
+                    if "error" in record:
+                        errors[record["model"]] += 1
+                    else:
+                        latencies[record["model"]].append(record["latency_ms"])
+                    now = time.perf_counter()
+                    if now - last_report >= 5.0 or finished == len(futures):
+                        last_report = now
+                        print(f"{finished}/{len(futures)} answered, {finished / (now - started):.2f}/s",
+                              file=progress, flush=True)
+            except KeyboardInterrupt:
+                pool.shutdown(wait=False, cancel_futures=True)
+                print("interrupted - rerun with the same --output to resume", file=progress, flush=True)
+                raise
+            pool.shutdown()
+
+        summary = {}
+        for model in self.models:
+            ordered = sorted(latencies[model])
+            summary[model] = {"answered": len(ordered), "errors": errors[model],
+                              "p50_ms": _rank(ordered, 0.5), "p95_ms": _rank(ordered, 0.95)}
+        return {"wall_s": round(time.perf_counter() - started, 2), "models": summary}
+
+    @staticmethod
+    def _ends_with_newline(path: str) -> bool:
+        with open(path, "rb") as f:
+            f.seek(-1, os.SEEK_END)
+            return f.read(1) == b"\n"
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Run a prompt suite through Mori")
+    parser.add_argument("prompts", help="JSON-lines prompt file")
+    parser.add_argument("--output", help="JSON-lines results (default: <prompts>.results.jsonl)")
+    parser.add_argument("--models", default="llama3.2:1b", help="Comma-separated; 'auto' uses MORI_MODEL_TIERS")
+    parser.add_argument("--workers", type=int, default=int(os.environ.get("OLLAMA_NUM_PARALLEL", "4")),
+                        help="Prompts in flight at once")
+    parser.add_argument("--ollama-host", default=os.environ.get("OLLAMA_HOST"))
+    parser.add_argument("--persona", default=DEFAULT_PERSONA, help="Who answers - mori or a directory in personas/")
+    parser.add_argument("--cache", action="store_true", help="Reuse replies to repeated prompts")
+    parser.add_argument("--restart", action="store_true", help="Overwrite the output instead of resuming")
+    parser.add_argument("--trace-log", default=os.environ.get("MORI_TRACE_LOG"), help="JSON-lines span log")
+    args = parser.parse_args(argv)
+
+    set_trace_log(args.trace_log)
+    output = args.output or os.path.splitext(args.prompts)[0] + ".results.jsonl"
+    models = [model.strip() for model in args.models.split(",") if model.strip()]
+    runner = BatchRunner(models, args.workers, args.ollama_host, args.cache, args.persona)
+    try:
+        summary = runner.run(list(read_prompts(args.prompts)), output, resume=not args.restart)
+    except KeyboardInterrupt:
+        sys.exit(130)
+    print(json.dumps(summary, indent=2))
+    return summary
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
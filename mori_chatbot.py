@@ -4,108 +4,87 @@ A solitary climber's wisdom through local LLM
 """
 
 import streamlit as st
-import ollama
-import json
-import re
 import os
-import base64
-from typing import List, Dict
-from mori_persona import MORI_SYSTEM_PROMPT, MORI_CONVERSATION_STARTERS, MORI_RESPONSE_PATTERNS
-from mountain_knowledge import get_mountain_knowledge, MOUNTAIN_DATA
+import threading
+import time
+import uuid
+from functools import partial
+from typing import Optional
+from mori_engine import MoriChatbot
+from model_router import ModelRouter, tiers_from_env
+from persona_registry import DEFAULT_PERSONA, get_persona_registry
+from mori_metrics import observe, start_metrics_server, trace
+from session_store import SessionStore, get_session_store
 
-class MoriChatbot:
-    def __init__(self, model_name: str = "llama3.2:1b"):
-        self.model_name = model_name
-        self.conversation_history = []
-        self.mountain_knowledge = MOUNTAIN_DATA
-        
-    def initialize_session(self):
-        """Initialize Streamlit session state"""
-        if "messages" not in st.session_state:
-            st.session_state.messages = []
-    
-    def search_mountain_knowledge(self, query: str) -> str:
-        """Search through mountain knowledge base"""
-        query_lower = query.lower()
-        relevant_info = []
-        
-        # Search through different categories
-        for category, data in self.mountain_knowledge.items():
-            if isinstance(data, dict):
-                for subcategory, info in data.items():
-                    if any(keyword in query_lower for keyword in [category, subcategory]):
-                        if isinstance(info, dict):
-                            relevant_info.append(f"{subcategory}: {info}")
-                        else:
-                            relevant_info.append(f"{subcategory}: {info}")
-        
-        return "\n".join(relevant_info[:3]) if relevant_info else ""
-    
-    def generate_mori_response(self, user_message: str) -> str:
-        """Generate response in Mori's voice using Ollama - optimized for speed"""
-        try:
-            # Simplified prompt for faster response
-            simple_prompt = f"""You are Mori Buntarou, a stoic mountain climber. Respond briefly and authentically.
+# Older turns fetched per click on "Earlier words"
+OLDER_PAGE = 20
 
-User: {user_message}
+def initialize_session():
+    """Initialize Streamlit session state - the conversation itself lives in the session store"""
+    if "session_id" not in st.session_state:
+        # Kept in the URL so a reload (or a server restart) resumes the conversation
+        session_id = st.query_params.get("session") or uuid.uuid4().hex
+        st.query_params["session"] = session_id
+        st.session_state.session_id = session_id
+    if "older_pages" not in st.session_state:
+        st.session_state.older_pages = 0
+    if "suggestions" not in st.session_state:
+        st.session_state.suggestions = []
 
-Respond in 1-2 short sentences. Be direct, honest, sometimes distant. Don't be overly helpful."""
-            
-            # Call Ollama with minimal context for speed
-            response = ollama.chat(
-                model=self.model_name,
-                messages=[
-                    {"role": "system", "content": simple_prompt},
-                    {"role": "user", "content": user_message}
-                ],
-                options={
-                    "temperature": 0.7,
-                    "top_p": 0.9,
-                    "num_predict": 50  # Limit response length for speed
-                }
-            )
-            
-            return response['message']['content']
-            
-        except Exception as e:
-            return "..."
-    
-    def apply_mori_filter(self, response: str) -> str:
-        """Apply Mori's speaking patterns to the response"""
-        # Remove overly enthusiastic language
-        response = re.sub(r'!+', '.', response)
-        response = re.sub(r'exciting|amazing|awesome|fantastic', 'significant', response, flags=re.IGNORECASE)
-        
-        # Keep responses clean and authentic - no repetitive additions
-        return response
+def ask(question: str):
+    """Suggestion button callback - sent as if typed"""
+    st.session_state.pending_prompt = question
+
+BACKGROUND_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "static", "bg.jpeg")
+LOGO_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "logo.png")
+
+@st.cache_resource
+def metrics_endpoint():
+    """Expose /metrics on MORI_METRICS_PORT, once per process"""
+    port = os.environ.get("MORI_METRICS_PORT")
+    return start_metrics_server(int(port)) if port else None
+
+@st.cache_resource
+def get_chatbot(model_name: str, persona: str = DEFAULT_PERSONA) -> MoriChatbot:
+    """One chatbot per model and persona for the whole process, warmed off the render path"""
+    if model_name == "auto":
+        return get_router(persona)
+    chatbot = MoriChatbot(model_name, persona=persona)
+    threading.Thread(target=chatbot.warm_up, daemon=True).start()
+    return chatbot
 
-def get_base64_image(image_path):
-    """Convert image to base64 string"""
+@st.cache_resource
+def get_router(persona: str = DEFAULT_PERSONA) -> ModelRouter:
+    """Small model first, larger tiers for complex questions (MORI_MODEL_TIERS)"""
+    router = ModelRouter(tiers_from_env(), partial(get_chatbot, persona=persona))
+    threading.Thread(target=router.warm_up, daemon=True).start()
+    return router
+
+@st.cache_resource
+def session_store() -> SessionStore:
+    """The on-disk conversation log, shared by every browser session"""
+    return get_session_store()
+
+@st.cache_data
+def background_style() -> str:
+    """CSS background - served from static/ (server.enableStaticServing)"""
+    if os.path.exists(BACKGROUND_PATH):
+        return "background-image: linear-gradient(rgba(10, 20, 30, 0.4), rgba(20, 30, 40, 0.6)), url(app/static/bg.jpeg);"
+    return "background: linear-gradient(135deg, #1a1a2e 0%, #16213e 25%, #0f3460 50%, #533483 100%);"
+
+@st.cache_data
+def load_logo() -> Optional[bytes]:
+    """Logo bytes, read once"""
     try:
-        with open(image_path, "rb") as img_file:
-            return base64.b64encode(img_file.read()).decode()
-    except:
+        with open(LOGO_PATH, "rb") as img_file:
+            return img_file.read()
+    except OSError:
         return None
 
-def main():
-    # Page configuration
-    st.set_page_config(
-        page_title="Mori Buntarou - Mountain Sage",
-        page_icon="🏔️",
-        layout="wide"
-    )
-    
-    # Load background image
-    bg_image = get_base64_image("bg.jpeg")
-    
-    # Enhanced CSS for immersive mountain and ice aesthetic
-    bg_style = ""
-    if bg_image:
-        bg_style = f"background-image: linear-gradient(rgba(10, 20, 30, 0.4), rgba(20, 30, 40, 0.6)), url(data:image/jpeg;base64,{bg_image});"
-    else:
-        bg_style = "background: linear-gradient(135deg, #1a1a2e 0%, #16213e 25%, #0f3460 50%, #533483 100%);"
-    
-    st.markdown(f"""
+@st.cache_data
+def build_page_css(bg_style: str) -> str:
+    """Enhanced CSS for immersive mountain and ice aesthetic"""
+    return f"""
     <style>
     @import url('https://fonts.googleapis.com/css2?family=Noto+Sans+JP:wght@300;400;700&family=Roboto:wght@300;400;500&display=swap');
     
@@ -410,27 +389,35 @@ def main():
         opacity: 0.3;
     }}
     </style>
-    """, unsafe_allow_html=True)
+    """
+
+def main():
+    # Page configuration
+    st.set_page_config(
+        page_title="Mori Buntarou - Mountain Sage",
+        page_icon="🏔️",
+        layout="wide"
+    )
+    
+    metrics_endpoint()
+    
+    # Static CSS - the background is a served file, not inlined base64
+    st.markdown(build_page_css(background_style()), unsafe_allow_html=True)
     
     # Header with centered logo
     col1, col2, col3 = st.columns([1, 2, 1])
     with col2:
         # Center the logo
         st.markdown('<div style="display: flex; justify-content: center; margin: 20px 0;">', unsafe_allow_html=True)
-        try:
-            st.image("logo.png", width=600)
-        except:
-            pass  # No fallback emoji
+        logo = load_logo()
+        if logo:
+            st.image(logo, width=600)  # No fallback emoji
         st.markdown('</div>', unsafe_allow_html=True)
         
         st.markdown("<h1 class='title'>Mori Buntarou</h1>", unsafe_allow_html=True)
         st.markdown("<h3 class='subtitle'>The Solitary Climber's </h3>", unsafe_allow_html=True)
         st.markdown("<div class='mountain-quote'>\"In silence, the mountain speaks\"</div>", unsafe_allow_html=True)
     
-    # Initialize chatbot
-    chatbot = MoriChatbot()
-    chatbot.initialize_session()
-    
     # Sidebar with mountain knowledge categories
     with st.sidebar:
       
@@ -446,33 +433,74 @@ def main():
         st.markdown("### ⚙️ Settings")
         model_choice = st.selectbox(
             "Ollama Model",
-            ["llama3.2:1b", "mistral", "llama3", "phi3", "codellama"],
-            index=0
+            ["llama3.2:1b", "mistral", "llama3", "phi3", "codellama", "auto"],
+            index=0,
+            help="auto picks a model per message by how complex it is"
         )
-        chatbot.model_name = model_choice
+        personas = get_persona_registry().names()
+        persona_choice = DEFAULT_PERSONA
+        if len(personas) > 1:
+            persona_choice = st.selectbox(
+                "Persona",
+                personas,
+                format_func=lambda name: get_persona_registry().persona(name).display_name,
+                help="Other climbers from personas/ - each keeps its own knowledge"
+            )
+        # Initialize chatbot - shared across reruns and sessions
+        chatbot = get_chatbot(model_choice, persona_choice)
+        if model_choice == "auto":
+            for model, tier in chatbot.stats().items():
+                st.caption(f"{model}: {tier['replies']} replies, p50 {tier['p50_ms']:.0f} ms, p95 {tier['p95_ms']:.0f} ms")
+        initialize_session()
         
+        store = session_store()
+        session_id = st.session_state.session_id
         if st.button("Clear Conversation"):
-            st.session_state.messages = []
+            store.clear(session_id)
+            chatbot.summarizer.forget(session_id)
+            st.session_state.older_pages = 0
+            st.session_state.suggestions = []
             st.rerun()
     
-    # Display conversation
-    for message in st.session_state.messages:
-        with st.chat_message(message["role"]):
-            st.markdown(message["content"])
-    
-    # Chat input
-    if prompt := st.chat_input("Speak to the mountain..."):
-        # Add user message
-        st.session_state.messages.append({"role": "user", "content": prompt})
+    # Display conversation - the recent window, plus older turns only on request
+    recent = store.recent(session_id)
+    older = []
+    if recent and st.session_state.older_pages:
+        older = store.older(session_id, recent[0].seq, OLDER_PAGE * st.session_state.older_pages)
+    first_seq = (older or recent)[0].seq if (older or recent) else 0
+    if first_seq > 0 and st.button("Earlier words..."):
+        st.session_state.older_pages += 1
+        st.rerun()
+    for turn in older + recent:
+        with st.chat_message(turn.role):
+            st.markdown(turn.content)
+    
+    # Chat input - or a suggested follow-up clicked on the last run
+    if prompt := st.chat_input("Speak to the mountain...") or st.session_state.pop("pending_prompt", None):
+        history = [turn.as_message() for turn in recent]
+        store.append(session_id, "user", prompt)
         with st.chat_message("user"):
             st.markdown(prompt)
         
-        # Generate and display Mori's response - no spinner for instant feel
-        with st.chat_message("assistant"):
-            response = chatbot.generate_mori_response(prompt)
-            filtered_response = chatbot.apply_mori_filter(response)
-            st.markdown(filtered_response)
-            st.session_state.messages.append({"role": "assistant", "content": filtered_response})
+        # Stream Mori's response as it arrives - no spinner for instant feel
+        with st.chat_message("assistant"), trace(session=session_id, model=chatbot.model_name):
+            placeholder = st.empty()
+            filtered_response = ""
+            rendering = 0.0
+            tokens = chatbot.stream_mori_response(prompt, history, session_id)
+            for piece in chatbot.stream_mori_filter(tokens):
+                filtered_response += piece
+                start = time.perf_counter()
+                placeholder.markdown(filtered_response + "▌")
+                rendering += time.perf_counter() - start
+            placeholder.markdown(filtered_response)
+            observe("render", rendering)
+            store.append(session_id, "assistant", filtered_response)
+        # Likely follow-ups get answered while the reply is read (MORI_SPECULATE)
+        st.session_state.suggestions = chatbot.speculate(prompt)
+    
+    for i, question in enumerate(st.session_state.suggestions):
+        st.button(question, key=f"suggestion-{i}", on_click=ask, args=(question,))
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
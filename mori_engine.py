@@ -0,0 +1,718 @@
+"""
+Mori Buntarou Engine
+The climber without the stage - persona, knowledge and generation, no UI
+"""
+
+import asyncio
+import itertools
+import os
+import queue
+import random
+import threading
+import time
+from contextlib import aclosing, asynccontextmanager, closing, contextmanager
+from typing import TYPE_CHECKING, AsyncIterator, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from persona_registry import DEFAULT_PERSONA, PersonaRegistry, PersonaRuntime, get_persona_registry
+from knowledge_snapshot import KnowledgeSnapshot
+from context_builder import ContextBuilder, truncate_to_tokens
+from conversation_summary import ConversationSummarizer, get_summarizer
+from generation_control import GenerationPlan, SentenceStop
+from intent_router import IntentRouter
+from speculation import speculation_enabled
+from response_cache import ResponseCache, get_response_cache
+from ollama_scheduler import OllamaScheduler, SchedulerFull, get_scheduler
+from ollama_pool import BackendPool, get_backend_pool
+from circuit_breaker import (FALLBACKS, CircuitBreaker, Deadline, DeadlineExceeded, Unanswered, default_deadline,
+                             get_breaker)
+from style_filter import StyleFilter
+from mori_metrics import annotate, count_error, observe, record_ollama_stats, span
+
+if TYPE_CHECKING:
+    # ollama (pydantic, httpx) is most of the import time - loaded with the first client instead
+    import ollama
+
+DEFAULT_FALLBACK_MODEL = "llama3.2:1b"
+
+# Seconds before semantic search is tried again after a failure, doubling up to the max
+SEMANTIC_RETRY = 5.0
+SEMANTIC_RETRY_MAX = 300.0
+
+# End of a helper thread's stream
+_DONE = object()
+
+# Scheduler lanes for requests without a session - each one gets its own
+_ANONYMOUS = itertools.count()
+
+
+def _lane(session_id: str) -> str:
+    return session_id or f"~request-{next(_ANONYMOUS)}"
+
+
+# Read timeout for the Ollama request this thread makes next - see _bound_reads
+_READS = threading.local()
+
+
+def _read_timeout(request):
+    """httpx request hook: a helper thread's request waits no longer than its deadline for each read"""
+    seconds = getattr(_READS, "timeout", None)
+    if seconds is not None:
+        request.extensions["timeout"] = {**request.extensions.get("timeout", {}), "read": seconds}
+
+
+def _bound_reads(client: "ollama.Client"):
+    """Install _read_timeout on client's httpx client (ollama has no per-request timeout)"""
+    http = getattr(client, "_client", None)
+    if http is not None and _read_timeout not in http.event_hooks.get("request", []):
+        http.event_hooks = {**http.event_hooks, "request": [*http.event_hooks.get("request", []), _read_timeout]}
+
+
+class MoriChatbot:
+    def __init__(self, model_name: str = "llama3.2:1b", semantic_search: bool = True,
+                 keep_alive: Optional[str] = None, response_cache: Optional[ResponseCache] = None,
+                 host: Optional[str] = None, client: Optional["ollama.Client"] = None,
+                 async_client: Optional["ollama.AsyncClient"] = None,
+                 scheduler: Optional[OllamaScheduler] = None, request_timeout: Optional[float] = None,
+                 summarizer: Optional[ConversationSummarizer] = None,
+                 intent_router: Optional[IntentRouter] = None, speculate: Optional[bool] = None,
+                 fallback_model: Optional[str] = None, deadline: Optional[float] = None,
+                 persona: str = DEFAULT_PERSONA, personas: Optional[PersonaRegistry] = None,
+                 pool: Optional[BackendPool] = None, degrade: bool = True,
+                 breakers: Optional[Callable[[str], CircuitBreaker]] = None):
+        self.model_name = model_name
+        self.personas = personas if personas is not None else get_persona_registry()
+        self.persona = self.personas.persona(persona)
+        # The vector store holds Mori's knowledge only
+        self.semantic_search = semantic_search and persona == DEFAULT_PERSONA
+        self._semantic_failures = 0
+        self._semantic_retry_at = 0.0
+        # Keep the model (and its prompt cache) loaded between turns
+        self.keep_alive = keep_alive or os.environ.get("MORI_KEEP_ALIVE", "30m")
+        self.response_cache = response_cache if response_cache is not None else get_response_cache()
+        self.host = host
+        self.request_timeout = request_timeout or float(os.environ.get("MORI_REQUEST_TIMEOUT", "60"))
+        self._client = client
+        self._async_client = async_client
+        # Several Ollama servers (OLLAMA_HOSTS) - each session sticks to one; an explicit host or client opts out
+        self.pool = pool if pool is not None else (get_backend_pool() if host is None and client is None else None)
+        self.scheduler = scheduler if scheduler is not None else get_scheduler()
+        # When this model is down or slow: a smaller one, then cache, patterns, a busy line
+        self.fallback_model = fallback_model or os.environ.get("MORI_FALLBACK_MODEL", DEFAULT_FALLBACK_MODEL)
+        self.deadline = deadline if deadline is not None else default_deadline()
+        # degrade=False raises Unanswered instead - for callers that must know a reply wasn't the model's
+        self.degrade = degrade
+        self.breakers = breakers or get_breaker
+        self.summarizer = summarizer if summarizer is not None else get_summarizer()
+        self._intent_router = intent_router
+        enabled = speculation_enabled() if speculate is None else speculate
+        self.speculator = None
+        if enabled:
+            from speculation import Speculator
+            self.speculator = Speculator(self)
+
+    @property
+    def runtime(self) -> PersonaRuntime:
+        """The compiled persona - shared by every engine playing it, reloaded if the registry evicted it"""
+        return self.personas.get(self.persona.name)
+
+    @property
+    def style_filter(self) -> StyleFilter:
+        return self.runtime.style_filter
+
+    @property
+    def context_builder(self) -> ContextBuilder:
+        """The persona's prompt prefix stays fixed for the runtime's life - it's the cached prefix"""
+        return self.runtime.context_builder
+
+    @property
+    def knowledge_index(self) -> KnowledgeSnapshot:
+        """The persona's current knowledge snapshot - follows hot reloads"""
+        return self.runtime.snapshot
+
+    @property
+    def mountain_knowledge(self) -> Dict:
+        return self.knowledge_index.data()
+
+    @property
+    def intent_router(self) -> IntentRouter:
+        return self._intent_router if self._intent_router is not None else self.runtime.intent_router
+
+    def accepting(self) -> bool:
+        """Whether the scheduler would queue (rather than shed) a request for this model"""
+        return self.scheduler.accepting(self.model_name)
+
+    @property
+    def client(self) -> "ollama.Client":
+        """Created on first use, so importing or building an engine doesn't load ollama.
+        With a backend pool, the least busy backend's - for work that belongs to no session."""
+        if self.pool is not None:
+            return self.pool.least_busy().client(self.request_timeout)
+        if self._client is None:
+            import ollama
+            self._client = ollama.Client(host=self.host, timeout=self.request_timeout)
+        return self._client
+
+    @property
+    def async_client(self) -> "ollama.AsyncClient":
+        """Created on first async use - it binds to the running event loop"""
+        if self._async_client is None:
+            import ollama
+            self._async_client = ollama.AsyncClient(host=self.host, timeout=self.request_timeout)
+        return self._async_client
+
+    @contextmanager
+    def _session_client(self, session_id: str) -> Iterator["ollama.Client"]:
+        """The client for one of session_id's requests - its own backend when there is a pool"""
+        if self.pool is None:
+            yield self.client
+            return
+        with self.pool.lease(session_id) as backend:
+            yield backend.client(self.request_timeout)
+
+    @asynccontextmanager
+    async def _session_async_client(self, session_id: str) -> AsyncIterator["ollama.AsyncClient"]:
+        if self.pool is None:
+            yield self.async_client
+            return
+        async with self.pool.alease(session_id) as backend:
+            yield backend.async_client(self.request_timeout)
+
+    def search_mountain_knowledge(self, query: str, top_k: int = 3) -> str:
+        """Search through mountain knowledge base"""
+        relevant_info = [str(entry) for entry, score in self.knowledge_index.search(query, top_k)]
+
+        # Keyword hits first; embeddings fill in what the words missed
+        if len(relevant_info) < top_k and self.semantic_search and time.monotonic() >= self._semantic_retry_at:
+            try:
+                from knowledge_vectors import search_knowledge
+                for chunk_id, text, score in search_knowledge(query, top_k):
+                    if len(relevant_info) >= top_k:
+                        break
+                    if not any(text.split(":", 1)[1] in info for info in relevant_info):
+                        relevant_info.append(text)
+                self._semantic_failures = 0
+            except Exception as e:
+                # No embedding model (or Ollama) right now - keywords only, then try again later
+                count_error("semantic_search", e)
+                self._semantic_failures += 1
+                self._semantic_retry_at = time.monotonic() + min(SEMANTIC_RETRY_MAX,
+                                                                 SEMANTIC_RETRY * 2 ** (self._semantic_failures - 1))
+
+        return "\n".join(relevant_info)
+
+    def _build_messages(self, user_message: str, history: Optional[List[Dict]] = None,
+                        session_id: str = "") -> List[Dict]:
+        """Build the chat messages sent to Ollama - persona, knowledge, summary and recent turns"""
+        with span("retrieve"):
+            knowledge = self.search_mountain_knowledge(user_message)
+        with span("build_prompt"):
+            summary, history = self.summarizer.context(session_id, history, self._summarize)
+            return self.context_builder.build(user_message, history, knowledge, summary)
+
+    def _summarize(self, previous: str, turns: List[Dict]) -> str:
+        """Fold turns into the running summary - runs on the summarizer's workers"""
+        lines = [f"Summary so far: {previous}"] if previous else []
+        for turn in turns:
+            speaker = self.persona.display_name if turn["role"] == "assistant" else "Visitor"
+            lines.append(f"{speaker}: {truncate_to_tokens(turn['content'], 200)}")
+        # One shared lane, so summaries queue behind each other rather than ahead of visitors
+        with self.scheduler.slot(self.model_name, "~summarizer", group=self.persona.name), \
+                self._session_client("") as client:
+            response = client.chat(
+                model=self.model_name,
+                messages=[{"role": "system", "content": self.persona.summary_prompt},
+                          {"role": "user", "content": "\n".join(lines)}],
+                options={"temperature": 0.2, "num_predict": 120},
+                keep_alive=self.keep_alive,
+            )
+        record_ollama_stats(response, self.model_name)
+        return response['message']['content'].strip()
+
+    def _generation_options(self) -> Dict:
+        """Sampling options - minimal context for speed"""
+        options = {
+            "temperature": 0.7,
+            "top_p": 0.9,
+            "num_predict": 50  # Ceiling; a plan's budget replaces it per reply
+        }
+        if self.persona.stop_sequences:
+            options["stop"] = list(self.persona.stop_sequences)
+        return options
+
+    def _plan(self, user_message: str) -> GenerationPlan:
+        """Token budget and sentence count for the reply to user_message"""
+        return self.runtime.generation.plan(user_message)
+
+    def _cacheable(self, user_message: str, history: Optional[List[Dict]]) -> bool:
+        """Opening lines and questions that name a topic stand on their own"""
+        return not history or bool(self.knowledge_index.search(user_message, 1))
+
+    def _cached_response(self, user_message: str) -> Optional[str]:
+        return self.response_cache.get(user_message, self.model_name, self._generation_options(),
+                                       self.persona.cache_version)
+
+    def _cache_response(self, user_message: str, response: str):
+        self.response_cache.put(user_message, self.model_name, self._generation_options(),
+                                self.persona.cache_version, response)
+
+    def _prepare(self, user_message: str, history: Optional[List[Dict]],
+                 session_id: str = "") -> Tuple[Optional[str], Optional[List[Dict]], bool]:
+        """Everything before the model call: (ready reply, messages, cacheable).
+
+        A ready reply - canned from the intent router or cached - means no model call.
+        """
+        with span("route") as attrs:
+            routed = self.intent_router.route(user_message)
+            attrs["hit"] = routed is not None
+        if routed is not None:
+            annotate(source="fast_path")
+            return routed, None, False
+        cacheable = self._cacheable(user_message, history)
+        if cacheable:
+            with span("cache_lookup") as attrs:
+                cached = self._cached_response(user_message)
+                attrs["hit"] = cached is not None
+            if cached is not None:
+                annotate(source="cache")
+                return cached, None, cacheable
+        return None, self._build_messages(user_message, history, session_id), cacheable
+
+    def _chat_kwargs(self, messages: List[Dict], model: Optional[str] = None,
+                     plan: Optional[GenerationPlan] = None) -> Dict:
+        options = self._generation_options()
+        if plan is not None:
+            options["num_predict"] = plan.num_predict
+        return {
+            "model": model or self.model_name,
+            "messages": messages,
+            "options": options,
+            "keep_alive": self.keep_alive,
+        }
+
+    def _models(self, judge: Optional[Callable[[str], bool]] = None) -> List[str]:
+        """Models to try, in order - this engine's, then the smaller fallback (not when a judge wants this one's)"""
+        if judge is None and self.fallback_model and self.fallback_model != self.model_name:
+            return [self.model_name, self.fallback_model]
+        return [self.model_name]
+
+    def _deadline(self) -> Deadline:
+        # No deadline configured: the old bounds, a full queue wait plus a full request
+        return Deadline(self.deadline or self.scheduler.timeout + self.request_timeout)
+
+    def _slot_timeout(self, deadline: Deadline) -> float:
+        return min(self.scheduler.timeout, deadline.remaining())
+
+    def _pump(self, model: str, messages: List[Dict], session_id: str, deadline: Deadline,
+              plan: GenerationPlan, out: queue.Queue, stop: threading.Event):
+        """Helper thread: take a slot and feed Ollama's stream into out until told to stop.
+
+        The caller stops waiting at the deadline, but this thread only sees
+        stop between chunks - so no read may outlast the deadline either,
+        or a model that never starts would hold the slot for the whole
+        request timeout.
+        """
+        try:
+            queued = time.perf_counter()
+            with self.scheduler.slot(model, _lane(session_id), self._slot_timeout(deadline), group=self.persona.name):
+                observe("queue_wait", time.perf_counter() - queued)
+                with self._session_client(session_id) as client:
+                    _bound_reads(client)
+                    _READS.timeout = max(deadline.remaining(), 0.001)
+                    stream = client.chat(**self._chat_kwargs(messages, model, plan), stream=True)
+                    try:
+                        for chunk in stream:
+                            out.put(chunk)
+                            if stop.is_set():
+                                break
+                    finally:
+                        _READS.timeout = None
+                        # Drops the connection - Ollama stops generating once it sees that
+                        stream.close()
+        except BaseException as e:
+            out.put(e)
+        out.put(_DONE)
+
+    def _chunks(self, model: str, messages: List[Dict], session_id: str, deadline: Deadline,
+                plan: GenerationPlan, first_only: bool = False) -> Iterator[Dict]:
+        """Ollama's stream for model; waiting past the deadline raises DeadlineExceeded.
+
+        The stream is read on a helper thread, so a stalled Ollama can't hold
+        the caller beyond the deadline. With first_only the deadline covers
+        the first chunk only - after that the visitor is already reading.
+        """
+        out: queue.Queue = queue.Queue()
+        stop = threading.Event()
+        threading.Thread(target=self._pump, args=(model, messages, session_id, deadline, plan, out, stop),
+                         daemon=True, name=f"mori-generate-{model}").start()
+        first = True
+        try:
+            while True:
+                try:
+                    item = out.get(timeout=deadline.remaining() if first or not first_only else None)
+                except queue.Empty:
+                    raise DeadlineExceeded(f"{model} missed the deadline")
+                if item is _DONE:
+                    return
+                if isinstance(item, BaseException):
+                    raise item
+                first = False
+                yield item
+        finally:
+            stop.set()
+
+    async def _achunks(self, model: str, messages: List[Dict], session_id: str, deadline: Deadline,
+                       plan: GenerationPlan, first_only: bool = False) -> AsyncIterator[Dict]:
+        """_chunks for coroutines - cancellation stops the wait and the generation"""
+        queued = time.perf_counter()
+        async with self.scheduler.aslot(model, _lane(session_id), self._slot_timeout(deadline),
+                                        group=self.persona.name):
+            observe("queue_wait", time.perf_counter() - queued)
+            async with self._session_async_client(session_id) as client:
+                stream = await client.chat(**self._chat_kwargs(messages, model, plan), stream=True)
+                try:
+                    first = True
+                    while True:
+                        try:
+                            if first or not first_only:
+                                chunk = await asyncio.wait_for(anext(stream), deadline.remaining())
+                            else:
+                                chunk = await anext(stream)
+                        except StopAsyncIteration:
+                            return
+                        except asyncio.TimeoutError:
+                            raise DeadlineExceeded(f"{model} missed the deadline")
+                        first = False
+                        yield chunk
+                finally:
+                    await stream.aclose()
+
+    def _collect(self, chunks: Iterator[Dict], model: str, stopper: SentenceStop) -> str:
+        # Closing the chunks as soon as the last sentence ends cancels the generation
+        with closing(chunks):
+            for chunk in chunks:
+                stopper.feed(chunk['message']['content'])
+                if stopper.ended(chunk, model):
+                    break
+        return stopper.reply()
+
+    async def _acollect(self, chunks: AsyncIterator[Dict], model: str, stopper: SentenceStop) -> str:
+        async with aclosing(chunks):
+            async for chunk in chunks:
+                stopper.feed(chunk['message']['content'])
+                if stopper.ended(chunk, model):
+                    break
+        return stopper.reply()
+
+    def _failed(self, breaker: CircuitBreaker, error: Exception):
+        count_error("generate", error)
+        # A full queue is our own backpressure, not a sign the model is unwell
+        if not isinstance(error, SchedulerFull):
+            breaker.failure()
+
+    @staticmethod
+    def _fell_back(level: str):
+        FALLBACKS.inc(level=level)
+        annotate(source=f"fallback:{level}")
+
+    def _answered(self, model: str, user_message: str, content: str, cacheable: bool) -> bool:
+        """Book-keeping for a model reply; True when it should go into the cache"""
+        if model != self.model_name:
+            self._fell_back("model")
+            return False
+        annotate(source="model")
+        return cacheable and bool(content)
+
+    def _degraded(self, user_message: str, error: Optional[Exception] = None, degrade: bool = True) -> str:
+        """The last rungs when no model answered in time: a cached reply, a canned one, a busy line"""
+        if not (degrade and self.degrade):
+            raise Unanswered(f"no model answered: {error!r}" if error else "no model answered") from error
+        for model in self._models():
+            cached = self.response_cache.get(user_message, model, self._generation_options(),
+                                             self.persona.cache_version)
+            if cached is not None:
+                self._fell_back("cache")
+                return cached
+        decision = self.intent_router.classify(user_message)
+        if decision.response is not None:
+            self._fell_back("pattern")
+            return decision.response
+        self._fell_back("busy")
+        return self.busy_response()
+
+    def busy_response(self) -> str:
+        """In-character reply when Ollama can't take the request in time"""
+        return random.choice(self.persona.busy_responses)
+
+    def generate_mori_response(self, user_message: str, history: Optional[List[Dict]] = None,
+                               session_id: str = "",
+                               judge: Optional[Callable[[str], bool]] = None) -> str:
+        """Generate response in Mori's voice using Ollama - optimized for speed.
+
+        Each model in _models() gets a try while the deadline lasts and its
+        breaker is closed; when none answers, _degraded() does. With a judge
+        (the model router's quality check) only this engine's model answers:
+        a reply the judge turns down, or none at all, raises Unanswered
+        instead, and only replies it accepts are cached.
+        """
+        try:
+            cached, messages, cacheable = self._prepare(user_message, history, session_id)
+        except Exception as e:
+            count_error("prepare", e)
+            return self._degraded(user_message, e, judge is None)
+        if cached is not None:
+            return cached
+
+        deadline = self._deadline()
+        plan = self._plan(user_message)
+        failure: Optional[Exception] = None
+        for model in self._models(judge):
+            breaker = self.breakers(model)
+            if deadline.expired() or not breaker.allow():
+                continue
+            try:
+                with span("generate", model=model, kind=plan.kind):
+                    content = self._collect(self._chunks(model, messages, session_id, deadline, plan), model,
+                                            plan.stopper())
+            except Exception as e:
+                self._failed(breaker, e)
+                failure = e
+                continue
+            breaker.success()
+            if judge is not None and not judge(content):
+                raise Unanswered(f"{model}'s reply was turned down")
+            if self._answered(model, user_message, content, cacheable):
+                self._cache_response(user_message, content)
+            return content
+        return self._degraded(user_message, failure, judge is None)
+
+    def stream_mori_response(self, user_message: str, history: Optional[List[Dict]] = None,
+                             session_id: str = "",
+                             judge: Optional[Callable[[str], bool]] = None) -> Iterator[str]:
+        """Stream Mori's response token by token as Ollama produces it"""
+        try:
+            cached, messages, cacheable = self._prepare(user_message, history, session_id)
+        except Exception as e:
+            count_error("prepare", e)
+            yield self._degraded(user_message, e, judge is None)
+            return
+        if cached is not None:
+            yield cached
+            return
+
+        deadline = self._deadline()
+        plan = self._plan(user_message)
+        failure: Optional[Exception] = None
+        produced = []
+        for model in self._models(judge):
+            breaker = self.breakers(model)
+            if deadline.expired() or not breaker.allow():
+                continue
+            started = time.perf_counter()
+            stopper = plan.stopper()
+            try:
+                # Wall time includes the consumer (rendering) between tokens
+                with span("generate_stream", model=model, kind=plan.kind):
+                    chunks = self._chunks(model, messages, session_id, deadline, plan, first_only=True)
+                    with closing(chunks):
+                        for chunk in chunks:
+                            token = stopper.feed(chunk['message']['content'])
+                            if token:
+                                if not produced:
+                                    observe("first_token", time.perf_counter() - started, model=model)
+                                produced.append(token)
+                                yield token
+                            if stopper.ended(chunk, model):
+                                break
+                    tail = stopper.flush()
+                    if tail:
+                        produced.append(tail)
+                        yield tail
+            except Exception as e:
+                self._failed(breaker, e)
+                failure = e
+                if produced:
+                    # Keep whatever already reached the user
+                    return
+                continue
+            breaker.success()
+            # What the visitor saw, cut back to a full sentence if the budget ran out
+            reply = stopper.reply()
+            if self._answered(model, user_message, reply, cacheable) and (judge is None or judge(reply)):
+                self._cache_response(user_message, reply)
+            return
+        yield self._degraded(user_message, failure, judge is None)
+
+    async def agenerate_mori_response(self, user_message: str, history: Optional[List[Dict]] = None,
+                                      session_id: str = "",
+                                      judge: Optional[Callable[[str], bool]] = None) -> str:
+        """Async generate_mori_response on the pooled AsyncClient"""
+        try:
+            # Retrieval and cache lookups may block (embeddings, SQLite)
+            cached, messages, cacheable = await asyncio.to_thread(self._prepare, user_message, history, session_id)
+        except Exception as e:
+            count_error("prepare", e)
+            return await asyncio.to_thread(self._degraded, user_message, e, judge is None)
+        if cached is not None:
+            return cached
+
+        deadline = self._deadline()
+        plan = self._plan(user_message)
+        failure: Optional[Exception] = None
+        for model in self._models(judge):
+            breaker = self.breakers(model)
+            if deadline.expired() or not breaker.allow():
+                continue
+            try:
+                with span("generate", model=model, kind=plan.kind):
+                    content = await self._acollect(self._achunks(model, messages, session_id, deadline, plan),
+                                                   model, plan.stopper())
+            except Exception as e:
+                self._failed(breaker, e)
+                failure = e
+                continue
+            breaker.success()
+            if judge is not None and not judge(content):
+                raise Unanswered(f"{model}'s reply was turned down")
+            if self._answered(model, user_message, content, cacheable):
+                await asyncio.to_thread(self._cache_response, user_message, content)
+            return content
+        return await asyncio.to_thread(self._degraded, user_message, failure, judge is None)
+
+    async def astream_mori_response(self, user_message: str, history: Optional[List[Dict]] = None,
+                                    session_id: str = "",
+                                    judge: Optional[Callable[[str], bool]] = None) -> AsyncIterator[str]:
+        """Async stream_mori_response on the pooled AsyncClient"""
+        try:
+            cached, messages, cacheable = await asyncio.to_thread(self._prepare, user_message, history, session_id)
+        except Exception as e:
+            count_error("prepare", e)
+            yield await asyncio.to_thread(self._degraded, user_message, e, judge is None)
+            return
+        if cached is not None:
+            yield cached
+            return
+
+        deadline = self._deadline()
+        plan = self._plan(user_message)
+        failure: Optional[Exception] = None
+        produced = []
+        for model in self._models(judge):
+            breaker = self.breakers(model)
+            if deadline.expired() or not breaker.allow():
+                continue
+            started = time.perf_counter()
+            stopper = plan.stopper()
+            try:
+                with span("generate_stream", model=model, kind=plan.kind):
+                    chunks = self._achunks(model, messages, session_id, deadline, plan, first_only=True)
+                    async with aclosing(chunks):
+                        async for chunk in chunks:
+                            token = stopper.feed(chunk['message']['content'])
+                            if token:
+                                if not produced:
+                                    observe("first_token", time.perf_counter() - started, model=model)
+                                produced.append(token)
+                                yield token
+                            if stopper.ended(chunk, model):
+                                break
+                    tail = stopper.flush()
+                    if tail:
+                        produced.append(tail)
+                        yield tail
+            except Exception as e:
+                self._failed(breaker, e)
+                failure = e
+                if produced:
+                    return
+                continue
+            breaker.success()
+            # What the visitor saw, cut back to a full sentence if the budget ran out
+            reply = stopper.reply()
+            if self._answered(model, user_message, reply, cacheable) and (judge is None or judge(reply)):
+                await asyncio.to_thread(self._cache_response, user_message, reply)
+            return
+        yield await asyncio.to_thread(self._degraded, user_message, failure, judge is None)
+
+    def speculate(self, user_message: str) -> List[str]:
+        """After a turn: pre-generate likely follow-ups while Ollama idles; returns them"""
+        if self.speculator is None:
+            return []
+        return self.speculator.schedule(user_message)
+
+    def warm_up(self) -> bool:
+        """Load the model and prefill the stable prompt prefix with a one-token generation - on every backend.
+        Returns whether every backend warmed."""
+        if self.pool is not None:
+            clients = [backend.client(self.request_timeout) for backend in self.pool.backends if backend.healthy]
+        else:
+            clients = [self.client]
+        warmed = bool(clients)
+        for client in clients:
+            try:
+                client.chat(**{
+                    **self._chat_kwargs(self.context_builder.prefix_messages()),
+                    "options": {**self._generation_options(), "num_predict": 1},
+                })
+            except Exception as e:
+                # Warm-up is best effort; the first real turn pays instead
+                count_error("warm_up", e)
+                warmed = False
+        return warmed
+
+    def apply_mori_filter(self, response: str) -> str:
+        """Apply Mori's speaking patterns to the response"""
+        # Keep responses clean and authentic - no repetitive additions
+        return self.style_filter.apply(response)
+
+    def stream_mori_filter(self, tokens: Iterable[str]) -> Iterator[str]:
+        """Apply Mori's speaking patterns to a token stream"""
+        # Filter time is time inside the filter minus time waiting on the model
+        upstream = 0.0
+
+        def timed(source):
+            nonlocal upstream
+            source = iter(source)
+            while True:
+                start = time.perf_counter()
+                token = next(source, None)
+                upstream += time.perf_counter() - start
+                if token is None:
+                    return
+                yield token
+
+        total = 0.0
+        pieces = self.style_filter.stream(timed(tokens))
+        while True:
+            start = time.perf_counter()
+            piece = next(pieces, None)
+            total += time.perf_counter() - start
+            if piece is None:
+                break
+            yield piece
+        observe("filter", max(total - upstream, 0.0))
+
+    async def astream_mori_filter(self, tokens: AsyncIterator[str]) -> AsyncIterator[str]:
+        """stream_mori_filter for async token streams"""
+        upstream = 0.0
+
+        async def timed(source):
+            nonlocal upstream
+            source = source.__aiter__()
+            while True:
+                start = time.perf_counter()
+                token = await anext(source, None)
+                upstream += time.perf_counter() - start
+                if token is None:
+                    return
+                yield token
+
+        total = 0.0
+        pieces = self.style_filter.astream(timed(tokens))
+        while True:
+            start = time.perf_counter()
+            piece = await anext(pieces, None)
+            total += time.perf_counter() - start
+            if piece is None:
+                break
+            yield piece
+        observe("filter", max(total - upstream, 0.0))
@@ -0,0 +1,309 @@
+"""
+Mori Metrics
+Knowing where the time goes on every pitch - spans, counters, Prometheus text
+"""
+
+import contextvars
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, Iterator, Optional, Tuple
+
+logger = logging.getLogger("mori")
+
+# Seconds - from sub-millisecond filter passes to multi-second generations
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+
+def _label_key(labels: Dict[str, str]) -> LabelKey:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(key: LabelKey, extra: Optional[Dict[str, str]] = None) -> str:
+    pairs = list(key) + sorted((extra or {}).items())
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(str(v))}"' for k, v in pairs) + "}"
+
+
+class Counter:
+    def __init__(self, name: str, help_text: str):
+        self.name = name
+        self.help = help_text
+        self._values: Dict[LabelKey, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(_label_key(labels), 0.0)
+
+    def render(self) -> Iterator[str]:
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} counter"
+        with self._lock:
+            items = list(self._values.items())
+        for key, value in items:
+            yield f"{self.name}{_format_labels(key)} {value}"
+
+
+class Histogram:
+    def __init__(self, name: str, help_text: str, buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.buckets = tuple(buckets)
+        self._series: Dict[LabelKey, list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                # bucket counts..., +Inf count, sum
+                series = self._series[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[len(self.buckets)] += 1
+            series[-1] += value
+
+    def count(self, **labels) -> int:
+        series = self._series.get(_label_key(labels))
+        return series[len(self.buckets)] if series else 0
+
+    def render(self) -> Iterator[str]:
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} histogram"
+        with self._lock:
+            items = [(key, list(series)) for key, series in self._series.items()]
+        for key, series in items:
+            for bound, count in zip(self.buckets, series):
+                yield f"{self.name}_bucket{_format_labels(key, {'le': repr(bound)})} {count}"
+            yield f"{self.name}_bucket{_format_labels(key, {'le': '+Inf'})} {series[len(self.buckets)]}"
+            yield f"{self.name}_count{_format_labels(key)} {series[len(self.buckets)]}"
+            yield f"{self.name}_sum{_format_labels(key)} {series[-1]}"
+
+
+class Gauge:
+    """Read at scrape time from a callback"""
+
+    def __init__(self, name: str, help_text: str, read: Callable[[], Dict[LabelKey, float]]):
+        self.name = name
+        self.help = help_text
+        self.read = read
+
+    def render(self) -> Iterator[str]:
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} gauge"
+        try:
+            values = self.read()
+        except Exception as e:
+            logger.warning("gauge %s failed: %s", self.name, e)
+            return
+        for key, value in values.items():
+            yield f"{self.name}{_format_labels(key)} {value}"
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: Dict[str, object] = {}
+        self._lock = threading.Lock()
+
+    def _get_or_create(self, name: str, factory):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = factory()
+            return metric
+
+    def counter(self, name: str, help_text: str = "") -> Counter:
+        return self._get_or_create(name, lambda: Counter(name, help_text))
+
+    def histogram(self, name: str, help_text: str = "", buckets=DEFAULT_BUCKETS) -> Histogram:
+        return self._get_or_create(name, lambda: Histogram(name, help_text, buckets))
+
+    def gauge(self, name: str, help_text: str, read: Callable[[], Dict[LabelKey, float]]) -> Gauge:
+        with self._lock:
+            gauge = self._metrics[name] = Gauge(name, help_text, read)
+            return gauge
+
+    def render_prometheus(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+STAGE_SECONDS = REGISTRY.histogram("mori_stage_seconds", "Time spent per chat pipeline stage")
+ERRORS = REGISTRY.counter("mori_errors_total", "Pipeline errors by stage and exception type")
+OLLAMA_PREFILL = REGISTRY.histogram("mori_ollama_prompt_eval_seconds", "Ollama prompt_eval_duration (prefill)")
+OLLAMA_DECODE = REGISTRY.histogram("mori_ollama_eval_seconds", "Ollama eval_duration (decode)")
+OLLAMA_LOAD = REGISTRY.histogram("mori_ollama_load_seconds", "Ollama load_duration (model load)")
+OLLAMA_TOKENS = REGISTRY.counter("mori_ollama_tokens_total", "Tokens processed by Ollama, by kind")
+
+
+class TraceLog:
+    """Append-only JSON-lines span log"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._file = open(path, "a", encoding="utf-8", buffering=1)
+
+    def write(self, record: Dict):
+        line = json.dumps(record, default=str)
+        with self._lock:
+            self._file.write(line + "\n")
+
+
+_TRACE_LOG: Optional[TraceLog] = TraceLog(os.environ["MORI_TRACE_LOG"]) if os.environ.get("MORI_TRACE_LOG") else None
+_TRACE_ID: contextvars.ContextVar = contextvars.ContextVar("mori_trace_id", default=None)
+_USAGE: contextvars.ContextVar = contextvars.ContextVar("mori_usage", default=None)
+
+
+def set_trace_log(path: Optional[str]):
+    """Enable (or with None, disable) the JSON-lines trace log"""
+    global _TRACE_LOG
+    _TRACE_LOG = TraceLog(path) if path else None
+
+
+@contextmanager
+def trace(**attrs):
+    """Group the spans of one request under a trace id"""
+    token = _TRACE_ID.set(attrs.pop("trace_id", None) or uuid.uuid4().hex[:16])
+    try:
+        with span("request", **attrs):
+            yield _TRACE_ID.get()
+    finally:
+        _TRACE_ID.reset(token)
+
+
+@contextmanager
+def usage():
+    """Total the Ollama calls made inside the block - tokens and model time, per request"""
+    totals = {"calls": 0, "prompt_tokens": 0, "generated_tokens": 0, "prompt_eval_ms": 0.0, "eval_ms": 0.0}
+    token = _USAGE.set(totals)
+    try:
+        yield totals
+    finally:
+        _USAGE.reset(token)
+
+
+def annotate(**fields):
+    """Attach fields (e.g. where a reply came from) to the enclosing usage() block, if any"""
+    totals = _USAGE.get()
+    if totals is not None:
+        totals.update(fields)
+
+
+def _emit(stage: str, start: float, duration: float, attrs: Dict):
+    if _TRACE_LOG is not None:
+        _TRACE_LOG.write({"trace_id": _TRACE_ID.get(), "stage": stage, "start": start,
+                          "duration_ms": round(duration * 1000.0, 3), **attrs})
+
+
+def observe(stage: str, duration: float, **attrs):
+    """Record a stage duration measured elsewhere (e.g. summed over a stream)"""
+    STAGE_SECONDS.observe(duration, stage=stage)
+    _emit(stage, time.time() - duration, duration, attrs)
+
+
+@contextmanager
+def span(stage: str, **attrs):
+    """Time a pipeline stage; errors are counted and re-raised"""
+    wall = time.time()
+    start = time.perf_counter()
+    try:
+        yield attrs
+    except Exception as e:
+        attrs["error"] = type(e).__name__
+        raise
+    finally:
+        duration = time.perf_counter() - start
+        STAGE_SECONDS.observe(duration, stage=stage)
+        _emit(stage, wall, duration, attrs)
+
+
+def count_error(stage: str, error: BaseException):
+    """Count and log a handled failure instead of swallowing it"""
+    ERRORS.inc(stage=stage, type=type(error).__name__)
+    logger.warning("%s failed: %s: %s", stage, type(error).__name__, error)
+
+
+def record_ollama_stats(response, model: str):
+    """Capture Ollama's own timings from a final (done) response"""
+    def field(name: str) -> int:
+        try:
+            return int(response.get(name) or 0)
+        except (AttributeError, TypeError, ValueError):
+            return 0
+
+    prefill, decode, load = field("prompt_eval_duration"), field("eval_duration"), field("load_duration")
+    prompt_tokens, tokens = field("prompt_eval_count"), field("eval_count")
+    if prefill:
+        OLLAMA_PREFILL.observe(prefill / 1e9, model=model)
+    if decode:
+        OLLAMA_DECODE.observe(decode / 1e9, model=model)
+    if load:
+        OLLAMA_LOAD.observe(load / 1e9, model=model)
+    OLLAMA_TOKENS.inc(prompt_tokens, model=model, kind="prompt")
+    OLLAMA_TOKENS.inc(tokens, model=model, kind="generated")
+    totals = _USAGE.get()
+    if totals is not None:
+        totals["calls"] += 1
+        totals["prompt_tokens"] += prompt_tokens
+        totals["generated_tokens"] += tokens
+        totals["prompt_eval_ms"] += prefill / 1e6
+        totals["eval_ms"] += decode / 1e6
+    _emit("ollama", time.time(), field("total_duration") / 1e9, {
+        "model": model,
+        "prompt_eval_count": prompt_tokens,
+        "prompt_eval_ms": prefill / 1e6,
+        "eval_count": tokens,
+        "eval_ms": decode / 1e6,
+        "load_ms": load / 1e6,
+    })
+
+
+def render_prometheus() -> str:
+    return REGISTRY.render_prometheus()
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        body = render_prometheus().encode("utf-8")
+        self.send_response(200 if self.path.startswith("/metrics") else 404)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_metrics_server(port: int, host: str = "0.0.0.0") -> ThreadingHTTPServer:
+    """Serve /metrics on a side port - for processes without their own HTTP server"""
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
@@ -0,0 +1,246 @@
+"""
+Mori Buntarou API Server
+The mountain answers over HTTP - JSON and server-sent events, no UI
+"""
+
+import argparse
+import asyncio
+import json
+import os
+from functools import partial
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Set, Tuple
+
+from aiohttp import web
+
+from mori_engine import MoriChatbot
+from model_router import ModelRouter, tiers_from_env
+from ollama_scheduler import get_scheduler
+from ollama_pool import get_backend_pool
+from persona_registry import DEFAULT_PERSONA, UnknownPersona, get_persona_registry
+from mori_metrics import render_prometheus, set_trace_log, span, trace
+from session_store import get_session_store
+
+if TYPE_CHECKING:
+    import ollama
+
+DEFAULT_MODEL = "llama3.2:1b"
+
+
+def _valid_history(history: Any) -> bool:
+    """A list of {"role": ..., "content": ...} turns, both strings"""
+    return isinstance(history, list) and all(
+        isinstance(turn, dict) and isinstance(turn.get("role"), str) and isinstance(turn.get("content"), str)
+        for turn in history
+    )
+
+
+class MoriServer:
+    """aiohttp front for MoriChatbot.
+
+    One pooled AsyncClient is shared by every model's engine, and a
+    semaphore caps how many generations run at once per process. There is
+    an engine per (model, persona); personas on the same model share its
+    scheduler lanes and warm instance. With OLLAMA_HOSTS the engines share
+    a backend pool instead, which keeps each session on one server.
+    """
+
+    def __init__(self, ollama_host: Optional[str] = None, max_concurrency: int = 8,
+                 default_model: str = DEFAULT_MODEL):
+        self.ollama_host = ollama_host
+        self.default_model = default_model
+        self.max_concurrency = max_concurrency
+        self._engines: Dict[Tuple[str, str], MoriChatbot] = {}
+        self._routers: Dict[str, ModelRouter] = {}
+        self.pool = get_backend_pool()
+        self._client: Optional["ollama.Client"] = None
+        self._async_client: Optional["ollama.AsyncClient"] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+
+    async def _startup(self, app: web.Application):
+        if self.pool is None:
+            import ollama
+            self._client = ollama.Client(host=self.ollama_host)
+            self._async_client = ollama.AsyncClient(host=self.ollama_host)
+        self._slots = asyncio.Semaphore(self.max_concurrency)
+        # Load the default model before the first request arrives
+        await asyncio.to_thread(self.engine(self.default_model).warm_up)
+
+    def models(self) -> Set[str]:
+        """Models a request may name: the default, the personas' own, "auto" and its tiers"""
+        models = {self.default_model, "auto"}
+        models.update(get_persona_registry().by_model(self.default_model))
+        models.update(tier.model for tier in tiers_from_env())
+        return models
+
+    def engine(self, model: Optional[str] = None, persona: str = DEFAULT_PERSONA) -> MoriChatbot:
+        """The engine for a model and persona; no model means the persona's own, else the server default"""
+        model = model or get_persona_registry().persona(persona).model or self.default_model
+        if model == "auto":
+            # Per-message tiering across models (MORI_MODEL_TIERS)
+            if persona not in self._routers:
+                self._routers[persona] = ModelRouter(tiers_from_env(), partial(self.engine, persona=persona))
+            return self._routers[persona]
+        key = (model, persona)
+        if key not in self._engines:
+            self._engines[key] = MoriChatbot(
+                model, host=self.ollama_host, client=self._client, async_client=self._async_client, persona=persona,
+                pool=self.pool,
+            )
+        return self._engines[key]
+
+    async def _read_request(self, request: web.Request):
+        try:
+            body = await request.json()
+        except ValueError:
+            raise web.HTTPBadRequest(text="Body must be JSON")
+        if not isinstance(body, dict):
+            raise web.HTTPBadRequest(text="Body must be a JSON object")
+        message = body.get("message")
+        if not isinstance(message, str) or not message.strip():
+            raise web.HTTPBadRequest(text="'message' is required")
+        history: Optional[List[Dict]] = body.get("history")
+        if history is not None and not _valid_history(history):
+            raise web.HTTPBadRequest(text="'history' must be a list of {\"role\", \"content\"} objects")
+        for field in ("persona", "session_id"):
+            if body.get(field) is not None and not isinstance(body[field], str):
+                raise web.HTTPBadRequest(text=f"'{field}' must be a string")
+        model = body.get("model")
+        # Every model named gets an engine for good - only the configured ones
+        if model and (not isinstance(model, str) or model not in self.models()):
+            raise web.HTTPBadRequest(text=f"Unknown model {model!r}")
+        try:
+            chatbot = self.engine(model, body.get("persona") or DEFAULT_PERSONA)
+        except UnknownPersona as e:
+            raise web.HTTPBadRequest(text=f"Unknown persona {e.args[0]!r}")
+        if not chatbot.accepting():
+            # Backpressure: tell the load balancer to try elsewhere or later
+            raise web.HTTPServiceUnavailable(text="Mori is busy", headers={"Retry-After": "1"})
+        # Without an explicit history, a named session's history comes from the store
+        persist = history is None and bool(body.get("session_id"))
+        # No session_id: an anonymous request - its own scheduler lane, no summary, no sticky backend.
+        # Never the client address: everyone behind one proxy would share a session
+        session_id = body.get("session_id") or ""
+        if persist:
+            history = await asyncio.to_thread(get_session_store().messages, session_id)
+        return chatbot, message, history or [], session_id, persist
+
+    async def _remember(self, session_id: str, message: str, response: str):
+        store = get_session_store()
+        await asyncio.to_thread(store.append, session_id, "user", message)
+        await asyncio.to_thread(store.append, session_id, "assistant", response)
+
+    async def complete(self, request: web.Request) -> web.Response:
+        """POST /v1/chat - the whole reply as JSON"""
+        chatbot, message, history, session_id, persist = await self._read_request(request)
+        with trace(endpoint="complete", model=chatbot.model_name):
+            async with self._slots:
+                response = await chatbot.agenerate_mori_response(message, history, session_id)
+            with span("filter"):
+                response = chatbot.apply_mori_filter(response)
+        if persist:
+            await self._remember(session_id, message, response)
+        return web.json_response({"model": chatbot.model_name, "persona": self._persona(chatbot),
+                                  "response": response, "suggestions": chatbot.speculate(message)})
+
+    async def stream(self, request: web.Request) -> web.StreamResponse:
+        """POST /v1/chat/stream - filtered tokens as server-sent events"""
+        chatbot, message, history, session_id, persist = await self._read_request(request)
+        sse = web.StreamResponse(headers={
+            "Content-Type": "text/event-stream",
+            "Cache-Control": "no-cache",
+        })
+        await sse.prepare(request)
+        full = []
+        with trace(endpoint="stream", model=chatbot.model_name):
+            async with self._slots:
+                tokens = chatbot.astream_mori_response(message, history, session_id)
+                async for piece in chatbot.astream_mori_filter(tokens):
+                    full.append(piece)
+                    await sse.write(f"data: {json.dumps({'token': piece})}\n\n".encode("utf-8"))
+        done = {"model": chatbot.model_name, "persona": self._persona(chatbot), "response": "".join(full),
+                "suggestions": chatbot.speculate(message)}
+        if persist:
+            await self._remember(session_id, message, done["response"])
+        await sse.write(f"event: done\ndata: {json.dumps(done)}\n\n".encode("utf-8"))
+        await sse.write_eof()
+        return sse
+
+    @staticmethod
+    def _persona(chatbot) -> str:
+        engine = chatbot.primary if isinstance(chatbot, ModelRouter) else chatbot
+        return engine.persona.name
+
+    async def health(self, request: web.Request) -> web.Response:
+        return web.json_response({"status": "ok", "pid": os.getpid()})
+
+    async def metrics(self, request: web.Request) -> web.Response:
+        """GET /metrics - Prometheus text format"""
+        return web.Response(body=render_prometheus().encode("utf-8"),
+                            headers={"Content-Type": "text/plain; version=0.0.4; charset=utf-8"})
+
+    async def load(self, request: web.Request) -> web.Response:
+        """GET /v1/load - running and queued requests per model"""
+        return web.json_response(get_scheduler().load())
+
+    async def backends(self, request: web.Request) -> web.Response:
+        """GET /v1/backends - each Ollama server's health and requests in flight"""
+        if self.pool is None:
+            return web.json_response([{"host": self.ollama_host or "default", "healthy": None, "in_flight": None}])
+        return web.json_response(self.pool.status())
+
+    async def personas(self, request: web.Request) -> web.Response:
+        """GET /v1/personas - every persona, which are compiled now, and which share a model"""
+        registry = get_persona_registry()
+        return web.json_response({
+            "personas": [{"name": persona.name, "display_name": persona.display_name,
+                          "model": persona.model or self.default_model}
+                         for persona in registry.definitions().values()],
+            "loaded": registry.loaded(),
+            "by_model": registry.by_model(self.default_model),
+        })
+
+    def app(self) -> web.Application:
+        app = web.Application()
+        app.on_startup.append(self._startup)
+        app.add_routes([
+            web.post("/v1/chat", self.complete),
+            web.post("/v1/chat/stream", self.stream),
+            web.get("/healthz", self.health),
+            web.get("/v1/load", self.load),
+            web.get("/v1/personas", self.personas),
+            web.get("/v1/backends", self.backends),
+            web.get("/metrics", self.metrics),
+        ])
+        return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve Mori over HTTP")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--ollama-host", default=os.environ.get("OLLAMA_HOST"))
+    parser.add_argument("--model", default=DEFAULT_MODEL, help="Model used when a request names none")
+    parser.add_argument("--max-concurrency", type=int, default=int(os.environ.get("MORI_MAX_CONCURRENCY", "8")))
+    parser.add_argument("--trace-log", default=os.environ.get("MORI_TRACE_LOG"), help="JSON-lines span log")
+    parser.add_argument("--workers", type=int, default=int(os.environ.get("MORI_WORKERS", "1")),
+                        help="Worker processes sharing the port (0 = one per CPU)")
+    parser.add_argument("--metrics-port", type=int, default=int(os.environ.get("MORI_METRICS_PORT", "0")),
+                        help="With several workers, worker i also serves /metrics on this port + i")
+    args = parser.parse_args()
+
+    workers = args.workers or os.cpu_count() or 1
+    if workers > 1:
+        from mori_workers import Supervisor
+        print(f"🏔️ Mori listening on http://{args.host}:{args.port} with {workers} workers")
+        Supervisor(workers, args.host, args.port, args.ollama_host, args.model, args.max_concurrency,
+                   args.trace_log, args.metrics_port).run()
+        return
+
+    set_trace_log(args.trace_log)
+    server = MoriServer(args.ollama_host, args.max_concurrency, args.model)
+    print(f"🏔️ Mori listening on http://{args.host}:{args.port}")
+    web.run_app(server.app(), host=args.host, port=args.port, print=None)
+
+
+if __name__ == "__main__":
+    main()
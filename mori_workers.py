@@ -0,0 +1,184 @@
+"""
+Mori Workers
+Many climbers, one trailhead - API worker processes sharing a port, the knowledge and the cache
+"""
+
+import asyncio
+import importlib
+import math
+import multiprocessing
+import os
+import signal
+import socket
+import time
+from typing import List, Optional
+
+from knowledge_snapshot import DEFAULT_SNAPSHOT_PATH, DEFAULT_SOURCE_DIR, open_snapshot
+
+DEFAULT_CACHE_PATH = os.path.join(".mori_index", "responses.db")
+
+# fork keeps the listening socket and the parent's imports; workers share both
+_CONTEXT = multiprocessing.get_context("fork")
+
+
+def _serve(sock: socket.socket, index: int, heartbeat, options: dict):
+    """Worker body: one MoriServer on the inherited socket, beating its heart from the event loop"""
+    from aiohttp import web
+
+    from mori_metrics import set_trace_log, start_metrics_server
+    from mori_server import MoriServer
+
+    signal.signal(signal.SIGINT, signal.SIG_IGN)  # Ctrl-C is the supervisor's to handle
+    set_trace_log(options["trace_log"])
+    if options["metrics_port"]:
+        # Metrics are per process - each worker gets its own side port
+        start_metrics_server(options["metrics_port"] + index)
+
+    async def beat(app: web.Application):
+        async def loop():
+            while True:
+                heartbeat.value = time.time()
+                await asyncio.sleep(options["heartbeat_interval"])
+        task = asyncio.get_running_loop().create_task(loop())
+        yield
+        task.cancel()
+
+    server = MoriServer(options["ollama_host"], options["max_concurrency"], options["model"])
+    app = server.app()
+    # cleanup_ctx runs before on_startup, so the heart beats through model warm-up too
+    app.cleanup_ctx.append(beat)
+    web.run_app(app, sock=sock, print=None)
+
+
+class _Worker:
+    """A worker slot: its process, heartbeat and restart history"""
+
+    __slots__ = ("index", "process", "heartbeat", "started", "restarts")
+
+    def __init__(self, index: int):
+        self.index = index
+        self.process: Optional[multiprocessing.Process] = None
+        self.heartbeat = _CONTEXT.Value("d", 0.0, lock=False)
+        self.started = 0.0
+        self.restarts = 0
+
+
+class Supervisor:
+    """Runs N MoriServer processes on one listening socket and keeps them alive.
+
+    The knowledge snapshot is compiled once up front so every worker maps
+    the same file (the OS keeps one copy in the page cache), and the
+    response cache and session store are SQLite files all workers open.
+    A worker that exits, or whose event loop stops beating for
+    heartbeat_timeout seconds, is killed and replaced.
+    """
+
+    def __init__(self, workers: int, host: str = "127.0.0.1", port: int = 8000,
+                 ollama_host: Optional[str] = None, model: str = "llama3.2:1b", max_concurrency: int = 8,
+                 trace_log: Optional[str] = None, metrics_port: int = 0, heartbeat_interval: float = 1.0,
+                 heartbeat_timeout: float = 15.0, startup_grace: float = 30.0, min_restart_delay: float = 1.0):
+        self.host = host
+        self.port = port
+        self.heartbeat_timeout = heartbeat_timeout
+        self.startup_grace = startup_grace
+        self.min_restart_delay = min_restart_delay
+        self.options = {
+            "ollama_host": ollama_host, "model": model, "max_concurrency": max_concurrency,
+            "trace_log": trace_log, "metrics_port": metrics_port, "heartbeat_interval": heartbeat_interval,
+        }
+        self.workers = [_Worker(i) for i in range(workers)]
+        self._sock: Optional[socket.socket] = None
+        self._stopping = False
+
+    def _prepare_shared(self):
+        """Build what workers share before any of them start"""
+        os.environ.setdefault("MORI_CACHE_PATH", DEFAULT_CACHE_PATH)
+        # Ollama's parallel slots are split across workers, not multiplied by them
+        total = int(os.environ.get("OLLAMA_NUM_PARALLEL", "4"))
+        if len(self.workers) > total:
+            # Every worker keeps at least one slot, so Ollama sees more than it was set up for
+            print(f"⚠️ {len(self.workers)} workers share OLLAMA_NUM_PARALLEL={total} - "
+                  f"up to {len(self.workers)} generations will be sent at once", flush=True)
+        os.environ["OLLAMA_NUM_PARALLEL"] = str(max(1, math.ceil(total / len(self.workers))))
+        open_snapshot(os.environ.get("MORI_KNOWLEDGE_SNAPSHOT", DEFAULT_SNAPSHOT_PATH),
+                      os.environ.get("MORI_KNOWLEDGE_DIR", DEFAULT_SOURCE_DIR))
+        # Import once here: forked (and restarted) workers start with everything loaded
+        for module in ("ollama", "mori_server"):
+            importlib.import_module(module)
+
+    def _bind(self) -> socket.socket:
+        sock = socket.socket(socket.AF_INET6 if ":" in self.host else socket.AF_INET, socket.SOCK_STREAM)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        sock.bind((self.host, self.port))
+        sock.listen(1024)
+        sock.setblocking(False)
+        return sock
+
+    def _spawn(self, worker: _Worker):
+        now = time.time()
+        # The first beat only comes after imports - count from the end of the grace period
+        worker.heartbeat.value = now + self.startup_grace
+        worker.started = now
+        worker.process = _CONTEXT.Process(
+            target=_serve, args=(self._sock, worker.index, worker.heartbeat, self.options),
+            name=f"mori-worker-{worker.index}", daemon=True,
+        )
+        worker.process.start()
+
+    def _replace(self, worker: _Worker, reason: str):
+        process = worker.process
+        if process.is_alive():
+            # Only reached for a hung worker: its loop can't act on SIGTERM
+            process.kill()
+        process.join()
+        worker.restarts += 1
+        print(f"⛑️ worker {worker.index} (pid {process.pid}) {reason} - restart #{worker.restarts}", flush=True)
+        # A worker that dies straight away would otherwise spin
+        time.sleep(max(0.0, self.min_restart_delay - (time.time() - worker.started)))
+        self._spawn(worker)
+
+    def check(self):
+        """One supervision pass: replace dead or hung workers"""
+        now = time.time()
+        for worker in self.workers:
+            if not worker.process.is_alive():
+                self._replace(worker, f"exited with code {worker.process.exitcode}")
+            elif now - worker.heartbeat.value > self.heartbeat_timeout:
+                self._replace(worker, f"silent for {now - worker.heartbeat.value:.0f}s")
+
+    def start(self):
+        self._prepare_shared()
+        self._sock = self._bind()
+        for worker in self.workers:
+            self._spawn(worker)
+
+    def stop(self, *_):
+        self._stopping = True
+
+    def run(self, poll: float = 1.0):
+        """Start the workers and supervise them until SIGINT/SIGTERM"""
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+        self.start()
+        try:
+            while not self._stopping:
+                time.sleep(poll)
+                if not self._stopping:
+                    self.check()
+        finally:
+            self.shutdown()
+
+    def shutdown(self):
+        for worker in self.workers:
+            if worker.process is not None and worker.process.is_alive():
+                worker.process.terminate()
+        for worker in self.workers:
+            if worker.process is not None:
+                worker.process.join(10)
+                if worker.process.is_alive():
+                    worker.process.kill()
+        if self._sock is not None:
+            self._sock.close()
+
+    def pids(self) -> List[int]:
+        return [worker.process.pid for worker in self.workers if worker.process is not None]
@@ -0,0 +1,245 @@
+"""
+Mori Backend Pool
+Many huts on the ridge, one for each party - conversations stay where their prompt is cached
+"""
+
+import bisect
+import hashlib
+import os
+import threading
+import time
+import urllib.request
+from contextlib import asynccontextmanager, contextmanager
+from typing import TYPE_CHECKING, Dict, List, Optional
+
+from mori_metrics import REGISTRY
+
+if TYPE_CHECKING:
+    import ollama
+
+ROUTES = REGISTRY.counter(
+    "mori_backend_routes_total", "Requests per Ollama backend: home, failover (home down), spill (home too busy), any"
+)
+BACKEND_DOWN = REGISTRY.counter("mori_backend_down_total", "Times a backend was found unreachable")
+
+
+def _hash(key: str) -> int:
+    return int.from_bytes(hashlib.blake2b(key.encode("utf-8"), digest_size=8).digest(), "big")
+
+
+def _unreachable(error: BaseException) -> bool:
+    """Whether error means the server didn't answer at all (rather than answered with an error)"""
+    import httpx  # loaded with ollama by the time anything fails
+    return isinstance(error, (ConnectionError, httpx.ConnectError, httpx.ConnectTimeout))
+
+
+class Backend:
+    """One Ollama server: its clients, its requests in flight, and whether it answers"""
+
+    def __init__(self, host: str):
+        self.host = host
+        self.url = (host if "://" in host else f"http://{host}").rstrip("/")
+        self.in_flight = 0
+        self.healthy = True
+        self._client: Optional["ollama.Client"] = None
+        self._async_client: Optional["ollama.AsyncClient"] = None
+
+    def client(self, timeout: Optional[float] = None) -> "ollama.Client":
+        if self._client is None:
+            import ollama
+            self._client = ollama.Client(host=self.host, timeout=timeout)
+        return self._client
+
+    def async_client(self, timeout: Optional[float] = None) -> "ollama.AsyncClient":
+        """Created on first async use - it binds to the running event loop"""
+        if self._async_client is None:
+            import ollama
+            self._async_client = ollama.AsyncClient(host=self.host, timeout=timeout)
+        return self._async_client
+
+    def check(self, timeout: float = 2.0) -> bool:
+        """Ask the server for its version; updates healthy"""
+        try:
+            with urllib.request.urlopen(f"{self.url}/api/version", timeout=timeout) as response:
+                healthy = response.status == 200
+        except (OSError, ValueError):
+            healthy = False
+        if self.healthy and not healthy:
+            BACKEND_DOWN.inc(host=self.host)
+        self.healthy = healthy
+        return healthy
+
+
+class BackendPool:
+    """Several Ollama servers behind one interface, each conversation pinned to one.
+
+    Sessions sit on a consistent-hash ring (`replicas` points per
+    backend), so a conversation keeps landing on the server that already
+    holds its prompt in cache, and adding or losing a server only moves
+    the sessions that were on it. When a session's backend is full
+    (max_parallel requests in flight - the server's OLLAMA_NUM_PARALLEL)
+    or has max_skew more in flight than the least busy one, the request
+    spills to the next backend along the session's ring - the same one
+    each time, so that one warms up too. Unreachable backends are skipped
+    until a health check (every check_interval seconds) sees them again.
+    The scheduler admits max_parallel requests per healthy backend, so a
+    backend with room is there whenever a scheduled request routes.
+    """
+
+    def __init__(self, hosts: List[str], replicas: int = 64, max_skew: int = 4, check_interval: float = 5.0,
+                 max_parallel: Optional[int] = None):
+        if not hosts:
+            raise ValueError("a backend pool needs at least one host")
+        self.backends = [Backend(host) for host in hosts]
+        self.max_parallel = max_parallel
+        # Below 1 every backend would be "too busy", even the least busy one
+        self.max_skew = max(1, max_skew)
+        self.check_interval = check_interval
+        ring = sorted((_hash(f"{backend.host}#{i}"), n) for n, backend in enumerate(self.backends)
+                      for i in range(replicas))
+        self._points = [point for point, _ in ring]
+        self._owners = [n for _, n in ring]
+        self._lock = threading.Lock()
+        self._checker: Optional[threading.Thread] = None
+
+    def ring(self, session_id: str) -> List[Backend]:
+        """Every backend, in the order session_id tries them - its home first"""
+        start = bisect.bisect(self._points, _hash(session_id))
+        order: List[Backend] = []
+        for i in range(len(self._owners)):
+            backend = self.backends[self._owners[(start + i) % len(self._owners)]]
+            if backend not in order:
+                order.append(backend)
+                if len(order) == len(self.backends):
+                    break
+        return order
+
+    def least_busy(self) -> Backend:
+        """The healthy backend with the fewest requests in flight"""
+        up = [backend for backend in self.backends if backend.healthy] or self.backends
+        return min(up, key=lambda backend: backend.in_flight)
+
+    def healthy_count(self) -> int:
+        """Backends answering health checks - at least one, since route() falls back to a down one"""
+        return max(1, sum(1 for backend in self.backends if backend.healthy))
+
+    def _fits(self, backend: Backend, least: Backend) -> bool:
+        if self.max_parallel and backend.in_flight >= self.max_parallel:
+            return False
+        return backend.in_flight - least.in_flight < self.max_skew
+
+    def route(self, session_id: str = "") -> Backend:
+        """The backend for session_id's next request, counted in flight until release()"""
+        self._start_checks()
+        with self._lock:
+            least = self.least_busy()
+            if not session_id:
+                chosen, result = least, "any"
+            else:
+                order = self.ring(session_id)
+                home = order[0]
+                order = [backend for backend in order if backend.healthy] or order
+                chosen = order[0]
+                result = "home" if chosen is home else "failover"
+                if not self._fits(chosen, least):
+                    chosen = next((backend for backend in order if self._fits(backend, least)), least)
+                    result = "spill"
+            chosen.in_flight += 1
+        ROUTES.inc(host=chosen.host, result=result)
+        return chosen
+
+    def release(self, backend: Backend):
+        with self._lock:
+            backend.in_flight -= 1
+
+    def failed(self, backend: Backend, error: BaseException):
+        """A request to backend raised error - take the backend out if it didn't answer at all"""
+        if backend.healthy and _unreachable(error):
+            backend.healthy = False
+            BACKEND_DOWN.inc(host=backend.host)
+
+    @contextmanager
+    def lease(self, session_id: str = ""):
+        """Route session_id's request and hold its place in flight for the duration of the block"""
+        backend = self.route(session_id)
+        try:
+            yield backend
+        except Exception as e:
+            self.failed(backend, e)
+            raise
+        finally:
+            self.release(backend)
+
+    @asynccontextmanager
+    async def alease(self, session_id: str = ""):
+        """lease() for coroutines - routing itself never waits"""
+        backend = self.route(session_id)
+        try:
+            yield backend
+        except Exception as e:
+            self.failed(backend, e)
+            raise
+        finally:
+            self.release(backend)
+
+    def _start_checks(self):
+        # Started on first use rather than construction, so a forked worker runs its own
+        if self._checker is None and self.check_interval:
+            with self._lock:
+                if self._checker is None:
+                    self._checker = threading.Thread(target=self._check_loop, daemon=True, name="mori-backend-checks")
+                    self._checker.start()
+
+    def _check_loop(self):
+        while True:
+            for backend in self.backends:
+                backend.check()
+            time.sleep(self.check_interval)
+
+    def status(self) -> List[Dict]:
+        with self._lock:
+            return [{"host": backend.host, "healthy": backend.healthy, "in_flight": backend.in_flight}
+                    for backend in self.backends]
+
+
+def backend_hosts() -> List[str]:
+    """OLLAMA_HOSTS - comma-separated Ollama servers; empty means the single OLLAMA_HOST"""
+    return [host.strip() for host in os.environ.get("OLLAMA_HOSTS", "").split(",") if host.strip()]
+
+
+_POOL: Optional[BackendPool] = None
+_POOL_LOCK = threading.Lock()
+
+
+def get_backend_pool() -> Optional[BackendPool]:
+    """Process-wide pool over OLLAMA_HOSTS, or None when it isn't set.
+
+    MORI_BACKEND_SKEW   requests in flight beyond the least busy backend before a session spills (default 4)
+    OLLAMA_NUM_PARALLEL requests each backend runs at once; a full backend spills too (default 4)
+    MORI_BACKEND_CHECK  seconds between health checks (default 5, 0 = never)
+    """
+    global _POOL
+    hosts = backend_hosts()
+    if not hosts:
+        return None
+    with _POOL_LOCK:
+        if _POOL is None:
+            _POOL = BackendPool(
+                hosts,
+                max_skew=int(os.environ.get("MORI_BACKEND_SKEW", "4")),
+                check_interval=float(os.environ.get("MORI_BACKEND_CHECK", "5")),
+                max_parallel=int(os.environ.get("OLLAMA_NUM_PARALLEL", "4")),
+            )
+        return _POOL
+
+
+def _backend_gauge(field: str):
+    def read() -> Dict:
+        if _POOL is None:
+            return {}
+        return {(("host", backend["host"]),): float(backend[field]) for backend in _POOL.status()}
+    return read
+
+
+REGISTRY.gauge("mori_backend_in_flight", "Requests in flight per Ollama backend", _backend_gauge("in_flight"))
+REGISTRY.gauge("mori_backend_healthy", "1 while an Ollama backend answers its health checks", _backend_gauge("healthy"))
@@ -0,0 +1,269 @@
+"""
+Ollama Scheduler
+One rope, many climbers - admission control in front of the model server
+"""
+
+import asyncio
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager, contextmanager
+from typing import Dict, List, Optional
+
+
+class SchedulerFull(Exception):
+    """The queue for a model is at capacity - shed the request"""
+
+
+class SchedulerTimeout(Exception):
+    """No slot opened up before the request's deadline"""
+
+
+class _Ticket:
+    __slots__ = ("model", "session_id", "group", "enqueued_at", "granted", "event", "loop", "future")
+
+    def __init__(self, model: str, session_id: str, group: Optional[str] = None):
+        self.model = model
+        self.session_id = session_id
+        self.group = group
+        self.enqueued_at = time.monotonic()
+        self.granted = False
+        self.event: Optional[threading.Event] = None
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.future: Optional[asyncio.Future] = None
+
+    def wake(self):
+        if self.event is not None:
+            self.event.set()
+        elif self.loop is not None:
+            self.loop.call_soon_threadsafe(self._resolve)
+
+    def _resolve(self):
+        if not self.future.done():
+            self.future.set_result(None)
+
+
+class _ModelQueue:
+    """Waiting tickets per session, served round-robin across sessions"""
+
+    __slots__ = ("running", "sessions", "size", "background")
+
+    def __init__(self):
+        self.running = 0
+        self.sessions: "OrderedDict[str, deque]" = OrderedDict()
+        self.size = 0
+        # Preemption flags of the background slots among `running`
+        self.background: List[threading.Event] = []
+
+    def push(self, ticket: _Ticket):
+        self.sessions.setdefault(ticket.session_id, deque()).append(ticket)
+        self.size += 1
+
+    def pop(self, group: Optional[str] = None, lookahead: int = 0, grace: float = 0.0) -> _Ticket:
+        """Next ticket round-robin - or, while the head hasn't waited `grace` seconds,
+        the first of the next `lookahead` sessions whose ticket is in `group`"""
+        session_id, waiting = next(iter(self.sessions.items()))
+        if group is not None and waiting[0].group != group and time.monotonic() - waiting[0].enqueued_at < grace:
+            for i, (candidate, lane) in enumerate(self.sessions.items()):
+                if i >= lookahead:
+                    break
+                if lane[0].group == group:
+                    session_id, waiting = candidate, lane
+                    break
+        ticket = waiting.popleft()
+        del self.sessions[session_id]
+        if waiting:
+            self.sessions[session_id] = waiting  # back of the line
+        self.size -= 1
+        return ticket
+
+    def remove(self, ticket: _Ticket) -> bool:
+        waiting = self.sessions.get(ticket.session_id)
+        if waiting is None or ticket not in waiting:
+            return False
+        waiting.remove(ticket)
+        if not waiting:
+            del self.sessions[ticket.session_id]
+        self.size -= 1
+        return True
+
+
+class OllamaScheduler:
+    """Bounded, fair admission to Ollama with per-model concurrency.
+
+    max_parallel should match the server's OLLAMA_NUM_PARALLEL: running
+    more requests than that only queues them inside Ollama, where nobody
+    can time them out or shed them. Waiting requests are granted
+    round-robin by session, so one chatty session cannot starve others.
+    Background work (speculation) takes a slot only when one is free and
+    gives it back as soon as a real request arrives.
+
+    With a backend pool, max_parallel is per backend and the limit is
+    max_parallel times the healthy backends - the pool then puts each
+    request on a backend with a free slot.
+
+    Tickets may carry a group (the persona): a freed slot goes to a waiting
+    request of the same group when one is near the front of the line, so
+    Ollama keeps reusing the prompt prefix it already has cached. The head
+    of the line is only passed over for `affinity_grace` seconds.
+    """
+
+    def __init__(self, max_parallel: Optional[int] = None, max_queue: int = 64, timeout: float = 30.0,
+                 affinity_lookahead: int = 4, affinity_grace: float = 1.0, pool=None):
+        self.max_parallel = max_parallel or int(os.environ.get("OLLAMA_NUM_PARALLEL", "4"))
+        self.pool = pool
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self.affinity_lookahead = affinity_lookahead
+        self.affinity_grace = affinity_grace
+        self._lock = threading.Lock()
+        self._models: Dict[str, _ModelQueue] = {}
+
+    def _queue(self, model: str) -> _ModelQueue:
+        queue = self._models.get(model)
+        if queue is None:
+            queue = self._models[model] = _ModelQueue()
+        return queue
+
+    def _limit(self) -> int:
+        """Requests per model at once - across every healthy backend when there is a pool"""
+        if self.pool is None:
+            return self.max_parallel
+        return self.max_parallel * self.pool.healthy_count()
+
+    def _enqueue(self, ticket: _Ticket) -> bool:
+        """Grant immediately if possible; returns whether the ticket must wait"""
+        for other in self._models.values():
+            for preempted in other.background:
+                preempted.set()
+        queue = self._queue(ticket.model)
+        if queue.running < self._limit() and not queue.size:
+            queue.running += 1
+            ticket.granted = True
+            return False
+        if queue.size >= self.max_queue:
+            raise SchedulerFull(f"{queue.size} requests already waiting for {ticket.model}")
+        queue.push(ticket)
+        return True
+
+    def _release(self, model: str, group: Optional[str] = None):
+        with self._lock:
+            queue = self._queue(model)
+            queue.running -= 1
+            while queue.running < self._limit() and queue.size:
+                ticket = queue.pop(group, self.affinity_lookahead, self.affinity_grace)
+                ticket.granted = True
+                queue.running += 1
+                ticket.wake()
+
+    def _abandon(self, ticket: _Ticket) -> bool:
+        """Drop a waiting ticket; False means it was already granted"""
+        with self._lock:
+            return self._queue(ticket.model).remove(ticket)
+
+    @contextmanager
+    def slot(self, model: str, session_id: str = "", timeout: Optional[float] = None, group: Optional[str] = None):
+        """Hold one of the model's slots for the duration of the block"""
+        ticket = _Ticket(model, session_id, group)
+        ticket.event = threading.Event()
+        with self._lock:
+            waiting = self._enqueue(ticket)
+        if waiting and not ticket.event.wait(self.timeout if timeout is None else timeout):
+            if self._abandon(ticket):
+                raise SchedulerTimeout(f"waited {time.monotonic() - ticket.enqueued_at:.1f}s for {model}")
+            # Granted right at the deadline - go ahead
+        try:
+            yield
+        finally:
+            self._release(model, group)
+
+    @asynccontextmanager
+    async def aslot(self, model: str, session_id: str = "", timeout: Optional[float] = None,
+                    group: Optional[str] = None):
+        """slot() for coroutines - waits without blocking the event loop"""
+        ticket = _Ticket(model, session_id, group)
+        ticket.loop = asyncio.get_running_loop()
+        ticket.future = ticket.loop.create_future()
+        with self._lock:
+            waiting = self._enqueue(ticket)
+        if waiting:
+            try:
+                await asyncio.wait_for(asyncio.shield(ticket.future), self.timeout if timeout is None else timeout)
+            except asyncio.TimeoutError:
+                if self._abandon(ticket):
+                    raise SchedulerTimeout(f"waited {time.monotonic() - ticket.enqueued_at:.1f}s for {model}")
+            except asyncio.CancelledError:
+                if not self._abandon(ticket):
+                    self._release(model, group)
+                raise
+        try:
+            yield
+        finally:
+            self._release(model, group)
+
+    @contextmanager
+    def background(self, model: str):
+        """A low-priority slot for the block: raises SchedulerFull unless the model has one free
+        and nobody waiting. Yields an Event that is set when a real request arrives - the holder
+        should stop and leave the block then."""
+        preempted = threading.Event()
+        with self._lock:
+            queue = self._queue(model)
+            if queue.running >= self._limit() or queue.size:
+                raise SchedulerFull(f"no free slot for background work on {model}")
+            queue.running += 1
+            queue.background.append(preempted)
+        try:
+            yield preempted
+        finally:
+            with self._lock:
+                queue.background.remove(preempted)
+            self._release(model)
+
+    def load(self, model: Optional[str] = None) -> Dict:
+        """Backpressure signal: running and queued requests, per model"""
+        with self._lock:
+            models = {name: queue for name, queue in self._models.items() if model in (None, name)}
+            return {
+                name: {
+                    "running": queue.running,
+                    "queued": queue.size,
+                    "saturated": queue.size >= self.max_queue,
+                }
+                for name, queue in models.items()
+            }
+
+    def idle(self) -> bool:
+        """Nothing but background work running, and nothing waiting - the Ollama server is free"""
+        with self._lock:
+            return not any(queue.running - len(queue.background) or queue.size for queue in self._models.values())
+
+    def accepting(self, model: str) -> bool:
+        """Whether a new request for model would be queued rather than shed"""
+        with self._lock:
+            return self._queue(model).size < self.max_queue
+
+
+_SCHEDULER: Optional[OllamaScheduler] = None
+_SCHEDULER_LOCK = threading.Lock()
+
+
+def get_scheduler() -> OllamaScheduler:
+    """Process-wide scheduler.
+
+    OLLAMA_NUM_PARALLEL   concurrent generations per model on each Ollama backend (default 4)
+    MORI_MAX_QUEUE        waiting requests per model before shedding (default 64)
+    MORI_QUEUE_TIMEOUT    seconds a request may wait for a slot (default 30)
+    """
+    global _SCHEDULER
+    with _SCHEDULER_LOCK:
+        if _SCHEDULER is None:
+            from ollama_pool import get_backend_pool
+            _SCHEDULER = OllamaScheduler(
+                max_parallel=int(os.environ.get("OLLAMA_NUM_PARALLEL", "4")),
+                max_queue=int(os.environ.get("MORI_MAX_QUEUE", "64")),
+                timeout=float(os.environ.get("MORI_QUEUE_TIMEOUT", "30")),
+                pool=get_backend_pool(),
+            )
+        return _SCHEDULER
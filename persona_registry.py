@@ -0,0 +1,264 @@
+"""
+Mori Personas
+Other climbers on the same range - characters loaded on demand, sharing base models
+"""
+
+import inspect
+import json
+import os
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional
+
+from context_builder import ContextBuilder, knowledge_preamble
+from generation_control import GenerationController, early_stop_enabled
+from intent_router import IntentRouter
+from knowledge_snapshot import (DEFAULT_SNAPSHOT_PATH, DEFAULT_SOURCE_DIR, KnowledgeSnapshot, SnapshotWatcher,
+                                get_snapshot, reload_interval)
+from mori_metrics import REGISTRY, count_error
+from style_filter import StyleFilter
+
+DEFAULT_PERSONA = "mori"
+DEFAULT_PERSONA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "personas")
+PERSONA_INDEX_DIR = os.path.join(".mori_index", "personas")
+
+PERSONA_LOADS = REGISTRY.counter("mori_persona_loads_total",
+                                 "Persona runtimes compiled (load), dropped (evict), or definitions rejected (invalid)")
+
+SUMMARY_PROMPT = """Summarize this conversation between {name} and a visitor in at most three plain sentences.
+Keep what the visitor told about themselves, the topics and plans discussed, and any advice already given.
+Write it as notes, not dialogue."""
+
+
+class UnknownPersona(KeyError):
+    """No persona by that name in the registry"""
+
+
+class Persona:
+    """One character: prompts, canned replies, style rules and where its knowledge lives.
+
+    Everything but the system prompt is optional - a persona without
+    patterns just never takes the fast path.
+    """
+
+    def __init__(self, name: str, system_prompt: str, knowledge_dir: str, snapshot_path: str,
+                 version: str = "1", display_name: Optional[str] = None, model: Optional[str] = None,
+                 style_rules: Optional[Dict] = None, conversation_starters: Optional[List[str]] = None,
+                 response_patterns: Optional[Dict[str, str]] = None,
+                 intent_keywords: Optional[Dict[str, List[str]]] = None,
+                 fact_templates: Optional[Dict[str, Dict]] = None, summary_prompt: Optional[str] = None,
+                 busy_responses: Optional[List[str]] = None, stop_sequences: Optional[List[str]] = None,
+                 budgets: Optional[Dict[str, List[int]]] = None):
+        self.name = name
+        self.display_name = display_name or name.replace("_", " ").title()
+        self.system_prompt = system_prompt
+        self.knowledge_dir = knowledge_dir
+        self.snapshot_path = snapshot_path
+        self.version = version
+        # Preferred base model when a request names none
+        self.model = model
+        self.style_rules = style_rules or {}
+        self.conversation_starters = conversation_starters or ["..."]
+        self.response_patterns = response_patterns or {}
+        self.intent_keywords = intent_keywords or {}
+        self.fact_templates = fact_templates or {}
+        self.summary_prompt = summary_prompt or SUMMARY_PROMPT.format(name=self.display_name)
+        self.busy_responses = busy_responses or ["..."]
+        # Sent to Ollama as options.stop - where a reply must end regardless of its sentences
+        self.stop_sequences = stop_sequences or []
+        # Overrides of generation_control.DEFAULT_BUDGETS: {kind: [num_predict, sentences]}
+        self.budgets = budgets or {}
+
+    @property
+    def cache_version(self) -> str:
+        """Part of every response-cache key - personas never share cached replies"""
+        return f"{self.name}:{self.version}"
+
+    @classmethod
+    def load(cls, directory: str) -> "Persona":
+        """A persona from directory/persona.json, with its knowledge in directory/knowledge/"""
+        path = os.path.join(directory, "persona.json")
+        with open(path, encoding="utf-8") as f:
+            spec = json.load(f)
+        if not isinstance(spec, dict):
+            raise ValueError(f"{path}: expected a JSON object")
+        name = os.path.basename(os.path.normpath(directory))
+        system_prompt = spec.pop("system_prompt", None)
+        if not isinstance(system_prompt, str) or not system_prompt.strip():
+            raise ValueError(f"{path}: 'system_prompt' is required")
+        unknown = sorted(set(spec) - cls.optional_fields())
+        if unknown:
+            raise ValueError(f"{path}: unknown field(s) {', '.join(unknown)}")
+        unanswered = sorted(set(spec.get("intent_keywords") or {}) - set(spec.get("response_patterns") or {})
+                            - {"greeting"})
+        if unanswered:
+            raise ValueError(f"{path}: intent_keywords without response_patterns: {', '.join(unanswered)}")
+        return cls(name, system_prompt, os.path.join(directory, "knowledge"),
+                   os.path.join(PERSONA_INDEX_DIR, f"{name}.snap"), **spec)
+
+    @classmethod
+    def optional_fields(cls) -> set:
+        """Keys a persona.json may set besides system_prompt"""
+        required = {"self", "name", "system_prompt", "knowledge_dir", "snapshot_path"}
+        return set(inspect.signature(cls.__init__).parameters) - required
+
+
+def mori() -> Persona:
+    """Mori Buntarou, from mori_persona.py and the knowledge/ directory"""
+    import mori_persona
+    return Persona(
+        DEFAULT_PERSONA, mori_persona.MORI_SYSTEM_PROMPT,
+        os.environ.get("MORI_KNOWLEDGE_DIR", DEFAULT_SOURCE_DIR),
+        os.environ.get("MORI_KNOWLEDGE_SNAPSHOT", DEFAULT_SNAPSHOT_PATH),
+        version=mori_persona.MORI_PERSONA_VERSION, display_name="Mori Buntarou",
+        style_rules=mori_persona.MORI_STYLE_RULES,
+        conversation_starters=mori_persona.MORI_CONVERSATION_STARTERS,
+        response_patterns=mori_persona.MORI_RESPONSE_PATTERNS,
+        intent_keywords=mori_persona.MORI_INTENT_KEYWORDS,
+        fact_templates=mori_persona.MORI_FACT_TEMPLATES,
+        summary_prompt=mori_persona.MORI_SUMMARY_PROMPT,
+        busy_responses=mori_persona.MORI_BUSY_RESPONSES,
+        stop_sequences=mori_persona.MORI_STOP_SEQUENCES,
+    )
+
+
+class PersonaRuntime:
+    """A persona compiled for serving: style filter, knowledge snapshot, intent router, prompt prefix, budgets.
+
+    The prompt prefix (persona plus knowledge outline) is fixed for the
+    runtime's life, so Ollama's prompt cache keeps matching it.
+    """
+
+    def __init__(self, persona: Persona, fast_path_threshold: float = 0.8,
+                 snapshot: Optional[Callable[[], KnowledgeSnapshot]] = None):
+        self.persona = persona
+        self.fast_path_threshold = fast_path_threshold
+        self.style_filter = StyleFilter.from_rules(persona.style_rules)
+        self.generation = GenerationController(persona.budgets, persona.stop_sequences, early_stop_enabled())
+        self._snapshot = snapshot or SnapshotWatcher(persona.snapshot_path, persona.knowledge_dir,
+                                                     reload_interval()).get
+        self.context_builder = ContextBuilder(persona.system_prompt,
+                                              preamble=knowledge_preamble(self.snapshot.outline()))
+        self._router: Optional[IntentRouter] = None
+        self._router_version: Optional[str] = None
+        self._lock = threading.Lock()
+
+    @property
+    def snapshot(self) -> KnowledgeSnapshot:
+        return self._snapshot()
+
+    @property
+    def intent_router(self) -> IntentRouter:
+        """Rebuilt when the knowledge snapshot changes"""
+        snapshot = self.snapshot
+        with self._lock:
+            if self._router is None or self._router_version != snapshot.version:
+                persona = self.persona
+                self._router = IntentRouter(
+                    persona.intent_keywords, persona.response_patterns, persona.conversation_starters,
+                    snapshot.iter_entries(), persona.fact_templates, threshold=self.fast_path_threshold,
+                )
+                self._router_version = snapshot.version
+            return self._router
+
+
+class PersonaRegistry:
+    """Personas by name - definitions are read once, compiled runtimes on demand.
+
+    At most max_loaded runtimes are held; the least recently used is
+    dropped first and recompiled (from its snapshot file, so cheaply) when
+    it is next asked for. Definitions stay known either way.
+    """
+
+    def __init__(self, directory: Optional[str] = DEFAULT_PERSONA_DIR, max_loaded: int = 8,
+                 fast_path_threshold: float = 0.8):
+        self.directory = directory
+        self.max_loaded = max_loaded
+        self.fast_path_threshold = fast_path_threshold
+        self._definitions: Optional[Dict[str, Persona]] = None
+        self._loaded: "OrderedDict[str, PersonaRuntime]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _discover(self) -> Dict[str, Persona]:
+        definitions = {DEFAULT_PERSONA: mori()}
+        if self.directory and os.path.isdir(self.directory):
+            for name in sorted(os.listdir(self.directory)):
+                path = os.path.join(self.directory, name)
+                if name == DEFAULT_PERSONA or not os.path.isfile(os.path.join(path, "persona.json")):
+                    continue
+                try:
+                    definitions[name] = Persona.load(path)
+                except (OSError, ValueError, TypeError) as e:
+                    # A broken add-on persona is skipped - never the others, never Mori
+                    count_error("persona_load", e)
+                    PERSONA_LOADS.inc(persona=name, result="invalid")
+        return definitions
+
+    def definitions(self) -> Dict[str, Persona]:
+        with self._lock:
+            if self._definitions is None:
+                self._definitions = self._discover()
+            return self._definitions
+
+    def names(self) -> List[str]:
+        return list(self.definitions())
+
+    def persona(self, name: str) -> Persona:
+        try:
+            return self.definitions()[name]
+        except KeyError:
+            raise UnknownPersona(name) from None
+
+    def get(self, name: str) -> PersonaRuntime:
+        """The compiled persona, loading it (and evicting the least recently used) if needed"""
+        with self._lock:
+            runtime = self._loaded.get(name)
+            if runtime is not None:
+                self._loaded.move_to_end(name)
+                return runtime
+        persona = self.persona(name)
+        # Compiled outside the lock - a snapshot build mustn't hold up other personas
+        # Mori shares the process-wide snapshot that the vector store and mountain_knowledge follow
+        runtime = PersonaRuntime(persona, self.fast_path_threshold,
+                                 get_snapshot if name == DEFAULT_PERSONA else None)
+        with self._lock:
+            runtime = self._loaded.setdefault(name, runtime)
+            self._loaded.move_to_end(name)
+            PERSONA_LOADS.inc(persona=name, result="load")
+            while len(self._loaded) > self.max_loaded:
+                evicted, _ = self._loaded.popitem(last=False)
+                PERSONA_LOADS.inc(persona=evicted, result="evict")
+        return runtime
+
+    def loaded(self) -> List[str]:
+        with self._lock:
+            return list(self._loaded)
+
+    def by_model(self, default_model: str) -> Dict[str, List[str]]:
+        """Persona names grouped by the base model they run on - one warm model serves each group"""
+        groups: Dict[str, List[str]] = {}
+        for name, persona in self.definitions().items():
+            groups.setdefault(persona.model or default_model, []).append(name)
+        return groups
+
+
+_REGISTRY: Optional[PersonaRegistry] = None
+_REGISTRY_LOCK = threading.Lock()
+
+
+def get_persona_registry() -> PersonaRegistry:
+    """Process-wide registry.
+
+    MORI_PERSONA_DIR          one subdirectory per persona: persona.json and knowledge/ (default personas/)
+    MORI_MAX_PERSONAS         compiled personas held at once (default 8)
+    MORI_FAST_PATH_THRESHOLD  intent-router confidence bar, for every persona (default 0.8)
+    """
+    global _REGISTRY
+    with _REGISTRY_LOCK:
+        if _REGISTRY is None:
+            _REGISTRY = PersonaRegistry(
+                os.environ.get("MORI_PERSONA_DIR", DEFAULT_PERSONA_DIR),
+                max_loaded=int(os.environ.get("MORI_MAX_PERSONAS", "8")),
+                fast_path_threshold=float(os.environ.get("MORI_FAST_PATH_THRESHOLD", "0.8")),
+            )
+        return _REGISTRY
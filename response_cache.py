@@ -0,0 +1,236 @@
+"""
+Mori Response Cache
+The same question, the same silence - no need to climb twice
+"""
+
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import TYPE_CHECKING, Dict, Optional
+
+from mori_metrics import REGISTRY
+
+if TYPE_CHECKING:
+    import numpy as np
+
+CACHE_LOOKUPS = REGISTRY.counter("mori_cache_lookups_total", "Response cache lookups, by result (hit/semantic_hit/miss)")
+
+_SPACE_RE = re.compile(r"\s+")
+_TRAILING_RE = re.compile(r"[\s.?!,;:]+$")
+
+
+def normalize_message(message: str) -> str:
+    """Fold case, whitespace and trailing punctuation"""
+    return _TRAILING_RE.sub("", _SPACE_RE.sub(" ", message.strip().lower()))
+
+
+def _scope(model: str, options: Dict, persona_version: str) -> str:
+    return json.dumps([model, options, persona_version], sort_keys=True)
+
+
+def cache_key(message: str, model: str, options: Dict, persona_version: str) -> str:
+    raw = f"{_scope(model, options, persona_version)}\n{normalize_message(message)}"
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class MemoryBackend:
+    """Bounded in-process LRU with per-entry expiry"""
+
+    def __init__(self, max_entries: int = 1024):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            item = self._entries.get(key)
+            if item is None:
+                return None
+            value, expires_at = item
+            if expires_at < time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def put(self, key: str, value: str, ttl: float):
+        with self._lock:
+            self._entries[key] = (value, time.time() + ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class SQLiteBackend:
+    """On-disk cache shared by every process on the host (WAL mode)"""
+
+    def __init__(self, path: str, max_entries: int = 10000):
+        self.path = path
+        self.max_entries = max_entries
+        self._local = threading.local()
+        self._writes = 0
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connection() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, "
+                "expires_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed_at)")
+
+    def _connection(self) -> sqlite3.Connection:
+        # sqlite3 connections must stay on the thread that opened them
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5.0)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, key: str) -> Optional[str]:
+        conn = self._connection()
+        now = time.time()
+        row = conn.execute(
+            "SELECT value FROM responses WHERE key = ? AND expires_at >= ?", (key, now)
+        ).fetchone()
+        if row is None:
+            return None
+        with conn:
+            conn.execute("UPDATE responses SET accessed_at = ? WHERE key = ?", (now, key))
+        return row[0]
+
+    def put(self, key: str, value: str, ttl: float):
+        conn = self._connection()
+        now = time.time()
+        with conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO responses (key, value, expires_at, accessed_at) VALUES (?, ?, ?, ?)",
+                (key, value, now + ttl, now),
+            )
+        self._writes += 1
+        if self._writes % 100 == 0:
+            self.evict()
+
+    def evict(self):
+        """Drop expired rows, then least recently used beyond max_entries"""
+        conn = self._connection()
+        with conn:
+            conn.execute("DELETE FROM responses WHERE expires_at < ?", (time.time(),))
+            conn.execute(
+                "DELETE FROM responses WHERE key IN ("
+                "SELECT key FROM responses ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            )
+
+    def __len__(self) -> int:
+        return self._connection().execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+
+
+class ResponseCache:
+    """Exact-match response cache with optional near-duplicate lookup.
+
+    Exact hits go through the backend. With an embedder, misses fall back
+    to cosine similarity against recently cached questions in the same
+    scope (model, options, persona version); that index is per process.
+    """
+
+    def __init__(self, backend=None, ttl: float = 3600.0, embedder=None,
+                 similarity: float = 0.92, max_semantic_entries: int = 1024):
+        self.backend = backend if backend is not None else MemoryBackend()
+        self.ttl = ttl
+        self.embedder = embedder
+        self.similarity = similarity
+        self.max_semantic_entries = max_semantic_entries
+        self._semantic: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _embed(self, text: str) -> Optional["np.ndarray"]:
+        import numpy as np
+        try:
+            vector = np.asarray(self.embedder.embed([text])[0], dtype=np.float32)
+        except Exception:
+            return None
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else None
+
+    def _semantic_lookup(self, message: str, scope: str) -> Optional[str]:
+        import numpy as np
+        vector = self._embed(normalize_message(message))
+        if vector is None:
+            return None
+        with self._lock:
+            candidates = [(key, vec) for key, (entry_scope, vec) in self._semantic.items() if entry_scope == scope]
+        if not candidates:
+            return None
+        scores = np.stack([vec for _, vec in candidates]) @ vector
+        # Best first: an expired top match shouldn't hide a live runner-up
+        for i in np.argsort(-scores):
+            if scores[i] < self.similarity:
+                break
+            value = self.backend.get(candidates[i][0])
+            if value is not None:
+                return value
+        return None
+
+    def get(self, message: str, model: str, options: Dict, persona_version: str) -> Optional[str]:
+        value = self.backend.get(cache_key(message, model, options, persona_version))
+        if value is not None:
+            CACHE_LOOKUPS.inc(result="hit")
+            return value
+        if self.embedder is not None:
+            value = self._semantic_lookup(message, _scope(model, options, persona_version))
+            if value is not None:
+                CACHE_LOOKUPS.inc(result="semantic_hit")
+                return value
+        CACHE_LOOKUPS.inc(result="miss")
+        return None
+
+    def put(self, message: str, model: str, options: Dict, persona_version: str, response: str):
+        key = cache_key(message, model, options, persona_version)
+        self.backend.put(key, response, self.ttl)
+        if self.embedder is not None:
+            vector = self._embed(normalize_message(message))
+            if vector is not None:
+                with self._lock:
+                    self._semantic[key] = (_scope(model, options, persona_version), vector)
+                    self._semantic.move_to_end(key)
+                    while len(self._semantic) > self.max_semantic_entries:
+                        self._semantic.popitem(last=False)
+
+
+_CACHE: Optional[ResponseCache] = None
+_CACHE_LOCK = threading.Lock()
+
+
+def get_response_cache() -> ResponseCache:
+    """Process-wide cache configured from the environment.
+
+    MORI_CACHE_PATH     SQLite file shared between processes (default: in memory)
+    MORI_CACHE_TTL      seconds an answer stays valid (default 3600)
+    MORI_CACHE_SEMANTIC set to 1 to also match near-duplicate questions
+    """
+    global _CACHE
+    with _CACHE_LOCK:
+        if _CACHE is None:
+            path = os.environ.get("MORI_CACHE_PATH")
+            embedder = None
+            if os.environ.get("MORI_CACHE_SEMANTIC") == "1":
+                from knowledge_vectors import DEFAULT_EMBED_MODEL, OllamaEmbedder
+                embedder = OllamaEmbedder(os.environ.get("MORI_EMBED_MODEL", DEFAULT_EMBED_MODEL))
+            _CACHE = ResponseCache(
+                backend=SQLiteBackend(path) if path else MemoryBackend(),
+                ttl=float(os.environ.get("MORI_CACHE_TTL", "3600")),
+                embedder=embedder,
+            )
+        return _CACHE
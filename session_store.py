@@ -0,0 +1,212 @@
+"""
+Mori Session Store
+What was said stays said - conversations on disk, a short window in memory
+"""
+
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Dict, List, Optional
+
+from mori_metrics import count_error
+
+DEFAULT_SESSION_DB = os.path.join(".mori_data", "sessions.db")
+
+
+class Turn:
+    """One message in a conversation"""
+
+    __slots__ = ("seq", "role", "content", "created_at")
+
+    def __init__(self, seq: int, role: str, content: str, created_at: float):
+        self.seq = seq
+        self.role = role
+        self.content = content
+        self.created_at = created_at
+
+    def as_message(self) -> Dict:
+        # seq lets the summarizer tell a repeated exchange from the one it covered
+        return {"role": self.role, "content": self.content, "seq": self.seq}
+
+
+class _Window:
+    """The newest turns of one session, plus where numbering continues"""
+
+    __slots__ = ("turns", "next_seq")
+
+    def __init__(self, turns: deque, next_seq: int):
+        self.turns = turns
+        self.next_seq = next_seq
+
+
+class SessionStore:
+    """Append-only SQLite (WAL) log of turns with a bounded in-memory window.
+
+    Each session keeps at most `window` recent turns in memory, and at most
+    `max_sessions` windows are held at once (least recently used go first,
+    they are on disk anyway). Older turns load lazily with older().
+
+    Several processes may share one database: turn numbers are assigned
+    inside the write transaction, and a window that another process has
+    appended past is reloaded.
+    """
+
+    def __init__(self, path: str = DEFAULT_SESSION_DB, window: int = 20, max_sessions: int = 1000,
+                 keep_turns: int = 500, max_idle_days: float = 30.0, compact_every: int = 1000):
+        self.path = path
+        self.window = window
+        self.max_sessions = max_sessions
+        self.keep_turns = keep_turns
+        self.max_idle_days = max_idle_days
+        self.compact_every = compact_every
+        self._windows: "OrderedDict[str, _Window]" = OrderedDict()
+        self._lock = threading.RLock()
+        self._local = threading.local()
+        self._appends = 0
+        self._compacting = False
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connection() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS turns ("
+                "session_id TEXT NOT NULL, seq INTEGER NOT NULL, role TEXT NOT NULL, "
+                "content TEXT NOT NULL, created_at REAL NOT NULL, "
+                "PRIMARY KEY (session_id, seq)) WITHOUT ROWID"
+            )
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5.0)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _next_seq(self, conn: sqlite3.Connection, session_id: str) -> int:
+        row = conn.execute("SELECT MAX(seq) FROM turns WHERE session_id = ?", (session_id,)).fetchone()
+        return 0 if row[0] is None else row[0] + 1
+
+    def _load_window(self, session_id: str) -> _Window:
+        window = self._windows.get(session_id)
+        if window is not None:
+            if window.next_seq == self._next_seq(self._connection(), session_id):
+                self._windows.move_to_end(session_id)
+                return window
+            # Another process wrote to this session - read it again
+            del self._windows[session_id]
+        rows = self._connection().execute(
+            "SELECT seq, role, content, created_at FROM turns WHERE session_id = ? ORDER BY seq DESC LIMIT ?",
+            (session_id, self.window),
+        ).fetchall()
+        turns = deque((Turn(*row) for row in reversed(rows)), maxlen=self.window)
+        window = _Window(turns, rows[0][0] + 1 if rows else 0)
+        self._windows[session_id] = window
+        while len(self._windows) > self.max_sessions:
+            self._windows.popitem(last=False)
+        return window
+
+    def append(self, session_id: str, role: str, content: str) -> Turn:
+        with self._lock:
+            window = self._load_window(session_id)
+            conn = self._connection()
+            with conn:
+                # IMMEDIATE takes the write lock first, so the seq can't be claimed twice
+                conn.execute("BEGIN IMMEDIATE")
+                turn = Turn(self._next_seq(conn, session_id), role, content, time.time())
+                conn.execute(
+                    "INSERT INTO turns (session_id, seq, role, content, created_at) VALUES (?, ?, ?, ?, ?)",
+                    (session_id, turn.seq, role, content, turn.created_at),
+                )
+            if turn.seq != window.next_seq:
+                self._windows.pop(session_id, None)
+                window = self._load_window(session_id)
+            else:
+                window.turns.append(turn)
+                window.next_seq += 1
+            self._appends += 1
+            due = self.compact_every and self._appends % self.compact_every == 0
+        if due:
+            self._compact_in_background()
+        return turn
+
+    def recent(self, session_id: str) -> List[Turn]:
+        """The in-memory window, oldest first"""
+        with self._lock:
+            return list(self._load_window(session_id).turns)
+
+    def messages(self, session_id: str) -> List[Dict]:
+        """The recent window as chat messages"""
+        return [turn.as_message() for turn in self.recent(session_id)]
+
+    def older(self, session_id: str, before_seq: int, limit: int = 20) -> List[Turn]:
+        """Turns before before_seq, oldest first - read from disk on demand"""
+        rows = self._connection().execute(
+            "SELECT seq, role, content, created_at FROM turns WHERE session_id = ? AND seq < ? "
+            "ORDER BY seq DESC LIMIT ?",
+            (session_id, before_seq, limit),
+        ).fetchall()
+        return [Turn(*row) for row in reversed(rows)]
+
+    def clear(self, session_id: str):
+        with self._lock:
+            with self._connection() as conn:
+                conn.execute("DELETE FROM turns WHERE session_id = ?", (session_id,))
+            self._windows.pop(session_id, None)
+
+    def _compact_in_background(self):
+        """compact() off the appending thread - one at a time"""
+        with self._lock:
+            if self._compacting:
+                return
+            self._compacting = True
+
+        def run():
+            try:
+                self.compact()
+            except Exception as e:
+                count_error("session_compact", e)
+            finally:
+                with self._lock:
+                    self._compacting = False
+
+        threading.Thread(target=run, daemon=True, name="mori-session-compact").start()
+
+    def compact(self):
+        """Drop idle sessions and old turns, then shrink the WAL"""
+        cutoff = time.time() - self.max_idle_days * 86400
+        conn = self._connection()
+        with conn:
+            conn.execute(
+                "DELETE FROM turns WHERE session_id IN ("
+                "SELECT session_id FROM turns GROUP BY session_id HAVING MAX(created_at) < ?)",
+                (cutoff,),
+            )
+            # Keep only the newest keep_turns per session
+            conn.execute(
+                "DELETE FROM turns WHERE (session_id, seq) IN ("
+                "SELECT session_id, seq FROM ("
+                "SELECT session_id, seq, ROW_NUMBER() OVER (PARTITION BY session_id ORDER BY seq DESC) AS rank "
+                "FROM turns) WHERE rank > ?)",
+                (self.keep_turns,),
+            )
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        with self._lock:
+            # Idle sessions may have been deleted underneath their windows
+            self._windows.clear()
+
+
+_STORE: Optional[SessionStore] = None
+_STORE_LOCK = threading.Lock()
+
+
+def get_session_store() -> SessionStore:
+    """Process-wide store; MORI_SESSION_DB sets the database file"""
+    global _STORE
+    with _STORE_LOCK:
+        if _STORE is None:
+            _STORE = SessionStore(os.environ.get("MORI_SESSION_DB", DEFAULT_SESSION_DB))
+        return _STORE
@@ -3,64 +3,134 @@ Setup script for Mori Buntarou Chatbot
 Prepares the environment and downloads necessary models
 """
 
+import argparse
 import subprocess
 import sys
 import os
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+# The UI's default (also the fallback model) first, then the larger tiers
+DEFAULT_MODELS = ["llama3.2:1b", "mistral", "llama3"]
 
 def install_requirements():
     """Install Python requirements"""
     print("📦 Installing Python requirements...")
     subprocess.check_call([sys.executable, "-m", "pip", "install", "-r", "requirements.txt"])
 
+def installed_models():
+    """Models Ollama already has, or None when Ollama isn't installed or running"""
+    try:
+        result = subprocess.run(["ollama", "list"], capture_output=True, text=True)
+    except FileNotFoundError:
+        return None
+    if result.returncode != 0:
+        return None
+    names = set()
+    for line in result.stdout.splitlines()[1:]:
+        if line.strip():
+            name = line.split()[0]
+            names.add(name)
+            if name.endswith(":latest"):
+                names.add(name[:-len(":latest")])
+    return names
+
 def check_ollama():
     """Check if Ollama is installed and running"""
     try:
-        result = subprocess.run(["ollama", "list"], capture_output=True, text=True)
-        if result.returncode == 0:
-            print("✅ Ollama is installed and running")
-            return True
-        else:
-            print("❌ Ollama is not running")
-            return False
+        subprocess.run(["ollama", "--version"], capture_output=True)
     except FileNotFoundError:
         print("❌ Ollama is not installed")
         print("Please install Ollama from: https://ollama.ai/")
-        return False
-
-def pull_models():
-    """Pull necessary Ollama models"""
-    models = ["mistral", "llama3"]
-    
-    for model in models:
-        print(f"🔄 Pulling {model} model...")
-        try:
-            subprocess.run(["ollama", "pull", model], check=True)
-            print(f"✅ {model} model ready")
-        except subprocess.CalledProcessError:
-            print(f"❌ Failed to pull {model} model")
+        return None
+    models = installed_models()
+    if models is None:
+        print("❌ Ollama is not running")
+    else:
+        print("✅ Ollama is installed and running")
+    return models
+
+def warm_model(model):
+    """Load the model and prefill Mori's prompt prefix, so the first visitor doesn't wait for it; returns a status line"""
+    from mori_engine import MoriChatbot
+    started = time.perf_counter()
+    if not MoriChatbot(model, semantic_search=False, speculate=False).warm_up():
+        return f"⚠️  Could not warm {model} - the first visitor will wait for it to load"
+    return f"🔥 {model} model warmed ({time.perf_counter() - started:.1f}s)"
+
+def prepare_model(model, installed):
+    """Pull a model unless Ollama has it; returns (ready, status line)"""
+    started = time.perf_counter()
+    if model in installed:
+        return True, f"✅ {model} model ready (already present)"
+    # Output captured - several progress bars at once would garble the terminal
+    result = subprocess.run(["ollama", "pull", model], capture_output=True, text=True)
+    if result.returncode != 0:
+        reason = (result.stderr.strip().splitlines() or ["unknown error"])[-1]
+        return False, f"❌ Failed to pull {model} model: {reason}"
+    return True, f"✅ {model} model ready (pulled, {time.perf_counter() - started:.1f}s)"
+
+def pull_models(models, installed, warm=True):
+    """Pull missing models in parallel, then warm the first (the default and fallback) model.
+
+    Only one is warmed: models loaded side by side would push each other
+    out of memory, and the default is the one the first visitor meets.
+    """
+    if not models:
+        print("⚠️  No models given - nothing to pull")
+        return
+    missing = [model for model in models if model not in installed]
+    if missing:
+        print(f"🔄 Pulling {', '.join(missing)}...")
+    ready = set()
+    with ThreadPoolExecutor(max_workers=len(models)) as pool:
+        futures = {pool.submit(prepare_model, model, installed): model for model in models}
+        for future in as_completed(futures):
+            pulled, status = future.result()
+            if pulled:
+                ready.add(futures[future])
+            print(status)
+    if warm and models[0] in ready:
+        print(warm_model(models[0]))
 
 def main():
+    parser = argparse.ArgumentParser(description="Set up Mori Buntarou")
+    parser.add_argument("--models", default=",".join(DEFAULT_MODELS), help="Comma-separated Ollama models")
+    parser.add_argument("--skip-install", action="store_true", help="Don't pip install requirements.txt")
+    parser.add_argument("--no-warm", action="store_true", help="Pull only - don't load the models")
+    args = parser.parse_args()
+
     print("🏔️ Setting up Mori Buntarou Mountain Chatbot")
     print("=" * 50)
-    
+
     # Install Python requirements
-    install_requirements()
-    
+    if not args.skip_install:
+        install_requirements()
+
     # Check Ollama
-    if not check_ollama():
+    installed = check_ollama()
+    if installed is None:
         print("\n⚠️  Please install and start Ollama first:")
         print("1. Download from https://ollama.ai/")
         print("2. Install and start the service")
         print("3. Run this setup script again")
         return
-    
-    # Pull models
-    pull_models()
-    
+
+    # Pull and warm models
+    models = [model.strip() for model in args.models.split(",") if model.strip()]
+    pull_models(models, installed, warm=not args.no_warm)
+
+    # Compile the knowledge snapshot and embed it now rather than on the first request
+    here = os.path.dirname(os.path.abspath(__file__))
+    subprocess.run([sys.executable, os.path.join(here, "knowledge_snapshot.py")])
+    if subprocess.run([sys.executable, os.path.join(here, "knowledge_vectors.py")]).returncode != 0:
+        print("⚠️  Knowledge vectors not built - keyword search still works, and semantic search catches up "
+              "once the embedding model (MORI_EMBED_MODEL, default nomic-embed-text) is pulled")
+
     print("\n🎉 Setup complete!")
     print("\nTo start the chatbot:")
     print("streamlit run mori_chatbot.py")
     print("\nThe mountain awaits your questions...")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
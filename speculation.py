@@ -0,0 +1,148 @@
+"""
+Mori Speculation
+Fixing the next rope while they read - follow-ups answered before they're asked
+"""
+
+import os
+import threading
+import time
+from collections import deque
+from typing import List
+
+from knowledge_index import KnowledgeIndex, tokenize
+from mori_metrics import REGISTRY, count_error, span
+from ollama_scheduler import SchedulerFull
+
+SPECULATION = REGISTRY.counter("mori_speculation_total", "Speculative follow-up generations, by result")
+
+
+def _name(key: str) -> str:
+    return key.replace("_", " ").title()
+
+
+def predict_followups(message: str, index: KnowledgeIndex, limit: int = 4) -> List[str]:
+    """Likely next questions on the topic message touched, from the knowledge base keys.
+
+    Half are fields of the same entry that the message didn't ask about,
+    half are neighbouring entries in the same category.
+    """
+    hits = index.search(message, 1)
+    if not hits:
+        return []
+    entry = hits[0][0]
+    asked = set(tokenize(message))
+    name = _name(entry.subcategory)
+
+    fields = []
+    if isinstance(entry.info, dict):
+        fields = [f"What about the {field.replace('_', ' ')} of {name}?"
+                  for field in entry.info if not asked.intersection(tokenize(field))]
+    siblings = [f"What about {_name(other.subcategory)}?"
+                for other in index.category_entries(entry.category, limit + 1)
+                if other.subcategory != entry.subcategory]
+
+    followups: List[str] = []
+    for pair in zip(fields, siblings):
+        followups.extend(pair)
+    followups.extend(fields[len(siblings):] + siblings[len(fields):])
+    return followups[:limit]
+
+
+class Speculator:
+    """Pre-generates follow-up answers into the response cache while Ollama is idle.
+
+    One background thread per engine. Work starts only after the scheduler
+    has been idle for `quiet` seconds and then holds a background slot, so
+    it counts against the model's parallelism like any request; a
+    generation in flight is cancelled the moment a real request asks for
+    a slot. With a backend pool it goes to the least busy backend.
+    Scheduling a new turn replaces whatever was still pending.
+    """
+
+    def __init__(self, engine, limit: int = 4, quiet: float = 0.5, poll: float = 0.05):
+        self.engine = engine
+        self.limit = limit
+        self.quiet = quiet
+        self.poll = poll
+        self._pending: deque = deque()
+        self._wake = threading.Condition()
+        threading.Thread(target=self._run, daemon=True, name=f"mori-speculate-{engine.model_name}").start()
+
+    def followups(self, user_message: str) -> List[str]:
+        """Predicted next questions worth pre-generating (the intent router already answers the rest)"""
+        questions = predict_followups(user_message, self.engine.knowledge_index, self.limit * 2)
+        router = self.engine.intent_router
+        return [q for q in questions if router.classify(q).confidence < router.threshold][:self.limit]
+
+    def schedule(self, user_message: str) -> List[str]:
+        """Queue follow-ups of a finished turn; returns them (e.g. to offer as suggestions)"""
+        questions = self.followups(user_message)
+        with self._wake:
+            self._pending.clear()
+            self._pending.extend(questions)
+            self._wake.notify()
+        return questions
+
+    def _wait_for_quiet(self):
+        quiet_since = None
+        while True:
+            if self.engine.scheduler.idle():
+                quiet_since = quiet_since or time.monotonic()
+                if time.monotonic() - quiet_since >= self.quiet:
+                    return
+            else:
+                quiet_since = None
+            time.sleep(self.poll)
+
+    def _run(self):
+        while True:
+            with self._wake:
+                while not self._pending:
+                    self._wake.wait()
+            self._wait_for_quiet()
+            with self._wake:
+                if not self._pending:
+                    continue
+                question = self._pending.popleft()
+            try:
+                SPECULATION.inc(result=self._speculate(question))
+            except Exception as e:
+                count_error("speculate", e)
+                SPECULATION.inc(result="error")
+
+    def _speculate(self, question: str) -> str:
+        engine = self.engine
+        if engine._cached_response(question) is not None:
+            return "skipped"
+        messages = engine._build_messages(question)
+        # The same budget and sentence cut a live reply would get
+        plan = engine._plan(question)
+        stopper = plan.stopper()
+        try:
+            with engine.scheduler.background(engine.model_name) as preempted:
+                with span("speculate", model=engine.model_name) as attrs, engine._session_client("") as client:
+                    stream = client.chat(**engine._chat_kwargs(messages, plan=plan), stream=True)
+                    try:
+                        for chunk in stream:
+                            if preempted.is_set():
+                                # Real traffic - give Ollama back at once
+                                attrs["cancelled"] = True
+                                return "cancelled"
+                            stopper.feed(chunk['message']['content'])
+                            if stopper.ended(chunk, engine.model_name):
+                                break
+                    finally:
+                        stream.close()
+        except SchedulerFull:
+            # Real traffic got there first
+            return "busy"
+        text = stopper.reply()
+        if not text.strip():
+            return "empty"
+        engine._cache_response(question, text)
+        return "cached"
+
+
+def speculation_enabled() -> bool:
+    """MORI_SPECULATE=1 turns on idle-time follow-up generation"""
+    return os.environ.get("MORI_SPECULATE", "0").lower() in ("1", "true", "yes", "on")
@@ -0,0 +1,152 @@
+"""
+Mori Style Filter
+Sanding the enthusiasm off a reply - every rule in one pass
+"""
+
+import re
+from typing import AsyncIterator, Dict, Iterable, Iterator, List, Optional, Tuple
+
+
+def _trie_regex(words: Iterable[str]) -> str:
+    """Compile words into a trie-shaped regex: shared prefixes are matched once,
+    so the cost per position doesn't grow with the number of rules."""
+    trie: Dict = {}
+    for word in words:
+        node = trie
+        for char in word:
+            node = node.setdefault(char, {})
+        node[""] = {}
+
+    def build(node: Dict) -> str:
+        branches = [re.escape(char) + build(child) for char, child in sorted(node.items()) if char]
+        if not branches:
+            return ""
+        body = branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+        if "" in node:
+            # A word ends here; longer words continue optionally (greedy)
+            body = "(?:" + body + ")?"
+        return body
+
+    return build(trie)
+
+
+def match_case(source: str, replacement: str) -> str:
+    """Give replacement the capitalisation of the text it replaces"""
+    if len(source) > 1 and source.isupper():
+        return replacement.upper()
+    if source[:1].isupper():
+        return replacement[:1].upper() + replacement[1:]
+    return replacement
+
+
+class StyleFilter:
+    """Word, phrase and punctuation rewrites compiled into one pattern.
+
+    Word rules match whole words in any case and keep the original's
+    capitalisation. Punctuation rules collapse a run of the character
+    ("!!!") into the replacement.
+    """
+
+    def __init__(self, words: Optional[Dict[str, str]] = None, punctuation: Optional[Dict[str, str]] = None):
+        self.words = {word.lower(): replacement for word, replacement in (words or {}).items()}
+        self.punctuation = dict(punctuation or {})
+
+        alternatives = []
+        if self.words:
+            alternatives.append(r"(?P<word>\b" + _trie_regex(self.words) + r"\b)")
+        if self.punctuation:
+            chars = "".join(re.escape(char) for char in sorted(self.punctuation))
+            alternatives.append(f"(?P<punct>[{chars}]+)")
+        self._pattern = re.compile("|".join(alternatives), re.IGNORECASE) if alternatives else None
+        # Longest text a word rule can need before its match is settled
+        self._horizon = max((len(word) for word in self.words), default=0) + 1
+
+    @classmethod
+    def from_rules(cls, rules: Dict[str, Dict[str, str]]) -> "StyleFilter":
+        return cls(rules.get("words"), rules.get("punctuation"))
+
+    def _replace(self, match: "re.Match") -> str:
+        word = match.group("word") if self.words else None
+        if word is not None:
+            return match_case(word, self.words[word.lower()])
+        return self.punctuation[match.group("punct")[0]]
+
+    def apply(self, text: str) -> str:
+        """Rewrite a complete response in a single pass"""
+        if self._pattern is None:
+            return text
+        return self._pattern.sub(self._replace, text)
+
+    def _rewrite_from(self, buffer: str, offset: int) -> str:
+        """apply() to buffer[offset:], with buffer[:offset] as boundary context"""
+        out: List[str] = []
+        pos = offset
+        for match in self._pattern.finditer(buffer, offset):
+            out.append(buffer[pos:match.start()])
+            out.append(self._replace(match))
+            pos = match.end()
+        out.append(buffer[pos:])
+        return "".join(out)
+
+    def _drain(self, context: str, pending: str) -> Tuple[str, str, str]:
+        """Rewrite the settled head of pending: (output, new context, rest).
+
+        A match is settled once everything it could still grow into has
+        arrived; the one character of context keeps word boundaries right
+        across chunks that have already been emitted.
+        """
+        buffer = context + pending
+        offset = len(context)
+        horizon = len(buffer) - self._horizon
+        out: List[str] = []
+        pos = offset
+        cut = None
+        for match in self._pattern.finditer(buffer, offset):
+            if match.start() >= horizon or match.end() >= len(buffer):
+                cut = match.start()
+                break
+            out.append(buffer[pos:match.start()])
+            out.append(self._replace(match))
+            pos = match.end()
+        if cut is None:
+            cut = max(horizon, pos)
+        if cut > pos:
+            out.append(buffer[pos:cut])
+        else:
+            cut = pos
+        emitted = "".join(out)
+        new_context = buffer[cut - 1:cut] if cut > 0 else context
+        return emitted, new_context, buffer[cut:]
+
+    def stream(self, tokens: Iterable[str]) -> Iterator[str]:
+        """apply() over a token stream, without breaking matches across chunks"""
+        if self._pattern is None:
+            yield from tokens
+            return
+        context, pending = "", ""
+        for token in tokens:
+            emitted, context, pending = self._drain(context, pending + token)
+            if emitted:
+                yield emitted
+        if pending:
+            yield self._rewrite_from(context + pending, len(context))
+
+    async def astream(self, tokens: AsyncIterator[str]) -> AsyncIterator[str]:
+        """stream() for async token streams"""
+        if self._pattern is None:
+            async for token in tokens:
+                yield token
+            return
+        context, pending = "", ""
+        async for token in tokens:
+            emitted, context, pending = self._drain(context, pending + token)
+            if emitted:
+                yield emitted
+        if pending:
+            yield self._rewrite_from(context + pending, len(context))
+
+
+def get_style_filter() -> StyleFilter:
+    """Mori's rules from the persona module, compiled with the rest of the persona"""
+    from persona_registry import DEFAULT_PERSONA, get_persona_registry
+    return get_persona_registry().get(DEFAULT_PERSONA).style_filter